@@ -0,0 +1,117 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
+
+from fastapi import Depends, HTTPException
+
+from app.tracing import span
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.getenv(name, str(default)))
+
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.getenv(name, str(default)))
+
+
+class AdmissionLimiter:
+    """
+    Concurrency budget for one class of endpoints. Up to max_concurrent requests run at once;
+    up to max_queue more wait at most queue_timeout seconds for a slot. A full queue is
+    rejected immediately with 429, a timed-out wait with 503; both carry Retry-After.
+    """
+
+    def __init__(self, name: str, max_concurrent: int, max_queue: int, queue_timeout: float, retry_after: int = 1):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self._sem = asyncio.Semaphore(max_concurrent)
+        self.waiting = 0
+        self.active = 0
+        self.admitted = 0
+        self.rejected_full = 0
+        self.rejected_timeout = 0
+
+    def _reject(self, status_code: int, reason: str) -> HTTPException:
+        return HTTPException(
+            status_code=status_code,
+            detail=f"{self.name} capacity exhausted: {reason}",
+            headers={"Retry-After": str(self.retry_after)},
+        )
+
+    @asynccontextmanager
+    async def slot(self):
+        if not self._sem.locked():
+            # Free slot: acquire() returns without suspending
+            await self._sem.acquire()
+        else:
+            if self.waiting >= self.max_queue:
+                self.rejected_full += 1
+                raise self._reject(429, "queue full")
+            self.waiting += 1
+            try:
+                with span("admission", self.name):
+                    await asyncio.wait_for(self._sem.acquire(), timeout=self.queue_timeout)
+            except asyncio.TimeoutError:
+                self.rejected_timeout += 1
+                raise self._reject(503, "timed out waiting for a slot")
+            finally:
+                self.waiting -= 1
+        self.active += 1
+        self.admitted += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._sem.release()
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "active": self.active,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "rejected_queue_full": self.rejected_full,
+            "rejected_timeout": self.rejected_timeout,
+        }
+
+
+# Separate budgets so bulk GRN/catalog writes cannot starve checkout, and neither starves reads.
+# Under SQLite every write serialises on one BEGIN IMMEDIATE lock, so write concurrency beyond
+# a few only lengthens the lock queue.
+LIMITERS = {
+    "read": AdmissionLimiter(
+        "read",
+        _env_int("ADMIT_READ_CONCURRENCY", 32),
+        _env_int("ADMIT_READ_QUEUE", 256),
+        _env_float("ADMIT_READ_TIMEOUT", 2.0),
+    ),
+    "checkout": AdmissionLimiter(
+        "checkout",
+        _env_int("ADMIT_CHECKOUT_CONCURRENCY", 4),
+        _env_int("ADMIT_CHECKOUT_QUEUE", 64),
+        _env_float("ADMIT_CHECKOUT_TIMEOUT", 3.0),
+    ),
+    "bulk": AdmissionLimiter(
+        "bulk",
+        _env_int("ADMIT_BULK_CONCURRENCY", 1),
+        _env_int("ADMIT_BULK_QUEUE", 4),
+        _env_float("ADMIT_BULK_TIMEOUT", 10.0),
+        retry_after=5,
+    ),
+}
+
+
+def admit(name: str):
+    """Route dependency that holds a slot of the named budget for the duration of the request."""
+    limiter = LIMITERS[name]
+
+    async def dependency():
+        async with limiter.slot():
+            yield
+
+    return Depends(dependency)
@@ -0,0 +1,72 @@
+import csv
+import io
+import json
+import zlib
+from datetime import datetime, date
+from decimal import Decimal
+from typing import AsyncIterator, Dict, Any
+
+# Rows buffered per emitted chunk; keeps memory flat while avoiding tiny writes
+ROWS_PER_CHUNK = 500
+
+MEDIA_TYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+
+def _plain(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def _csv_cell(value):
+    value = _plain(value)
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, separators=(",", ":"))
+    return value
+
+
+async def encode_rows(rows: AsyncIterator[Dict[str, Any]], fmt: str, columns: list[str],
+                      json_columns: tuple[str, ...] = ()) -> AsyncIterator[bytes]:
+    """
+    Serialise an async row stream as CSV (with header) or NDJSON, emitting one bytes
+    chunk per ROWS_PER_CHUNK rows. json_columns hold JSON text under SQLite and are
+    decoded so both backends produce the same output.
+    """
+    buf = io.StringIO()
+    writer = csv.writer(buf) if fmt == "csv" else None
+    if writer:
+        writer.writerow(columns)
+    pending = 0
+    async for row in rows:
+        for col in json_columns:
+            if isinstance(row.get(col), str):
+                try:
+                    row[col] = json.loads(row[col])
+                except ValueError:
+                    pass
+        if writer:
+            writer.writerow([_csv_cell(row.get(c)) for c in columns])
+        else:
+            buf.write(json.dumps({c: _plain(row.get(c)) for c in columns}, separators=(",", ":")))
+            buf.write("\n")
+        pending += 1
+        if pending >= ROWS_PER_CHUNK:
+            yield buf.getvalue().encode("utf-8")
+            buf.seek(0)
+            buf.truncate()
+            pending = 0
+    tail = buf.getvalue()
+    if tail:
+        yield tail.encode("utf-8")
+
+
+async def gzip_stream(chunks: AsyncIterator[bytes], level: int = 6) -> AsyncIterator[bytes]:
+    """Incrementally gzip a byte stream (wbits=31 writes a gzip header and trailer)."""
+    comp = zlib.compressobj(level, zlib.DEFLATED, 31)
+    async for chunk in chunks:
+        out = comp.compress(chunk)
+        if out:
+            yield out
+    yield comp.flush()
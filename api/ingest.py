@@ -0,0 +1,178 @@
+import io
+import json
+from datetime import date, datetime, time
+
+# pandas is imported inside the parsing functions: it costs ~1s at import time and only
+# the columnar upload path needs it, so API workers boot without it.
+
+# Columns mapped onto product fields; every other column is packed into attributes
+CORE_COLUMNS = {"sku", "name", "variety", "price", "quantity", "is_active"}
+ATTRIBUTE_JSON_COLUMNS = ("attributes", "attribute")
+REQUIRED_COLUMNS = {"sku", "name", "price"}
+
+# Cap on per-row rejections echoed back to the client
+MAX_REJECTED_ROWS = 100
+
+
+def sniff_format(head: bytes, filename: str | None = None) -> str:
+    """
+    Detect the upload format from its first bytes, falling back to the file extension.
+    Returns one of 'xlsx', 'parquet', 'ndjson' or 'csv'.
+    """
+    if head.startswith(b"PK\x03\x04"):
+        return "xlsx"
+    if head.startswith(b"PAR1"):
+        return "parquet"
+    if head.lstrip(b"\xef\xbb\xbf \t\r\n").startswith(b"{"):
+        return "ndjson"
+    ext = (filename or "").rsplit(".", 1)[-1].lower()
+    if ext in ("xlsx", "xlsm"):
+        return "xlsx"
+    if ext in ("parquet", "pq"):
+        return "parquet"
+    if ext in ("ndjson", "jsonl"):
+        return "ndjson"
+    return "csv"
+
+
+def read_frame(content: bytes, fmt: str) -> "pd.DataFrame":
+    import pandas as pd
+
+    buf = io.BytesIO(content)
+    try:
+        if fmt == "xlsx":
+            # dtype=object keeps SKUs such as 000123 as text
+            return pd.read_excel(buf, dtype=object)
+        if fmt == "parquet":
+            return pd.read_parquet(buf)
+        if fmt == "ndjson":
+            return pd.read_json(buf, lines=True, dtype=False)
+    except Exception as e:
+        raise ValueError(f"Could not read {fmt} upload: {e}") from e
+    raise ValueError(f"Unsupported upload format: {fmt}")
+
+
+def _parse_attributes(value) -> dict:
+    if isinstance(value, dict):
+        return value
+    # value != value is the NaN check for empty spreadsheet cells
+    if value is None or (isinstance(value, float) and value != value):
+        return {}
+    text = str(value).strip()
+    if not text:
+        return {}
+    if not text.startswith("{"):
+        text = "{" + text
+    if not text.endswith("}"):
+        text = text + "}"
+    parsed = json.loads(text)
+    return parsed if isinstance(parsed, dict) else {}
+
+
+def _json_value(value):
+    # Extra columns keep the reader's cell types: numpy scalars, and Timestamps from date columns
+    if hasattr(value, "item") and type(value).__module__ == "numpy":
+        value = value.item()
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, (str, int, float, bool)):
+        return value
+    return str(value)
+
+
+def frame_to_items(df: "pd.DataFrame") -> tuple[list[dict], list[dict]]:
+    """
+    Convert a catalog DataFrame into product upsert dicts (same shape as csv_to_api_json).
+
+    Coercion and validation run column-wise: text columns are stripped, price/quantity are
+    coerced to numbers, rows missing sku/name/price or carrying negative numbers are rejected,
+    and duplicate SKUs keep the last occurrence. Non-core columns are packed into attributes as
+    JSON values (dates become ISO strings).
+
+    Returns:
+        (items, rejected) where rejected lists {"row", "sku", "error"} entries (capped).
+    """
+    import pandas as pd
+
+    df = df.rename(columns=lambda c: str(c).strip().lower())
+    missing = REQUIRED_COLUMNS - set(df.columns)
+    if missing:
+        raise ValueError(f"Missing required column(s): {', '.join(sorted(missing))}")
+    df = df.reset_index(drop=True)
+
+    sku = df["sku"].astype("string").str.strip()
+    name = df["name"].astype("string").str.strip()
+    price = pd.to_numeric(df["price"], errors="coerce")
+    if "quantity" in df.columns:
+        quantity = pd.to_numeric(df["quantity"], errors="coerce").fillna(0)
+    else:
+        quantity = pd.Series(0.0, index=df.index)
+    if "variety" in df.columns:
+        variety = df["variety"].astype("string").str.strip().replace("", pd.NA)
+    else:
+        variety = pd.Series(pd.NA, index=df.index, dtype="string")
+    if "is_active" in df.columns:
+        is_active = ~df["is_active"].astype("string").str.strip().str.lower().isin(["0", "false", "no", "n"])
+    else:
+        is_active = pd.Series(True, index=df.index)
+
+    reasons = pd.Series(pd.NA, index=df.index, dtype="string")
+    reasons = reasons.mask(quantity < 0, "negative quantity")
+    reasons = reasons.mask(price.isna() | (price < 0), "invalid price")
+    reasons = reasons.mask(name.isna() | (name == ""), "missing name")
+    reasons = reasons.mask(sku.isna() | (sku == ""), "missing sku")
+    valid = reasons.isna()
+    duplicate = valid & sku.where(valid).duplicated(keep="last")
+    reasons = reasons.mask(duplicate, "duplicate sku (later row kept)")
+
+    # Attribute packing: JSON attribute column merged with any extra columns
+    json_col = next((c for c in ATTRIBUTE_JSON_COLUMNS if c in df.columns), None)
+    extra_cols = [c for c in df.columns if c not in CORE_COLUMNS and c not in ATTRIBUTE_JSON_COLUMNS]
+    keep = valid & ~duplicate
+    if extra_cols:
+        extras = df.loc[keep, extra_cols].astype(object)
+        extra_records = extras.where(extras.notna(), None).to_dict("records")
+    else:
+        extra_records = [{}] * int(keep.sum())
+
+    if json_col:
+        json_records = []
+        for idx, value in df.loc[keep, json_col].items():
+            try:
+                json_records.append(_parse_attributes(value))
+            except (json.JSONDecodeError, ValueError) as e:
+                reasons.at[idx] = f"invalid attributes: {e}"
+                json_records.append(None)
+    else:
+        json_records = [{}] * int(keep.sum())
+
+    out = pd.DataFrame({
+        "sku": sku, "name": name, "variety": variety,
+        "price": price, "quantity": quantity, "is_active": is_active,
+    })[keep].astype(object)
+    records = out.where(out.notna(), None).to_dict("records")
+
+    items = []
+    for rec, extra, attrs in zip(records, extra_records, json_records):
+        if attrs is None:
+            continue
+        rec["price"] = float(rec["price"])
+        rec["quantity"] = float(rec["quantity"])
+        rec["is_active"] = bool(rec["is_active"])
+        rec["attributes"] = {**{k: _json_value(v) for k, v in extra.items() if v is not None}, **attrs}
+        items.append(rec)
+
+    bad = reasons.dropna()
+    rejected = [
+        # +2: header is row 1 in spreadsheet terms
+        {"row": int(idx) + 2, "sku": None if pd.isna(sku.at[idx]) else str(sku.at[idx]), "error": str(reason)}
+        for idx, reason in bad.head(MAX_REJECTED_ROWS).items()
+    ]
+    return items, rejected
+
+
+def parse_catalog(content: bytes, fmt: str) -> tuple[list[dict], list[dict], int]:
+    """Read and normalise a columnar catalog upload. Returns (items, rejected sample, rejected count)."""
+    df = read_frame(content, fmt)
+    items, rejected = frame_to_items(df)
+    return items, rejected, len(df) - len(items)
@@ -1,23 +1,52 @@
+import json
 import logging
 from fastapi import FastAPI, HTTPException
 from fastapi.responses import JSONResponse
 
 from app.DB.Sql.db_manager import AsyncDBManager
 from app.DB.services.inventory_service import InventoryService
+from app.DB.services.job_service import IngestJobRunner
+from app.DB.services.stock_feed import StockFeed, FeedFull
+from app.DB.services.rollup_service import SalesRollups
+from app.DB.services.valuation_service import ValuationEngine
+from app.DB.services.reorder_service import ReorderPlanner
+from app.DB.services.forecast_service import DemandForecaster
 from app.DB.models.schema import (
     ProductUpsert, RestockIN, SaleOUT,
     StockResponse, ProductCard, SearchQuery, VarietiesResponse,
-    BatchRestockIN, SaleOrderOUT, ProductUpsertBatch
+    BatchRestockIN, SaleOrderOUT, ProductUpsertBatch,
+    JobSubmitted, JobStatusResponse
 )
-from fastapi import UploadFile
-import io
-import pandas as pd
+from fastapi import UploadFile, Query, Header
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from datetime import date, datetime
+from typing import Literal
+
+from api.ingest import sniff_format, parse_catalog
+from api.export import encode_rows, gzip_stream, MEDIA_TYPES
+from api.responses import FastJSONResponse, fast_path_enabled
+from api.admission import admit, LIMITERS
+from api.tracing import TracedRoute, TracingMiddleware, traces
 
 logging.basicConfig(level=logging.INFO)
 app = FastAPI(title="Inventory API", version="1.0.0")
+# Route class must be set before any route is registered
+app.router.route_class = TracedRoute
+app.add_middleware(TracingMiddleware)
 
 db = AsyncDBManager()
 service = InventoryService(db)
+jobs = IngestJobRunner(db, service)
+stock_feed = StockFeed(service)
+rollups = SalesRollups(db, service)
+valuation = ValuationEngine(db, service)
+reorder = ReorderPlanner(db, rollups)
+forecaster = DemandForecaster(db, rollups)
+
+# Hot GET endpoints hand repository dicts straight to orjson, skipping the
+# model construction + response_model validation round trip
+FAST_PATH = fast_path_enabled()
 
 
 
@@ -81,45 +110,76 @@ def csv_to_api_json(file: UploadFile):
 async def on_startup():
     await db.open()
     await db.init_schema()
+    await jobs.start()
+    await stock_feed.start()
+    await rollups.start()
+    await valuation.start()
+    await reorder.start()
+    await forecaster.start()
 
 
 @app.on_event("shutdown")
 async def on_shutdown():
+    await forecaster.stop()
+    await reorder.stop()
+    await valuation.stop()
+    await rollups.stop()
+    await stock_feed.stop()
+    await jobs.stop()
     await db.close()
 
 
-@app.post("/products/upsert")
+@app.post("/products/upsert", dependencies=[admit("bulk")])
 async def upsert_product(payload: ProductUpsert):
     pid = await service.ingest_product(payload.sku, payload.name, payload.variety, payload.price, payload.quantity, payload.attributes)
     return {"id": pid, "sku": payload.sku}
 
 
-from fastapi import APIRouter, File, UploadFile, HTTPException, Body
-from typing import Optional
-import pandas as pd
-import io
-
-@app.post("/products/upsert/batch")
+@app.post("/products/upsert/batch", status_code=202, response_model=JobSubmitted, dependencies=[admit("bulk")])
 async def upsert_products_batch(
     file: UploadFile
 ):
     """
-    Accepts either a JSON payload or a CSV/Excel file upload.
-    User must provide exactly one.
+    Accepts a catalog file upload: CSV, Excel (XLSX), Parquet or NDJSON.
+    The format is sniffed from the file contents, falling back to the extension.
+
+    Rows are written by a background ingest job; the response carries the job id
+    to poll at GET /jobs/{job_id}.
     """
 
 
-    if file:
+    if not file:
+        raise HTTPException(status_code=400, detail="No file found. Please upload a CSV, Excel, Parquet or NDJSON file.")
+
+    head = file.file.read(8)
+    file.file.seek(0)
+    fmt = sniff_format(head, file.filename)
+    rejected, rejected_rows = [], 0
+    if fmt == "csv":
         items = csv_to_api_json(file)
-        print(items)
     else:
-        raise HTTPException(status_code=400, detail="No file found. Please upload a CSV or Excel file.")
+        try:
+            # pandas parsing is CPU-bound; keep it off the event loop
+            items, rejected, rejected_rows = await run_in_threadpool(parse_catalog, file.file.read(), fmt)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    job_id = await jobs.submit("products_upsert", items)
+    return JobSubmitted(job_id=job_id, status="queued", total_rows=len(items),
+                        rejected_rows=rejected_rows, rejected=rejected)
 
-    rows = await service.upsert_products_batch(items)
-    return {"count": len(rows), "items": rows}
+
+@app.get("/jobs/{job_id}", response_model=JobStatusResponse, dependencies=[admit("read")])
+async def get_job(job_id: str):
+    job = await jobs.get_status(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Not found")
+    done = job["processed_rows"] + job["failed_rows"]
+    progress = done / job["total_rows"] if job["total_rows"] else 1.0
+    return JobStatusResponse(**job, progress=round(progress, 4))
 
 
-@app.post("/stock/buy/batch")
+@app.post("/stock/buy/batch", dependencies=[admit("bulk")])
 async def batch_restock(payload: BatchRestockIN):
     try:
         items = [i.model_dump() for i in payload.items]
@@ -129,7 +189,15 @@ async def batch_restock(payload: BatchRestockIN):
         raise HTTPException(status_code=400, detail=str(e))
     return {"status": "ok", "count": len(payload.items)}
 
-@app.post("/stock/sell/order")
+@app.post("/stock/buy/batch/async", status_code=202, response_model=JobSubmitted, dependencies=[admit("bulk")])
+async def batch_restock_async(payload: BatchRestockIN):
+    """Queue a large GRN as a background restock job instead of posting it inline."""
+    items = [i.model_dump() for i in payload.items]
+    options = {"supplier": payload.supplier, "ref_id": payload.ref_id, "notes": payload.notes}
+    job_id = await jobs.submit("restock", items, options)
+    return JobSubmitted(job_id=job_id, status="queued", total_rows=len(items))
+
+@app.post("/stock/sell/order", dependencies=[admit("checkout")])
 async def sell_order(payload: SaleOrderOUT):
     try:
         items = [i.model_dump() for i in payload.items]
@@ -139,7 +207,7 @@ async def sell_order(payload: SaleOrderOUT):
     return {"status": "ok", "order_id": payload.order_id, "count": len(payload.items)}
 
 
-@app.post("/stock/buy")
+@app.post("/stock/buy", dependencies=[admit("bulk")])
 async def restock(payload: RestockIN):
     try:
         await service.restock_in(payload.sku, payload.variety, payload.quantity, payload.unit_price, ref_id=payload.ref_id, notes=payload.notes)
@@ -148,7 +216,7 @@ async def restock(payload: RestockIN):
     return {"status": "ok"}
 
 
-@app.post("/stock/sell")
+@app.post("/stock/sell", dependencies=[admit("checkout")])
 async def sell(payload: SaleOUT):
     try:
         await service.sell_out(payload.sku, payload.variety, payload.quantity, payload.sale_price, ref_id=payload.ref_id, notes=payload.notes)
@@ -157,35 +225,246 @@ async def sell(payload: SaleOUT):
     return {"status": "ok"}
 
 
-@app.get("/products/{sku}/price")
+@app.get("/products/{sku}/price", dependencies=[admit("read")])
 async def get_price(sku: str, variety: str | None = None):
     price = await service.get_price(sku, variety)
     if price is None:
         raise HTTPException(status_code=404, detail="Not found")
-    return {"sku": sku, "variety": variety, "price": price}
+    body = {"sku": sku, "variety": variety, "price": float(price)}
+    if FAST_PATH:
+        return FastJSONResponse(body)
+    return body
 
 
-@app.get("/products/{sku}/stock", response_model=StockResponse)
+@app.get("/products/{sku}/stock", response_model=StockResponse, dependencies=[admit("read")])
 async def get_stock(sku: str, variety: str | None = None):
     data = await service.get_stock(sku, variety)
+    if FAST_PATH:
+        return FastJSONResponse(data)
     return StockResponse(**data)
 
 
-@app.get("/products/{sku}/card", response_model=ProductCard)
+@app.get("/products/{sku}/card", response_model=ProductCard, dependencies=[admit("read")])
 async def get_card(sku: str, variety: str | None = None):
     card = await service.product_card(sku, variety)
     if not card:
         raise HTTPException(status_code=404, detail="Not found")
+    if FAST_PATH:
+        return FastJSONResponse(card)
     return ProductCard(**card)
 
 
-@app.get("/products/varieties", response_model=VarietiesResponse)
+@app.get("/products/varieties", response_model=VarietiesResponse, dependencies=[admit("read")])
 async def varieties(name: str):
     vs = await service.list_varieties(name)
     return VarietiesResponse(name=name, varieties=vs)
 
 
-@app.post("/products/search")
+@app.post("/products/search", dependencies=[admit("read")])
 async def search(payload: SearchQuery):
     items = await service.search(payload.q, payload.variety)
+    if FAST_PATH:
+        return FastJSONResponse({"count": len(items), "items": items})
     return {"count": len(items), "items": items}
+
+
+def _export_response(chunks, fmt: str, name: str, gzip: bool) -> StreamingResponse:
+    filename = f"{name}.{fmt}"
+    media_type = MEDIA_TYPES[fmt]
+    if gzip:
+        chunks = gzip_stream(chunks)
+        filename += ".gz"
+        media_type = "application/gzip"
+    return StreamingResponse(
+        chunks,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@app.get("/export/products")
+async def export_products(
+    format: Literal["csv", "ndjson"] = "csv",
+    sku: list[str] | None = Query(default=None),
+    category: str | None = None,
+    updated_since: datetime | None = None,
+    updated_until: datetime | None = None,
+    active_only: bool = False,
+    gzip: bool = False,
+):
+    """Stream the catalog as CSV or NDJSON, optionally gzipped. Memory use is independent of catalog size."""
+    rows = service.export_products(sku, category, updated_since, updated_until, active_only)
+    columns = ["sku", "name", "variety", "price", "quantity", "attributes", "is_active", "created_at", "updated_at"]
+    return _export_response(encode_rows(rows, format, columns, json_columns=("attributes",)), format, "products", gzip)
+
+
+@app.get("/export/ledger")
+async def export_ledger(
+    format: Literal["csv", "ndjson"] = "csv",
+    sku: list[str] | None = Query(default=None),
+    movement: Literal["IN", "OUT", "ADJUST"] | None = None,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    after_id: int | None = None,
+    gzip: bool = False,
+):
+    """Stream stock ledger rows in id order; `since`/`until` filter on created_at, `after_id` resumes a previous export."""
+    rows = service.export_ledger(sku, movement, since, until, after_id)
+    columns = ["id", "sku", "variety", "movement", "quantity", "unit_price", "source", "ref_id", "notes", "created_at"]
+    return _export_response(encode_rows(rows, format, columns), format, "ledger", gzip)
+
+
+@app.get("/stream/stock")
+async def stream_stock(
+    sku: list[str] | None = Query(default=None),
+    category: str | None = None,
+    last_id: int | None = None,
+    last_event_id: str | None = Header(default=None),
+):
+    """
+    Server-sent events feed of stock changes. Each `stock` event carries the ledger id (as the
+    SSE id), the signed delta and the product's resulting quantity. Filter by repeated `sku`
+    or by `category`; resume with `last_id` or the standard Last-Event-ID header.
+    """
+    if last_id is None and last_event_id and last_event_id.isdigit():
+        last_id = int(last_event_id)
+    if stock_feed.is_full():
+        raise HTTPException(status_code=503, detail="Stock feed is at capacity", headers={"Retry-After": "30"})
+
+    async def sse():
+        events = stock_feed.subscribe(sku, category, last_id)
+        try:
+            async for event in events:
+                if event is None:
+                    yield b": keep-alive\n\n"
+                elif "id" not in event:
+                    # resync: this client fell behind; it should reconnect with last_id
+                    yield f"event: {event['event']}\ndata: {json.dumps(event)}\n\n".encode()
+                else:
+                    yield f"id: {event['id']}\nevent: stock\ndata: {json.dumps(event)}\n\n".encode()
+        except FeedFull:
+            yield b"event: resync\ndata: {}\n\n"
+        finally:
+            await events.aclose()
+
+    return StreamingResponse(sse(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+def _check_range(start: date, end: date):
+    if end < start:
+        raise HTTPException(status_code=422, detail="end must not be before start")
+
+
+@app.get("/analytics/sales", dependencies=[admit("read")])
+async def sales_summary(
+    start: date,
+    end: date,
+    granularity: Literal["day", "hour"] = "day",
+    sku: list[str] | None = Query(default=None),
+    category: str | None = None,
+):
+    """Revenue, units and sale count over [start, end] (UTC days), with a per-day or per-hour series."""
+    _check_range(start, end)
+    return await rollups.sales(start, end, granularity, sku, category)
+
+
+@app.get("/analytics/top-sellers", dependencies=[admit("read")])
+async def top_sellers(
+    start: date,
+    end: date,
+    by: Literal["revenue", "units"] = "revenue",
+    limit: int = Query(default=10, ge=1, le=100),
+    category: str | None = None,
+):
+    """Best-selling products over [start, end] (UTC days), ranked by revenue or units."""
+    _check_range(start, end)
+    return await rollups.top_sellers(start, end, by, limit, category)
+
+
+@app.get("/valuation/stock", dependencies=[admit("read")])
+async def stock_valuation(sku: list[str] | None = Query(default=None), category: str | None = None):
+    """Current stock value per product from the open FIFO cost layers."""
+    return await valuation.stock_value(sku, category)
+
+
+@app.get("/valuation/cogs", dependencies=[admit("read")])
+async def cost_of_goods_sold(
+    start: date,
+    end: date,
+    sku: list[str] | None = Query(default=None),
+    category: str | None = None,
+    after_id: int = 0,
+    limit: int = Query(default=100, ge=1, le=1000),
+):
+    """FIFO cost of goods sold and gross margin over [start, end] (UTC days), with per-sale rows paged by ledger id."""
+    _check_range(start, end)
+    return await valuation.cogs(start, end, sku, category, after_id, limit)
+
+
+@app.get("/valuation/status", dependencies=[admit("read")])
+async def valuation_status():
+    return await valuation.status()
+
+
+@app.post("/valuation/rebuild", status_code=202, dependencies=[admit("bulk")])
+async def rebuild_valuation():
+    """Recompute cost layers and COGS from the whole ledger in the background; poll /valuation/status."""
+    if not valuation.start_rebuild():
+        raise HTTPException(status_code=409, detail="A valuation rebuild is already running")
+    return await valuation.status()
+
+
+@app.get("/reorder/suggestions", dependencies=[admit("read")])
+async def reorder_suggestions(
+    all: bool = False,
+    sku: list[str] | None = Query(default=None),
+    category: str | None = None,
+    limit: int = Query(default=50, ge=1, le=1000),
+):
+    """Stored reorder points, most urgent first. By default only products at or below their reorder point."""
+    return await reorder.suggestions(not all, sku, category, limit)
+
+
+@app.post("/reorder/refresh", dependencies=[admit("bulk")])
+async def refresh_reorder_suggestions():
+    """Recompute reorder points for the whole catalog now instead of waiting for the next scheduled run."""
+    return await reorder.refresh()
+
+
+@app.get("/forecast/demand", dependencies=[admit("read")])
+async def demand_forecast(
+    sku: list[str] | None = Query(default=None),
+    category: str | None = None,
+    method: Literal["ses", "croston", "none"] | None = None,
+    limit: int = Query(default=100, ge=1, le=1000),
+):
+    """Stored next-week demand forecasts, highest first. Refreshed nightly from the daily sales rollup."""
+    return await forecaster.forecasts(sku, category, method, limit)
+
+
+@app.post("/forecast/refresh", dependencies=[admit("bulk")])
+async def refresh_demand_forecast():
+    """Fold any days since the last run into the forecasts now (a no-op when already current)."""
+    return await forecaster.refresh()
+
+
+@app.get("/debug/admission")
+async def admission_stats():
+    """Live concurrency, queue depth and rejection counters per endpoint class."""
+    return {name: limiter.stats() for name, limiter in LIMITERS.items()}
+
+
+@app.get("/debug/traces")
+async def debug_traces(limit: int = 50, route: str | None = None, min_ms: float = 0.0):
+    """Most recent sampled request traces (newest first), optionally filtered by route and total duration."""
+    out = []
+    for t in reversed(traces):
+        if route and t["route"] != route:
+            continue
+        if t["phases"].get("total", 0.0) < min_ms:
+            continue
+        out.append(t)
+        if len(out) >= limit:
+            break
+    return {"count": len(out), "traces": out}
@@ -0,0 +1,23 @@
+import os
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson; falls back to the stdlib encoder when orjson is missing."""
+
+    def render(self, content: Any) -> bytes:
+        if orjson is None:
+            return super().render(content)
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+def fast_path_enabled() -> bool:
+    # Opt-in: API_FAST_PATH=1 returns trusted repository dicts without response_model re-validation
+    return os.getenv("API_FAST_PATH", "0") == "1"
@@ -0,0 +1,141 @@
+import functools
+import inspect
+import json
+import logging
+import os
+import random
+import time
+from collections import deque
+
+from fastapi.routing import APIRoute
+
+from app.tracing import current_trace, start_trace, end_trace
+
+logger = logging.getLogger("api.trace")
+
+# Fraction of requests kept in the ring buffer and logged; Server-Timing is always sent
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.05"))
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", "500"))
+
+traces: deque = deque(maxlen=TRACE_BUFFER_SIZE)
+
+
+class TracedRoute(APIRoute):
+    """
+    APIRoute that marks the request phases on the current trace:
+    handler start -> (body parsing, validation, dependencies) -> endpoint -> serialisation -> response.
+    """
+
+    def __init__(self, path, endpoint, **kwargs):
+        if inspect.iscoroutinefunction(endpoint):
+            original = endpoint
+
+            @functools.wraps(original)
+            async def endpoint(*args, **kw):
+                trace = current_trace()
+                if trace is not None:
+                    trace.mark("endpoint_start")
+                try:
+                    return await original(*args, **kw)
+                finally:
+                    if trace is not None:
+                        trace.mark("endpoint_end")
+
+        super().__init__(path, endpoint, **kwargs)
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def traced_handler(request):
+            trace = current_trace()
+            if trace is not None:
+                trace.attrs["route"] = self.path
+                trace.mark("handler_start")
+            response = await handler(request)
+            if trace is not None:
+                trace.mark("handler_end")
+            return response
+
+        return traced_handler
+
+
+def phase_timings(trace) -> list[tuple[str, float, str | None]]:
+    """(name, ms, description) entries for Server-Timing, in request order."""
+    admission = trace.total_ms("admission")
+    db_checkout = trace.total_ms("db.checkout")
+    db_query = trace.total_ms("db.query")
+    entries = []
+    validate = trace.between_ms("handler_start", "endpoint_start")
+    if validate is not None:
+        entries.append(("validate", max(validate - admission, 0.0), "parse + validate + deps"))
+    if admission:
+        entries.append(("admission", admission, "queued for a slot"))
+    service = trace.between_ms("endpoint_start", "endpoint_end")
+    if service is not None:
+        entries.append(("service", service, None))
+    if db_checkout:
+        entries.append(("db-checkout", db_checkout, None))
+    if db_query:
+        entries.append(("db", db_query, f"{trace.count('db.query')} queries"))
+    if trace.total_ms("db.commit"):
+        entries.append(("db-commit", trace.total_ms("db.commit"), None))
+    serialize = trace.between_ms("endpoint_end", "handler_end")
+    if serialize is not None:
+        entries.append(("serialize", serialize, None))
+    entries.append(("total", trace.elapsed_ms(), None))
+    return entries
+
+
+def server_timing_header(entries) -> str:
+    parts = []
+    for name, ms, desc in entries:
+        part = f"{name};dur={ms:.2f}"
+        if desc:
+            part += f';desc="{desc}"'
+        parts.append(part)
+    return ", ".join(parts)
+
+
+class TracingMiddleware:
+    """
+    ASGI middleware: opens a trace per HTTP request, adds a Server-Timing header to the
+    response and stores a sampled fraction of traces (with per-query detail) in `traces`.
+    """
+
+    def __init__(self, app, sample_rate: float = TRACE_SAMPLE_RATE):
+        self.app = app
+        self.sample_rate = sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        trace, token = start_trace(f"{scope['method']} {scope['path']}")
+        status = 0
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                trace.mark("response_start")
+                header = server_timing_header(phase_timings(trace))
+                message["headers"] = list(message.get("headers", [])) + [(b"server-timing", header.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            end_trace(token)
+            if random.random() < self.sample_rate:
+                self._record(trace, status)
+
+    def _record(self, trace, status: int):
+        entry = {
+            "ts": time.time(),
+            "request": trace.name,
+            "route": trace.attrs.get("route"),
+            "status": status,
+            "phases": {name: round(ms, 3) for name, ms, _ in phase_timings(trace)},
+            "spans": [dict(s, ms=round(s["ms"], 3)) for s in trace.spans],
+        }
+        traces.append(entry)
+        logger.info(json.dumps(entry, separators=(",", ":")))
@@ -0,0 +1,99 @@
+from typing import Any, AsyncIterator, Optional, Sequence
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+
+from app.DB.Sql.db_manager import AsyncDBManager
+from app.DB.repositories.checkpoint_repo import CheckpointRepository
+
+
+class DBCheckpointSaver(BaseCheckpointSaver):
+    """
+    LangGraph checkpointer over the project database (graph_checkpoints / graph_writes).
+
+    The bot only ever resumes a session from where its last turn ended, so each save replaces the
+    thread's previous checkpoint instead of keeping a history; with durability="exit" that is one
+    upsert per turn. Async only; the graph is always run with ainvoke.
+    """
+
+    def __init__(self, db: Optional[AsyncDBManager] = None, **kwargs):
+        super().__init__(**kwargs)
+        self.db = db
+        self._repo = None
+
+    @property
+    def repo(self) -> CheckpointRepository:
+        # The DB manager is opened by the app after the graph is compiled at import time
+        if self._repo is None:
+            self._repo = CheckpointRepository(self.db or AsyncDBManager())
+        return self._repo
+
+    @staticmethod
+    def _keys(config: RunnableConfig) -> tuple[str, str]:
+        configurable = config["configurable"]
+        return configurable["thread_id"], configurable.get("checkpoint_ns", "")
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id, checkpoint_ns = self._keys(config)
+        row = await self.repo.latest(thread_id, checkpoint_ns, get_checkpoint_id(config))
+        if row is None:
+            return None
+        checkpoint_id = row["checkpoint_id"]
+        writes = await self.repo.writes(thread_id, checkpoint_ns, checkpoint_id)
+        parent = row["parent_checkpoint_id"]
+        return CheckpointTuple(
+            config={"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns,
+                                     "checkpoint_id": checkpoint_id}},
+            checkpoint=self.serde.loads_typed((row["type"], bytes(row["checkpoint"]))),
+            metadata=self.serde.loads_typed((row["metadata_type"], bytes(row["metadata"]))),
+            parent_config=({"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns,
+                                             "checkpoint_id": parent}} if parent else None),
+            pending_writes=[(w["task_id"], w["channel"], self.serde.loads_typed((w["type"], bytes(w["value"]))))
+                            for w in writes],
+        )
+
+    async def alist(self, config: Optional[RunnableConfig], *, filter: Optional[dict[str, Any]] = None,
+                    before: Optional[RunnableConfig] = None, limit: Optional[int] = None
+                    ) -> AsyncIterator[CheckpointTuple]:
+        # Only the latest checkpoint is stored, so a thread's history is at most one entry
+        if config is None or limit == 0 or before is not None:
+            return
+        found = await self.aget_tuple(config)
+        if found is not None and all(found.metadata.get(k) == v for k, v in (filter or {}).items()):
+            yield found
+
+    async def aput(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+                   new_versions: ChannelVersions) -> RunnableConfig:
+        thread_id, checkpoint_ns = self._keys(config)
+        type_, blob = self.serde.dumps_typed(checkpoint)
+        metadata_type, metadata_blob = self.serde.dumps_typed(get_checkpoint_metadata(config, metadata))
+        await self.repo.put((thread_id, checkpoint_ns, checkpoint["id"], config["configurable"].get("checkpoint_id"),
+                             type_, blob, metadata_type, metadata_blob))
+        return {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns,
+                                 "checkpoint_id": checkpoint["id"]}}
+
+    async def aput_writes(self, config: RunnableConfig, writes: Sequence[tuple[str, Any]], task_id: str,
+                          task_path: str = "") -> None:
+        thread_id, checkpoint_ns = self._keys(config)
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        rows = {True: [], False: []}
+        for idx, (channel, value) in enumerate(writes):
+            idx = WRITES_IDX_MAP.get(channel, idx)
+            type_, blob = self.serde.dumps_typed(value)
+            rows[idx < 0].append((thread_id, checkpoint_ns, checkpoint_id, task_id, idx, channel, type_, blob,
+                                  task_path))
+        for replace, batch in rows.items():
+            if batch:
+                await self.repo.put_writes(batch, replace)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await self.repo.delete_thread(thread_id)
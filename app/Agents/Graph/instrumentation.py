@@ -0,0 +1,119 @@
+import functools
+import json
+import logging
+import os
+import time
+from collections import defaultdict, deque
+from typing import Any, Dict, Optional
+
+from app.tracing import Trace, current_trace
+
+logger = logging.getLogger(__name__)
+
+# Append one JSON line per bot turn here (empty: off)
+BOT_TRACE_FILE = os.getenv("BOT_TRACE_FILE", "")
+# Recent samples kept per node / tool for the percentiles in /status
+BOT_STATS_WINDOW = int(os.getenv("BOT_STATS_WINDOW", "1000"))
+
+DB_SPANS = ("db.query", "db.commit", "db.checkout")
+TOKEN_KEYS = ("input_tokens", "output_tokens", "cached_tokens")
+
+
+def traced_node(name: str, node):
+    """Wrap a graph node so each run is timed into the current turn's trace, with the tokens it spent."""
+
+    @functools.wraps(node)
+    async def wrapper(state):
+        trace = current_trace()
+        if trace is None:
+            return await node(state)
+        before = state.get("token_usage") or {}
+        result = None
+        t0 = time.perf_counter()
+        try:
+            result = await node(state)
+            return result
+        finally:
+            entry = {"kind": "node", "detail": name, "ms": (time.perf_counter() - t0) * 1000}
+            after = (result or {}).get("token_usage") or {}
+            for key in TOKEN_KEYS:
+                if after.get(key, 0) > before.get(key, 0):
+                    entry[key] = after[key] - before.get(key, 0)
+            trace.spans.append(entry)
+
+    return wrapper
+
+
+def _percentile(ordered: list, q: float) -> float:
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+class GraphStats:
+    """Recent per-turn timings (ms) by series: turn, first_reply, node:<name>, tool:<name>, db, telegram."""
+
+    def __init__(self, window: int = BOT_STATS_WINDOW):
+        self.samples: Dict[str, deque] = defaultdict(lambda: deque(maxlen=window))
+
+    def record(self, series: str, ms: float):
+        self.samples[series].append(ms)
+
+    def percentiles(self) -> Dict[str, Dict[str, float]]:
+        out = {}
+        for series, values in self.samples.items():
+            ordered = sorted(values)
+            out[series] = {"n": len(ordered), "p50": round(_percentile(ordered, 0.5), 1),
+                           "p95": round(_percentile(ordered, 0.95), 1)}
+        return out
+
+
+graph_stats = GraphStats()
+
+
+def turn_summary(trace: Trace, session_id: str, state: Optional[Dict[str, Any]] = None,
+                 first_reply_ms: Optional[float] = None) -> Dict[str, Any]:
+    """One bot turn's trace as a JSON-able record; also feeds graph_stats."""
+    state = state or {}
+    nodes, tools = [], []
+    for s in trace.spans:
+        if s["kind"] == "node":
+            nodes.append({"node": s["detail"], "ms": round(s["ms"], 3), **{k: s[k] for k in TOKEN_KEYS if k in s}})
+        elif s["kind"] == "tool":
+            tools.append({"tool": s["detail"], "ms": round(s["ms"], 3), "db_ms": round(s.get("db_ms", 0.0), 3),
+                          "queries": s.get("queries", 0), "ok": s.get("ok", True)})
+    db_ms = sum(trace.total_ms(kind) for kind in DB_SPANS) + sum(t["db_ms"] for t in tools)
+    record = {
+        "ts": time.time(),
+        "session_id": session_id,
+        "total_ms": round(trace.elapsed_ms(), 3),
+        "first_reply_ms": round(first_reply_ms, 3) if first_reply_ms is not None else None,
+        "nodes": nodes,
+        "tools": tools,
+        "db_ms": round(db_ms, 3),
+        "db_queries": trace.count("db.query") + sum(t["queries"] for t in tools),
+        "telegram_ms": round(trace.total_ms("telegram"), 3),
+        "tokens": state.get("token_usage") or {},
+        "route": bool(state.get("route")),
+        "cached": bool(state.get("cached")),
+        "budget_exhausted": (state.get("budget") or {}).get("exhausted"),
+    }
+    graph_stats.record("turn", record["total_ms"])
+    if first_reply_ms is not None:
+        graph_stats.record("first_reply", first_reply_ms)
+    for n in nodes:
+        graph_stats.record(f"node:{n['node']}", n["ms"])
+    for t in tools:
+        graph_stats.record(f"tool:{t['tool']}", t["ms"])
+    graph_stats.record("db", record["db_ms"])
+    if record["telegram_ms"]:
+        graph_stats.record("telegram", record["telegram_ms"])
+    return record
+
+
+def write_trace(record: Dict[str, Any], path: str = BOT_TRACE_FILE):
+    if not path:
+        return
+    try:
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, separators=(",", ":"), default=str) + "\n")
+    except OSError:
+        logger.exception("Could not write bot trace to %s", path)
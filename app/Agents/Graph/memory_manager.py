@@ -1,39 +1,331 @@
-from langchain.memory import ConversationBufferMemory
-from langchain.schema import BaseMessage
-from typing import List
-from app.Agents.Graph.prompts import inventory_chain, inventory_chain
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional
 
+from langchain_core.messages import BaseMessage, HumanMessage, AIMessage
+from app.Agents.Graph.prompts import get_inventory_chain
+from app.tracing import detach_trace
+
+logger = logging.getLogger(__name__)
+
+# Sessions kept in RAM; the least recently used beyond this are dropped
+MEMORY_MAX_SESSIONS = int(os.getenv("MEMORY_MAX_SESSIONS", "2000"))
+# Sessions untouched for this long are dropped
+MEMORY_IDLE_SECONDS = float(os.getenv("MEMORY_IDLE_SECONDS", "3600"))
+# Cap on the text held across all sessions (characters)
+MEMORY_MAX_CHARS = int(os.getenv("MEMORY_MAX_CHARS", "20000000"))
+# Prompt tokens of verbatim history sent per turn; older turns are folded into the summary
+MEMORY_TOKEN_BUDGET = int(os.getenv("MEMORY_TOKEN_BUDGET", "1200"))
+MEMORY_SUMMARY_TOKENS = int(os.getenv("MEMORY_SUMMARY_TOKENS", "300"))
+
+# Where conversations persist: "db" (chat_messages table, shared by every bot process) or "memory"
+MEMORY_STORE = os.getenv("MEMORY_STORE", "db")
+# Messages read back when a session is not in RAM; older ones only survive in the rolling summary
+MEMORY_LOAD_MESSAGES = int(os.getenv("MEMORY_LOAD_MESSAGES", "40"))
+# Write-behind: buffered messages are flushed this often, or sooner once this many are waiting
+MEMORY_FLUSH_SECONDS = float(os.getenv("MEMORY_FLUSH_SECONDS", "0.5"))
+MEMORY_FLUSH_BATCH = int(os.getenv("MEMORY_FLUSH_BATCH", "200"))
+
+SUMMARY_HEADER = "Summary of our earlier conversation:"
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token for English; close enough for budgeting without loading a tokenizer
+    return len(text) // 4 + 1
+
+
+def _clip(text: str, limit: int) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[:limit - 1] + "…"
+
+
+class SessionMemory:
+    """
+    One customer's conversation: the latest turns verbatim within MEMORY_TOKEN_BUDGET, and one line
+    per older turn in a rolling summary capped at MEMORY_SUMMARY_TOKENS (oldest lines go first).
+    """
+
+    def __init__(self, token_budget: int = MEMORY_TOKEN_BUDGET, summary_tokens: int = MEMORY_SUMMARY_TOKENS):
+        self.token_budget = token_budget
+        self.summary_tokens = summary_tokens
+        self.turns: List[tuple[str, str]] = []
+        self.summary: List[str] = []
+        self.last_used = time.monotonic()
+        # Messages of this session in the store as this process knows it (loaded + appended here)
+        self.known = 0
+
+    @property
+    def chars(self) -> int:
+        return sum(len(u) + len(a) for u, a in self.turns) + sum(len(line) for line in self.summary)
+
+    def history(self) -> List[BaseMessage]:
+        """Messages for the prompt's chat_history slot."""
+        messages: List[BaseMessage] = []
+        if self.summary:
+            messages.append(AIMessage(content="\n".join([SUMMARY_HEADER, *self.summary])))
+        for user, ai in self.turns:
+            messages.append(HumanMessage(content=user))
+            messages.append(AIMessage(content=ai))
+        return messages
+
+    def save_turn(self, user_input: str, ai_response: str):
+        self.turns.append((user_input, ai_response))
+        self._trim()
+
+    def _trim(self):
+        used = sum(estimate_tokens(u) + estimate_tokens(a) for u, a in self.turns)
+        # Always keep the latest turn verbatim, even if it alone is over budget
+        while len(self.turns) > 1 and used > self.token_budget:
+            user, ai = self.turns.pop(0)
+            used -= estimate_tokens(user) + estimate_tokens(ai)
+            self.summary.append(f"- Customer: {_clip(user, 120)} → Bot: {_clip(ai, 160)}")
+        while self.summary and sum(estimate_tokens(line) for line in self.summary) > self.summary_tokens:
+            self.summary.pop(0)
+
+    def clear(self):
+        self.turns.clear()
+        self.summary.clear()
+        self.known = 0
+
+
+class InMemorySessionStore:
+    """No persistence: conversations live and die with the process."""
+
+    def append(self, session_id: str, user_input: str, ai_response: str):
+        pass
+
+    async def load(self, session_id: str, limit: int) -> List[Dict[str, Any]]:
+        return []
+
+    async def count(self, session_id: str) -> Optional[int]:
+        return None
+
+    async def clear(self, session_id: str):
+        pass
+
+    async def close(self):
+        pass
+
+
+class DBSessionStore:
+    """
+    Conversations in the chat_messages table, so every bot process sees the same history.
+    Writes are append-only and write-behind: append() only buffers, and a background task
+    flushes the buffer in batches, so persisting a turn adds nothing to the reply path.
+    """
+
+    def __init__(self, db=None, flush_seconds: float = MEMORY_FLUSH_SECONDS, batch: int = MEMORY_FLUSH_BATCH):
+        self.db = db
+        self.flush_seconds = flush_seconds
+        self.batch = batch
+        self.pending: List[tuple] = []
+        # Rows handed to the database but not committed yet; still counted as pending
+        self.inflight: List[tuple] = []
+        self.flushed = 0
+        self.failed_flushes = 0
+        self._repo = None
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._stopping = False
+
+    @property
+    def repo(self):
+        if self._repo is None:
+            from app.DB.Sql.db_manager import AsyncDBManager
+            from app.DB.repositories.chat_repo import ChatRepository
+            self._repo = ChatRepository(self.db or AsyncDBManager())
+        return self._repo
+
+    def append(self, session_id: str, user_input: str, ai_response: str):
+        self.pending.append((session_id, "human", user_input))
+        self.pending.append((session_id, "ai", ai_response))
+        self._ensure_flusher()
+        if len(self.pending) >= self.batch:
+            self._wake.set()
+
+    def _ensure_flusher(self):
+        if self._task is not None and not self._task.done():
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return  # no loop (sync caller); the next flush() or close() writes the buffer
+        self._wake = asyncio.Event()
+        self._lock = self._lock or asyncio.Lock()
+        self._stopping = False
+        self._task = loop.create_task(self._run())
+
+    async def _run(self):
+        # Started lazily from some bot turn; its flushes are not part of that turn
+        detach_trace()
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+    async def flush(self):
+        """Write everything buffered so far; on failure the rows go back to the front of the buffer."""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            rows, self.pending = self.pending, []
+            if not rows:
+                return
+            self.inflight = rows
+            try:
+                await self.repo.append_messages(rows)
+                self.flushed += len(rows)
+            except Exception:
+                self.failed_flushes += 1
+                self.pending = rows + self.pending
+                logger.exception("Failed to persist %d chat messages; will retry", len(rows))
+            finally:
+                self.inflight = []
+
+    def _pending_for(self, session_id: str) -> int:
+        # Until the insert commits, the database count does not include in-flight rows either
+        return sum(1 for rows in (self.inflight, self.pending) for row in rows if row[0] == session_id)
+
+    async def load(self, session_id: str, limit: int) -> List[Dict[str, Any]]:
+        if self._pending_for(session_id):
+            await self.flush()
+        return await self.repo.recent_messages(session_id, limit)
+
+    async def count(self, session_id: str) -> Optional[int]:
+        return await self.repo.message_count(session_id) + self._pending_for(session_id)
+
+    async def clear(self, session_id: str):
+        self.pending = [row for row in self.pending if row[0] != session_id]
+        await self.repo.delete_session(session_id)
+
+    async def close(self):
+        """Stop the flusher and write whatever is still buffered."""
+        self._stopping = True
+        if self._task is not None:
+            if self._wake is not None:
+                self._wake.set()
+            try:
+                await self._task
+            except Exception:
+                logger.exception("Chat message flusher failed")
+            self._task = None
+        await self.flush()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"pending": len(self.pending), "flushed": self.flushed, "failed_flushes": self.failed_flushes}
+
+
+def create_session_store(kind: str = MEMORY_STORE):
+    if kind == "memory":
+        return InMemorySessionStore()
+    if kind == "db":
+        return DBSessionStore()
+    raise ValueError(f"Unknown MEMORY_STORE {kind!r} (expected 'db' or 'memory')")
 
-# Create conversation memory
-def create_conversation_memory() -> ConversationBufferMemory:
-    """Create a conversation buffer memory instance"""
-    return ConversationBufferMemory(
-        memory_key="chat_history",
-        return_messages=True,
-        input_key="input",
-        output_key="output"
-    )
 
-# Session-based memory storage (for multiple users)
 class MemoryManager:
-    def __init__(self):
-        self.sessions = {}
-    
-    def get_memory(self, session_id: str) -> ConversationBufferMemory:
+    """
+    Per-session memories in LRU order, bounded by idle time, session count and total size. RAM is a
+    cache over the session store: an evicted or never-seen session is loaded back lazily, and a
+    session another process has written to (or cleared) since is reloaded on its next turn.
+    """
+
+    def __init__(self, max_sessions: int = MEMORY_MAX_SESSIONS, idle_seconds: float = MEMORY_IDLE_SECONDS,
+                 max_chars: int = MEMORY_MAX_CHARS, store=None, load_messages: int = MEMORY_LOAD_MESSAGES):
+        self.store = store if store is not None else create_session_store()
+        self.load_messages = load_messages
+        self.max_sessions = max_sessions
+        self.idle_seconds = idle_seconds
+        self.max_chars = max_chars
+        self.sessions: "OrderedDict[str, SessionMemory]" = OrderedDict()
+        self.total_chars = 0
+        self.evicted = 0
+
+    def get_memory(self, session_id: str) -> SessionMemory:
         """Get or create memory for a session"""
-        if session_id not in self.sessions:
-            self.sessions[session_id] = create_conversation_memory()
-        return self.sessions[session_id]
-    
-    def clear_memory(self, session_id: str):
-        """Clear memory for a session"""
+        memory = self.sessions.get(session_id)
+        if memory is None:
+            memory = self.sessions[session_id] = SessionMemory()
+        self.sessions.move_to_end(session_id)
+        memory.last_used = time.monotonic()
+        return memory
+
+    async def history(self, session_id: str) -> List[BaseMessage]:
+        """Chat history for the prompt, loading the session from the store if RAM is missing or behind."""
+        memory = self.sessions.get(session_id)
+        try:
+            stored = await self.store.count(session_id)
+            if stored is not None and (memory is None or stored != memory.known):
+                await self._load(session_id, stored)
+        except Exception:
+            # A store outage degrades to whatever this process remembers
+            logger.exception("Failed to load conversation %s", session_id)
+        return self.get_memory(session_id).history()
+
+    async def _load(self, session_id: str, stored: int):
+        rows = await self.store.load(session_id, self.load_messages)
+        self.delete_session(session_id)
+        memory = self.get_memory(session_id)
+        user = None
+        for row in rows:
+            if row["role"] == "human":
+                user = row["content"]
+            elif user is not None:
+                memory.save_turn(user, row["content"])
+                user = None
+        memory.known = stored
+        self.total_chars += memory.chars
+        self.evict()
+
+    def save_turn(self, session_id: str, user_input: str, ai_response: str):
+        memory = self.get_memory(session_id)
+        before = memory.chars
+        memory.save_turn(user_input, ai_response)
+        memory.known += 2
+        self.total_chars += memory.chars - before
+        self.store.append(session_id, user_input, ai_response)
+        self.evict()
+
+    def evict(self):
+        now = time.monotonic()
+        # LRU order: the front is always the longest idle; the session just used is never dropped
+        while len(self.sessions) > 1:
+            session_id, memory = next(iter(self.sessions.items()))
+            if (len(self.sessions) <= self.max_sessions and self.total_chars <= self.max_chars
+                    and now - memory.last_used <= self.idle_seconds):
+                break
+            self.delete_session(session_id)
+            self.evicted += 1
+
+    async def clear_memory(self, session_id: str):
+        """Clear memory for a session, here and in the store"""
         if session_id in self.sessions:
+            self.total_chars -= self.sessions[session_id].chars
             self.sessions[session_id].clear()
-    
+        await self.store.clear(session_id)
+
     def delete_session(self, session_id: str):
         """Delete a session completely"""
-        if session_id in self.sessions:
-            del self.sessions[session_id]
+        memory = self.sessions.pop(session_id, None)
+        if memory is not None:
+            self.total_chars -= memory.chars
+
+    async def close(self):
+        """Flush buffered writes; call before the database is closed."""
+        await self.store.close()
+
+    def snapshot(self) -> Dict[str, Any]:
+        snap = {"sessions": len(self.sessions), "chars": self.total_chars, "evicted": self.evicted}
+        if hasattr(self.store, "snapshot"):
+            snap.update(self.store.snapshot())
+        return snap
 
 # Global memory manager instance
 memory_manager = MemoryManager()
@@ -41,38 +333,49 @@ memory_manager = MemoryManager()
 # Helper function to format conversation with memory
 async def get_conversation_context(session_id: str) -> List[BaseMessage]:
     """Get conversation history for a session"""
-    memory = memory_manager.get_memory(session_id)
-    return memory.chat_memory.messages
+    return await memory_manager.history(session_id)
 
 # Usage example function
 async def process_with_memory(session_id: str, user_input):
     """Process user input with conversation memory"""
-    # Get conversation history
-    memory = memory_manager.get_memory(session_id)
-    chat_history = memory.chat_memory.messages
-    
     # Create the input for the chain
     chain_input = {
-        "chat_history": chat_history,
+        "chat_history": await memory_manager.history(session_id),
         "messages": [("human", user_input)]
     }
     # Get response from the chain
-    response = await inventory_chain.ainvoke(chain_input)
-    
+    chain = await get_inventory_chain()
+    response = await chain.ainvoke(chain_input)
+
     # Save to memory
-    memory.save_context(
-        {"input": user_input},
-        {"output": response.content}
-    )
-    
+    memory_manager.save_turn(session_id, user_input, response.content)
+
     return response
 
 
+# LangChain buffer memories, for callers that want them directly. Imported on use: the legacy
+# memory classes are slow to import and deprecated
+def create_conversation_memory():
+    """Create a conversation buffer memory instance"""
+    try:
+        from langchain.memory import ConversationBufferMemory
+    except ImportError:  # langchain>=1.0 moved the legacy memory classes out
+        from langchain_classic.memory import ConversationBufferMemory
+    return ConversationBufferMemory(
+        memory_key="chat_history",
+        return_messages=True,
+        input_key="input",
+        output_key="output"
+    )
+
 
 # Optional: Memory with sliding window (keeps only last N exchanges)
-def create_windowed_memory(k: int = 10) -> ConversationBufferMemory:
+def create_windowed_memory(k: int = 10):
     """Create memory that keeps only the last k exchanges"""
-    from langchain.memory import ConversationBufferWindowMemory
+    try:
+        from langchain.memory import ConversationBufferWindowMemory
+    except ImportError:
+        from langchain_classic.memory import ConversationBufferWindowMemory
     return ConversationBufferWindowMemory(
         k=k,
         memory_key="chat_history",
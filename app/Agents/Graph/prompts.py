@@ -1,14 +1,20 @@
-from app.config.llm import  llm_with_tools
-from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
+import asyncio
+import logging
+import os
+import time
+from functools import lru_cache
+
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+
+logger = logging.getLogger(__name__)
+
+# "compact" (default) or "full"; both carry the same tool-selection and order rules
+PROMPT_VARIANT = os.getenv("PROMPT_VARIANT", "compact")
 
 # --- INVENTORY CHATBOT PROMPT ---
 
 # Inventory Assistant System 
 system_prompt_template = """
-Here is your updated system prompt with the requested hospitality, professionalism, product expertise, worker delegation, polite handling of irrelevancies, and strict tool-first compliance:
-
-***
-
 You are **InventoryBot**, a helpful, polite, and professional retail inventory assistant for an online shop, acting as the respected shopkeeper. Your role is to assist customers in checking product availability, getting pricing info, calculating order totals, and placing orders. You have a dedicated team ("workers") to assist with data retrieval and order processing. You always provide accurate, tool-driven information and exhibit superior hospitality throughout every interaction.  
 
 ## Tool Usage Protocol
@@ -51,22 +57,21 @@ Customer Request Type             |  Required Tool/Worker Sequence
 Availability inquiry              |  search→get_stockorget_card                                                                          |  Stock quantity from tool                   
 Pricing inquiry                   |  search→get_priceorget_card                                                                          |  Price data from tool                       
 Order calculation                 |  compute_order_total                                                                                 |  Tool’s calculated breakdown                
-Single item purchase intention    |  get_card→ Show order summary → Customer confirmation →update_inventory→generate_receipt             |  Sale confirmation & receipt from tools     
-Multiple item purchase intention  |  compute_order_total→ Show order summary → Customer confirmation →update_inventory→generate_receipt  |  Confirmation & receipt from tools          
+Single item purchase intention    |  get_card→ sell_single_item with the order summary as your message (system asks to confirm)         |  Sale confirmation & receipt from tools     
+Multiple item purchase intention  |  compute_order_total→ sell_multiple_items with the order summary as your message (system confirms)   |  Confirmation & receipt from tools          
 Product comparison/ benefit       |  get_card→ Provide professional product insight                                                      |  Factual expert description from worker/tool
+Reorder / low-stock (shopkeeper)  |  reorder_suggestions                                                                                 |  Suggested quantities and days of cover from tool
 Irrelevant or silly query         |  None—respond hospitably, clarify purpose                                                            |  Gentle reminder; cheerful redirect         
 
 ## Inventory Update & Receipt Tools
--After confirmation ("yes", "confirm", "buy", "proceed"), use update_inventory ("my worker updates inventory") to deduct purchased quantities.
--If inventory update is successful, use generate_receipt ("my worker generates a receipt") to provide exact purchase details, itemized bill, and a thank-you note with emoji.
--ALWAYS show the receipt (order ID, purchased items, prices, date, payment status) after a successful purchase.
--If updating the inventory or generating a receipt fails, explain the error and do NOT process the sale.
+-Once the customer wants to buy, call sell_single_item / sell_multiple_items straight away, writing the order summary (items, quantities, prices, total) as your message.
+-The system holds that call and asks the customer to confirm; nothing is sold until they say "yes", and the sale then runs without you. Do NOT ask for confirmation yourself first.
+-If the sale fails you are shown the tool result: explain the error and do NOT claim the sale happened.
 # Tool Call Logic Template:
--Show order summary, request confirmation.
-# On confirmation:
--Call update_inventory(order_items, inventory) with latest basket.
--If successful, call generate_receipt(order_id, customer, order_items, inventory, payment_status="paid").
--Display receipt and express thanks (with emoji).
+-Show order summary in the same message as the sell tool call.
+# On confirmation (handled by the system):
+-For a basket quoted by compute_order_total, pass its stock_versions as expected_versions to sell_multiple_items; on "stock_changed", re-run compute_order_total and call sell_multiple_items again.
+-The receipt comes from the sell tool's result.
 -If failure, show error message and guide the customer politely.
 
 
@@ -99,12 +104,92 @@ You are the polite, knowledgeable shopkeeper. All info must come from your trust
 ***
 """
 
+# Same rules as the full prompt at about a fifth of its size; it is resent on every LLM call
+compact_system_prompt = """
+You are InventoryBot, the polite shopkeeper of an online store. You help customers check availability, prices and order totals, and place orders. Your tools are your "workers".
+
+Rules:
+- Every fact (names, SKUs, prices, stock) must come from a tool result in this conversation. Never guess, estimate or round.
+- If a tool fails or finds nothing, say so politely and suggest an alternative.
+- Only products, prices and orders are in scope; cheerfully redirect anything else.
+- Be warm and brief; a fitting emoji is welcome. Use bullet points for lists and line items for orders.
+
+Tool to use:
+- availability: search, then get_stock or get_card
+- price: search, then get_price or get_card
+- order total: compute_order_total
+- buy one item: get_card, then sell_single_item
+- buy several: compute_order_total, then sell_multiple_items with expected_versions = its stock_versions
+- product benefits/comparison: get_card, then answer as an expert from its data only
+- reorder / low stock (shopkeeper): reorder_suggestions
+
+Orders:
+- Call the sell tool as soon as the customer wants to buy, with the order summary (items, quantities, prices, total) as your message. The system asks the customer to confirm and completes the sale; do not ask for confirmation yourself.
+- On error "stock_changed", re-run compute_order_total and call sell_multiple_items again.
+- If a sale fails, explain the error; never claim it went through.
+"""
+
+SYSTEM_PROMPTS = {"full": system_prompt_template, "compact": compact_system_prompt}
+
+
+def system_prompt(variant: str = PROMPT_VARIANT) -> str:
+    if variant not in SYSTEM_PROMPTS:
+        raise ValueError(f"Unknown PROMPT_VARIANT {variant!r} (expected one of {sorted(SYSTEM_PROMPTS)})")
+    return SYSTEM_PROMPTS[variant]
+
+
+def build_prompt(variant: str = PROMPT_VARIANT, include_system: bool = True) -> ChatPromptTemplate:
+    """The chat prompt; the system message stays first and unchanged so providers can cache the prefix."""
+    messages = [("system", system_prompt(variant))] if include_system else []
+    return ChatPromptTemplate.from_messages(messages + [
+        MessagesPlaceholder(variable_name="chat_history"),  # For conversation memory
+        MessagesPlaceholder(variable_name="messages"),      # For current exchange
+    ])
+
+
 # Create the prompt template with memory
-inventory_prompt = ChatPromptTemplate.from_messages([
-    ("system", system_prompt_template),
-    MessagesPlaceholder(variable_name="chat_history"),  # For conversation memory
-    MessagesPlaceholder(variable_name="messages"),      # For current exchange
-])
+inventory_prompt = build_prompt()
+
+# Explicit context cache in use: (cache name, expiry as time.time()) and the chain built on it
+_context_cache = None
+_cached_chain = None
+_renew_lock = None
+
 
 # Create the final chain (you'll use this in your LangGraph)
-inventory_chain = inventory_prompt | llm_with_tools
+@lru_cache(maxsize=1)
+def _uncached_chain():
+    from app.config.llm import get_llm_with_tools
+    return inventory_prompt | get_llm_with_tools()
+
+
+def _cache_due() -> bool:
+    return _context_cache is None or time.time() > _context_cache[1] - 60
+
+
+async def get_inventory_chain():
+    """
+    Prompt | tool-bound LLM, built on first call so importing the graph does not load the model client.
+
+    With LLM_CONTEXT_CACHE=explicit the system prompt and tool declarations are uploaded once as
+    cached content and only the conversation is sent per call; the cache is renewed shortly before
+    it expires (one upload at a time, off the event loop), and any failure falls back to the plain chain.
+    """
+    global _context_cache, _cached_chain, _renew_lock
+    from app.config import llm
+    # Cached content is a Gemini feature; other providers always get the full prompt
+    if llm.LLM_CONTEXT_CACHE != "explicit" or llm.LLM_PROVIDER != "google":
+        return _uncached_chain()
+    if _cache_due():
+        _renew_lock = _renew_lock or asyncio.Lock()
+        async with _renew_lock:
+            if _cache_due():
+                try:
+                    # create_context_cache is a blocking gRPC call
+                    _context_cache = await asyncio.to_thread(llm.create_context_cache, system_prompt())
+                    _cached_chain = build_prompt(include_system=False) | llm.get_cached_llm(_context_cache[0])
+                except Exception:
+                    logger.exception("Context cache unavailable; sending the full prompt")
+                    # Retry in a minute rather than on every call
+                    _context_cache, _cached_chain = ("", time.time() + 120), None
+    return _cached_chain or _uncached_chain()
@@ -0,0 +1,90 @@
+import json
+import os
+import time
+from collections import Counter
+from typing import Any, Dict, Optional
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+# Per-turn limits; a turn that would exceed one ends with what it has found so far
+TURN_MAX_LLM_CALLS = int(os.getenv("TURN_MAX_LLM_CALLS", "4"))
+TURN_MAX_TOOL_CALLS = int(os.getenv("TURN_MAX_TOOL_CALLS", "12"))
+TURN_TIMEOUT_SECONDS = float(os.getenv("TURN_TIMEOUT_SECONDS", "30"))
+# error_handling rounds before the turn stops retrying through the LLM
+TURN_MAX_ERRORS = int(os.getenv("TURN_MAX_ERRORS", "2"))
+
+# Turns cut short, by the budget that ran out
+degraded_turns: Counter = Counter()
+
+
+def new_turn_budget() -> Dict[str, Any]:
+    """Budget state for a new turn; callers put it in the graph input (the checkpoint keeps the old one)."""
+    return {"started_at": time.time(), "llm_calls": 0, "tool_calls": 0, "exhausted": None}
+
+
+def turn_budget(state) -> Dict[str, Any]:
+    budget = state.get("budget") or {}
+    if not budget.get("started_at"):
+        budget = {**new_turn_budget(), **{k: v for k, v in budget.items() if v is not None}}
+    return dict(budget)
+
+
+def remaining_seconds(state) -> float:
+    return TURN_TIMEOUT_SECONDS - (time.time() - turn_budget(state)["started_at"])
+
+
+def remaining_tool_calls(state) -> int:
+    return max(TURN_MAX_TOOL_CALLS - turn_budget(state).get("tool_calls", 0), 0)
+
+
+def exhausted(state, llm_calls_needed: int = 1) -> Optional[str]:
+    """The budget that stops the turn from making `llm_calls_needed` more LLM calls, if any."""
+    budget = turn_budget(state)
+    if remaining_seconds(state) <= 0:
+        return "time"
+    if budget.get("llm_calls", 0) + llm_calls_needed > TURN_MAX_LLM_CALLS:
+        return "llm_calls"
+    if state.get("error_count", 0) >= TURN_MAX_ERRORS:
+        return "errors"
+    return None
+
+
+def _describe(result) -> Optional[str]:
+    if isinstance(result, dict):
+        if result.get("message"):
+            return str(result["message"])
+        if "name" in result or "sku" in result:
+            line = f"• {result.get('name') or result.get('sku')}"
+            if result.get("variety"):
+                line += f" ({result['variety']})"
+            if result.get("price") is not None:
+                line += f" — ₹{result['price']}"
+            if result.get("quantity") is not None:
+                line += f", {result['quantity']} in stock"
+            return line
+    return None
+
+
+def degraded_reply(state) -> AIMessage:
+    """What the customer gets when a budget runs out: the facts already fetched this turn, if any."""
+    found = []
+    messages = state["messages"]
+    start = max((i for i, m in enumerate(messages) if isinstance(m, HumanMessage)), default=0)
+    for msg in messages[start:]:
+        if not isinstance(msg, ToolMessage) or msg.content.startswith("Error"):
+            continue
+        try:
+            result = json.loads(msg.content)
+        except ValueError:
+            continue
+        if isinstance(result, dict) and isinstance(result.get("items"), list):
+            result = result["items"]  # search results
+        for item in result[:5] if isinstance(result, list) else [result]:
+            line = _describe(item)
+            if line and line not in found:
+                found.append(line)
+    text = "⏳ Sorry, I couldn't finish that one in time."
+    if found:
+        text += " Here's what my workers found so far:\n" + "\n".join(found[:8])
+    text += "\nPlease ask again, or try a more specific question 😊"
+    return AIMessage(content=text)
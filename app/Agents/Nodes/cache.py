@@ -0,0 +1,195 @@
+import asyncio
+import json
+import logging
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Any
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from app.Agents.Nodes.router import catalog_index
+from app.Agents.State.state import ChatbotState
+from app.Agents.tools.tools import service
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "1") != "0"
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "512"))
+# Upper bound on an entry's age even when none of its rows changed (wording, promotions, ...)
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "3600"))
+
+# Answers built only from these tools depend on nothing but catalog and stock rows
+CACHEABLE_TOOLS = {"get_price", "get_stock", "get_card", "varieties", "search", "compute_order_total"}
+# These also depend on which products exist, not just on the rows they returned
+CATALOG_TOOLS = {"varieties", "search"}
+MAX_DEPENDENCIES = 50
+
+PUNCTUATION = re.compile(r"[^\w\s-]")
+SPACES = re.compile(r"\s+")
+
+
+def normalize_query(text: str) -> str:
+    return SPACES.sub(" ", PUNCTUATION.sub(" ", text.lower())).strip()
+
+
+def _collect_skus(value, out: set):
+    if isinstance(value, dict):
+        sku = value.get("sku")
+        if isinstance(sku, str):
+            out.add(sku)
+        for v in value.values():
+            _collect_skus(v, out)
+    elif isinstance(value, list):
+        for v in value:
+            _collect_skus(v, out)
+
+
+def _current_turn(messages: list) -> list:
+    for i in range(len(messages) - 1, -1, -1):
+        if isinstance(messages[i], HumanMessage):
+            return messages[i:]
+    return messages
+
+
+class ResponseCache:
+    """
+    Final answers keyed on the normalised question, each stored with the versions of the rows it was
+    built from: (price, stock_version) per product it mentioned and, for search / variety answers,
+    the catalog version. A hit re-reads those versions in one query and is served only if none moved.
+    """
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_SIZE, ttl_seconds: float = RESPONSE_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.stored = 0
+        self._sweep: Optional[asyncio.Task] = None
+
+    async def _versions(self, skus: list[str], catalog: bool) -> Dict[str, Any]:
+        cards = await service.product_cards(skus)
+        versions = {sku: [cards[sku]["price"], cards[sku]["stock_version"]] if sku in cards else None
+                    for sku in skus}
+        if catalog:
+            versions["__catalog__"] = await service.catalog_version()
+        return versions
+
+    async def get(self, query: str) -> Optional[str]:
+        key = normalize_query(query)
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        fresh = time.monotonic() - entry["stored_at"] < self.ttl_seconds
+        if not fresh or await self._versions(entry["skus"], entry["catalog"]) != entry["versions"]:
+            self.entries.pop(key, None)
+            self.stale += 1
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry["answer"]
+
+    async def put(self, query: str, answer: str, skus: list[str], catalog: bool):
+        versions = await self._versions(skus, catalog)
+        key = normalize_query(query)
+        self.entries[key] = {"answer": answer, "skus": skus, "catalog": catalog, "versions": versions,
+                             "stored_at": time.monotonic()}
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        self.stored += 1
+
+    async def store_turn(self, state: ChatbotState):
+        """Cache the turn's answer if it came from read-only tools about products the question names."""
+        if not RESPONSE_CACHE_ENABLED or state.get("route") or state.get("cached") or state.get("pending_confirmation"):
+            return
+        if (state.get("budget") or {}).get("exhausted"):
+            return
+        turn = _current_turn(state["messages"])
+        question, answer = turn[0], turn[-1]
+        if not isinstance(question, HumanMessage) or not isinstance(answer, AIMessage) or not answer.content:
+            return
+        tools, skus = set(), set()
+        for msg in turn:
+            for call in getattr(msg, "tool_calls", None) or []:
+                tools.add(call["name"])
+                _collect_skus(call["args"], skus)
+            if isinstance(msg, ToolMessage):
+                if msg.content.startswith("Error"):
+                    return
+                try:
+                    _collect_skus(json.loads(msg.content), skus)
+                except ValueError:
+                    return
+        if not tools or not tools <= CACHEABLE_TOOLS or not skus or len(skus) > MAX_DEPENDENCIES:
+            return
+        # Follow-ups ("how about the large one?") lean on chat history; only cache questions that
+        # name a product themselves. The router may be disabled, so the index is not loaded yet.
+        await catalog_index.ensure_fresh()
+        entry, named, _ = catalog_index.match(question.content)
+        if entry is None and not named:
+            return
+        await self.put(question.content, answer.content, sorted(skus), bool(tools & CATALOG_TOOLS))
+
+    def on_ledger_committed(self):
+        """Ledger listener: drop entries whose stock moved, in one background sweep per burst of writes."""
+        if self._sweep is None or self._sweep.done():
+            try:
+                self._sweep = asyncio.get_running_loop().create_task(self.sweep())
+            except RuntimeError:
+                pass
+
+    async def sweep(self):
+        await asyncio.sleep(0.5)
+        entries = list(self.entries.items())
+        if not entries:
+            return
+        skus = sorted({sku for _, e in entries for sku in e["skus"]})
+        try:
+            current = await self._versions(skus, any(e["catalog"] for _, e in entries))
+        except Exception:
+            logger.exception("Response cache sweep failed")
+            return
+        for key, e in entries:
+            if any(current.get(k) != v for k, v in e["versions"].items()) and self.entries.get(key) is e:
+                del self.entries[key]
+                self.stale += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "stale_evictions": self.stale,
+            "stored": self.stored,
+        }
+
+
+response_cache = ResponseCache()
+service.add_ledger_listener(response_cache.on_ledger_committed)
+
+
+async def cache_lookup_node(state: ChatbotState) -> ChatbotState:
+    """Serve a cached answer when none of the rows it was built from have changed"""
+    last_message = state["messages"][-1]
+    if not RESPONSE_CACHE_ENABLED or state.get("pending_confirmation") or not isinstance(last_message, HumanMessage):
+        return state
+    try:
+        answer = await response_cache.get(last_message.content)
+    except Exception:
+        logger.exception("Response cache lookup failed")
+        return state
+    if answer is None:
+        return state
+    return {
+        **state,
+        "messages": state["messages"] + [AIMessage(content=answer)],
+        "cached": True,
+    }
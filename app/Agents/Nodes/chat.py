@@ -1,10 +1,24 @@
+import asyncio
+import logging
+import os
+import re
+import time
+
 from langchain_core.messages import HumanMessage, AIMessage, ToolMessage
-from app.Agents.tools.tools import get_price, get_stock, get_card, varieties, search, sell_multiple_items,sell_single_item,compute_order_total
-from app.Agents.Graph.prompts import inventory_chain
+from pydantic import BaseModel
+from app.Agents.tools.tools import get_price, get_stock, get_card, varieties, search, sell_multiple_items,sell_single_item,compute_order_total, reorder_suggestions
+from app.Agents.Graph.prompts import get_inventory_chain
+from app.config.llm import token_usage, add_usage
 from app.Agents.Graph.memory_manager import memory_manager
+from app.Agents.Nodes.cache import response_cache
+from app.Agents.Nodes.budget import (turn_budget, remaining_seconds, remaining_tool_calls, exhausted,
+                                     degraded_reply, degraded_turns)
 from app.Agents.State.state import  ChatbotState
+from app.tracing import current_trace, start_trace, end_trace
 import json
 
+logger = logging.getLogger(__name__)
+
 # Available tools mapping
 # In your graph.py or wherever you define TOOLS
 TOOLS = {
@@ -15,21 +29,48 @@ TOOLS = {
     "search": search,
     "sell_single_item": sell_single_item,           # NEW
     "sell_multiple_items": sell_multiple_items,     # NEW  
-    "compute_order_total": compute_order_total      # NEW
+    "compute_order_total": compute_order_total,     # NEW
+    "reorder_suggestions": reorder_suggestions,
 }
 
 # Update tool categories
-SAFE_TOOLS = {"get_price", "get_stock", "get_card", "varieties", "search", "compute_order_total"}
+SAFE_TOOLS = {"get_price", "get_stock", "get_card", "varieties", "search", "compute_order_total", "reorder_suggestions"}
 WRITE_TOOLS = {"sell_single_item", "sell_multiple_items"}  # These need confirmation
 
+# Safe tool calls from one LLM message run concurrently, at most this many at a time
+TOOL_CONCURRENCY = int(os.getenv("TOOL_CONCURRENCY", "4"))
+TOOL_TIMEOUT_SECONDS = float(os.getenv("TOOL_TIMEOUT_SECONDS", "10"))
+# Per-tool overrides; reorder_suggestions may compute every product's reorder point on first use
+TOOL_TIMEOUTS = {"reorder_suggestions": 60.0}
+
+# A pending order older than this is dropped instead of being placed by a late "yes"
+CONFIRMATION_TTL_SECONDS = float(os.getenv("CONFIRMATION_TTL_SECONDS", "900"))
+CONFIRM_WORDS = {"yes", "y", "yeah", "yep", "sure", "confirm", "confirmed", "ok", "okay", "proceed"}
+# Words a short "yes" may carry besides CONFIRM_WORDS ("yes please", "ok do it")
+CONFIRM_FILLER = {"please", "thanks", "thank", "you", "do", "it"}
+CANCEL_WORDS = {"no", "n", "nope", "cancel", "stop", "abort", "don't", "dont"}
+WORDS = re.compile(r"[\w']+")
+
+
+def confirmation_answer(text: str) -> str | None:
+    """
+    'yes', 'no' or None for a reply to a confirmation prompt; a reply with both counts as 'no'.
+    Only a bare affirmation is a 'yes': "ok what about sugar?" is a new request, not a confirmation.
+    """
+    words = set(WORDS.findall(text.lower()))
+    if words & CANCEL_WORDS:
+        return "no"
+    if words & CONFIRM_WORDS and words <= CONFIRM_WORDS | CONFIRM_FILLER:
+        return "yes"
+    return None
+
 
 async def memory_node(state: ChatbotState) -> ChatbotState:
     """Load conversation memory for the session"""
     session_id = state.get("session_id", "default")
-    memory = memory_manager.get_memory(session_id)
     
-    # Get conversation history
-    chat_history = memory.chat_memory.messages
+    # Recent turns within the token budget, older ones as a rolling summary
+    chat_history = await memory_manager.history(session_id)
     
     return {
         **state,
@@ -44,70 +85,141 @@ async def llm_node(state: ChatbotState) -> ChatbotState:
         "messages": state["messages"]
     }
     
-    # Get LLM response with potential tool calls
-    response = await inventory_chain.ainvoke(chain_input)
+    budget = turn_budget(state)
+    budget["llm_calls"] = budget.get("llm_calls", 0) + 1
+    
+    # Get LLM response with potential tool calls, within what is left of the turn's time
+    try:
+        chain = await get_inventory_chain()
+        response = await asyncio.wait_for(chain.ainvoke(chain_input), max(remaining_seconds(state), 1.0))
+    except asyncio.TimeoutError:
+        degraded_turns["time"] += 1
+        return {
+            **state,
+            "messages": state["messages"] + [degraded_reply(state)],
+            "budget": {**budget, "exhausted": "time"}
+        }
     
     # Add AI response to messages
     updated_messages = state["messages"] + [response]
     
     return {
         **state,
-        "messages": updated_messages
+        "messages": updated_messages,
+        "token_usage": add_usage(state.get("token_usage"), token_usage.record(response)),
+        "budget": budget
     }
 
+def _json_default(value):
+    # Tools return pydantic models (StockResponse, ProductCard, ...) as well as plain dicts
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    return str(value)
+
+
+async def _run_tool_call(tool_call: dict, slots: asyncio.Semaphore,
+                         max_timeout: float | None = None) -> tuple[ToolMessage, dict]:
+    """Run one tool call, timed into the turn's trace with the DB time it spent."""
+    parent = current_trace()
+    if parent is None:
+        return await _call_tool(tool_call, slots, max_timeout)
+    # A child trace per call: concurrent tools' queries would otherwise be indistinguishable
+    child, token = start_trace(tool_call["name"])
+    try:
+        message, result = await _call_tool(tool_call, slots, max_timeout)
+    finally:
+        end_trace(token)
+    parent.spans.append({
+        "kind": "tool",
+        "detail": tool_call["name"],
+        "ms": child.elapsed_ms(),
+        "db_ms": sum(child.total_ms(kind) for kind in ("db.query", "db.commit", "db.checkout")),
+        "queries": child.count("db.query"),
+        "ok": result["success"],
+    })
+    return message, result
+
+
+async def _call_tool(tool_call: dict, slots: asyncio.Semaphore,
+                     max_timeout: float | None = None) -> tuple[ToolMessage, dict]:
+    """Run one tool call; failures and timeouts become an error ToolMessage instead of raising."""
+    tool_name = tool_call["name"]
+    tool_args = tool_call["args"]
+    timeout = TOOL_TIMEOUTS.get(tool_name, TOOL_TIMEOUT_SECONDS)
+    if max_timeout is not None:
+        timeout = max(min(timeout, max_timeout), 0.1)
+    try:
+        async with slots:
+            result = await asyncio.wait_for(TOOLS[tool_name].ainvoke(tool_args), timeout)
+        content = json.dumps(result, default=_json_default)
+        tool_message = ToolMessage(content=content, tool_call_id=tool_call["id"])
+        # State keeps the JSON form: it is checkpointed, and the serializer only round-trips plain types
+        return tool_message, {"tool": tool_name, "args": tool_args, "result": json.loads(content), "success": True}
+    except asyncio.TimeoutError:
+        error = f"timed out after {timeout:g}s"
+    except Exception as e:
+        error = str(e)
+    error_message = ToolMessage(content=f"Error: {error}", tool_call_id=tool_call["id"])
+    return error_message, {"tool": tool_name, "args": tool_args, "error": error, "success": False}
+
+
+def _call_key(tool_call: dict) -> str:
+    return f"{tool_call['name']}:{json.dumps(tool_call['args'], sort_keys=True, default=str)}"
+
+
 async def tool_execution_node(state: ChatbotState) -> ChatbotState:
-    """Execute safe tools and collect results"""
+    """Execute safe tools concurrently and collect results in the order the LLM asked for them.
+
+    A call identical to one already answered this turn reuses that result instead of running again,
+    and calls beyond the turn's tool budget get an error result without running.
+    """
     last_message = state["messages"][-1]
     tool_calls = getattr(last_message, "tool_calls", [])
-    
-    tool_results = []
+    budget = turn_budget(state)
+    seen = dict(state.get("tool_cache") or {})
+
+    # First occurrence of each new safe call, up to the remaining budget
+    to_run: dict[str, dict] = {}
+    allowance = remaining_tool_calls(state)
+    for tc in tool_calls:
+        key = _call_key(tc)
+        if tc["name"] in SAFE_TOOLS and key not in seen and key not in to_run and len(to_run) < allowance:
+            to_run[key] = tc
+
+    slots = asyncio.Semaphore(TOOL_CONCURRENCY)
+    # gather keeps argument order, so results line up with to_run's keys
+    outcomes = await asyncio.gather(*(_run_tool_call(tc, slots, remaining_seconds(state))
+                                      for tc in to_run.values()))
+    ran = dict(zip(to_run, outcomes))
+    budget["tool_calls"] = budget.get("tool_calls", 0) + len(ran)
+    tool_results = [result for _, result in outcomes]
+
+    # Every tool call gets exactly one ToolMessage, in the order the AIMessage lists them
     tool_messages = []
-    
-    for tool_call in tool_calls:
-        tool_name = tool_call["name"]
-        tool_args = tool_call["args"]
-        
-        if tool_name in SAFE_TOOLS:
-            try:
-                # Execute the tool
-                tool_func = TOOLS[tool_name]
-                result = await tool_func.ainvoke(tool_args)
-                
-                # Create tool message
-                tool_message = ToolMessage(
-                    content=json.dumps(result),
-                    tool_call_id=tool_call["id"]
-                )
-                tool_messages.append(tool_message)
-                tool_results.append({
-                    "tool": tool_name,
-                    "args": tool_args,
-                    "result": result,
-                    "success": True
-                })
-                
-            except Exception as e:
-                # Handle tool errors
-                error_message = ToolMessage(
-                    content=f"Error: {str(e)}",
-                    tool_call_id=tool_call["id"]
-                )
-                tool_messages.append(error_message)
-                tool_results.append({
-                    "tool": tool_name,
-                    "args": tool_args,
-                    "error": str(e),
-                    "success": False
-                })
-    
+    for tc in tool_calls:
+        key = _call_key(tc)
+        if key in ran:
+            content = ran[key][0].content
+            if ran[key][1]["success"]:
+                seen[key] = content
+        elif key in seen:
+            content = seen[key]
+        elif tc["name"] not in SAFE_TOOLS:
+            content = f"Error: unknown tool {tc['name']}"
+        else:
+            content = "Error: tool call budget for this turn is used up; answer with what you have"
+        tool_messages.append(ToolMessage(content=content, tool_call_id=tc["id"]))
+
     return {
         **state,
         "messages": state["messages"] + tool_messages,
-        "tool_results": tool_results
+        "tool_results": tool_results,
+        "tool_cache": seen,
+        "budget": budget
     }
 
 async def confirmation_node(state: ChatbotState) -> ChatbotState:
-    """Handle confirmation requests for write operations"""
+    """Hold the LLM's write tool calls and ask the customer to confirm them"""
     last_message = state["messages"][-1]
     tool_calls = getattr(last_message, "tool_calls", [])
     
@@ -115,16 +227,18 @@ async def confirmation_node(state: ChatbotState) -> ChatbotState:
     write_tool_calls = [tc for tc in tool_calls if tc["name"] in WRITE_TOOLS]
     
     if write_tool_calls:
-        # Store pending confirmation
+        # The whole tool-call message is kept so a "yes" next turn replays it without the LLM;
+        # the checkpointer carries it across messages
         pending = {
-            "tool_calls": write_tool_calls,
-            "requires_confirmation": True
+            "tool_calls": tool_calls,
+            "requires_confirmation": True,
+            "requested_at": time.time()
         }
         
-        # Create confirmation request message
-        confirmation_msg = AIMessage(
-            content="⚠️ This action will modify your inventory/place an order. Please confirm by saying 'yes' or 'confirm'."
-        )
+        # Create confirmation request message, after any order summary the LLM wrote
+        prompt = "⚠️ This action will modify your inventory/place an order. Please confirm by saying 'yes' or 'confirm'."
+        summary = last_message.content if isinstance(last_message.content, str) else ""
+        confirmation_msg = AIMessage(content=f"{summary}\n\n{prompt}" if summary else prompt)
         
         return {
             **state,
@@ -134,6 +248,55 @@ async def confirmation_node(state: ChatbotState) -> ChatbotState:
     
     return state
 
+async def execute_confirmed_node(state: ChatbotState) -> ChatbotState:
+    """Run the tool calls the customer just confirmed, and answer with the receipt when they all succeeded"""
+    tool_calls = state["pending_confirmation"]["tool_calls"]
+    call_message = AIMessage(content="", tool_calls=tool_calls)
+
+    slots = asyncio.Semaphore(TOOL_CONCURRENCY)
+    outcomes = await asyncio.gather(*(_run_tool_call(tc, slots) for tc in tool_calls))
+    tool_messages = [message for message, _ in outcomes]
+    tool_results = [result for _, result in outcomes]
+    messages = state["messages"] + [call_message] + tool_messages
+
+    # Write tools report refusals (stock, stale quote) as status "error" results; those go back to the LLM
+    receipts = [r["result"] for r in tool_results if r["tool"] in WRITE_TOOLS and r["success"]]
+    if (len(receipts) == sum(tc["name"] in WRITE_TOOLS for tc in tool_calls)
+            and all(isinstance(r, dict) and r.get("status") == "success" and r.get("message") for r in receipts)):
+        messages.append(AIMessage(content="\n".join(r["message"] for r in receipts)))
+
+    return {
+        **state,
+        "messages": messages,
+        "tool_results": tool_results,
+        "pending_confirmation": None
+    }
+
+async def cancel_confirmation_node(state: ChatbotState) -> ChatbotState:
+    """Drop the pending order at the customer's request"""
+    return {
+        **state,
+        "messages": state["messages"] + [AIMessage(content="❌ Okay, I've cancelled that. Nothing was changed.")],
+        "pending_confirmation": None
+    }
+
+async def drop_confirmation_node(state: ChatbotState) -> ChatbotState:
+    """The customer moved on (or the prompt expired): forget the pending order and handle the message afresh"""
+    return {
+        **state,
+        "pending_confirmation": None
+    }
+
+async def budget_exhausted_node(state: ChatbotState) -> ChatbotState:
+    """End a turn that ran out of LLM calls, tool calls, time or retries with what it has"""
+    reason = exhausted(state) or "tool_calls"
+    degraded_turns[reason] += 1
+    return {
+        **state,
+        "messages": state["messages"] + [degraded_reply(state)],
+        "budget": {**turn_budget(state), "exhausted": reason}
+    }
+
 async def error_handling_node(state: ChatbotState) -> ChatbotState:
     """Handle errors and suggest alternatives"""
     tool_results = state.get("tool_results", [])
@@ -182,10 +345,11 @@ async def final_response_node(state: ChatbotState) -> ChatbotState:
     # Save to memory
     if user_input and ai_response:
         session_id = state.get("session_id", "default")
-        memory = memory_manager.get_memory(session_id)
-        memory.save_context(
-            {"input": user_input},
-            {"output": ai_response}
-        )
+        memory_manager.save_turn(session_id, user_input, ai_response)
+
+    try:
+        await response_cache.store_turn(state)
+    except Exception:
+        logger.exception("Response cache store failed")
     
     return state
@@ -1,6 +1,15 @@
 from app.Agents.State.state import  ChatbotState
-from app.Agents.Nodes.chat import WRITE_TOOLS
-from langchain_core.messages import HumanMessage
+import time
+
+from app.Agents.Nodes.chat import WRITE_TOOLS, CONFIRMATION_TTL_SECONDS, confirmation_answer
+from app.Agents.Nodes.budget import exhausted, remaining_tool_calls
+from langchain_core.messages import AIMessage, HumanMessage
+
+def should_skip_llm(state: ChatbotState) -> str:
+    """Router or response cache already answered the message"""
+    if state.get("route") or state.get("cached"):
+        return "final_response"
+    return "continue"
 
 def should_execute_tools(state: ChatbotState) -> str:
     """Decide if tools should be executed"""
@@ -10,11 +19,13 @@ def should_execute_tools(state: ChatbotState) -> str:
     if not tool_calls:
         return "final_response"
     
-    # Check if any write tools need confirmation
-    write_tools = [tc for tc in tool_calls if tc["name"] in WRITE_TOOLS]
-    if write_tools and not state.get("pending_confirmation", {}).get("confirmed", False):
+    # Write tools always wait for the customer's "yes"; confirmed calls run via execute_confirmed
+    if any(tc["name"] in WRITE_TOOLS for tc in tool_calls):
         return "confirmation"
     
+    # Tool results are only useful if the LLM can be called once more to read them
+    if exhausted(state) or not remaining_tool_calls(state):
+        return "budget_exhausted"
     return "execute_tools"
 
 def should_handle_errors(state: ChatbotState) -> str:
@@ -24,19 +35,38 @@ def should_handle_errors(state: ChatbotState) -> str:
     
     if has_errors:
         return "error_handling"
+    if exhausted(state):
+        return "budget_exhausted"
     return "llm_continue"
 
+def after_error_handling(state: ChatbotState) -> str:
+    """Retry through the LLM only while the turn has budget; the error message is the reply otherwise"""
+    if exhausted(state):
+        return "final_response"
+    return "llm"
+
 def check_confirmation_response(state: ChatbotState) -> str:
-    """Check if user confirmed or denied write operation"""
-    if not state.get("pending_confirmation"):
-        return "llm"
+    """Entry point: is this message the answer to a confirmation asked last turn?"""
+    pending = state.get("pending_confirmation")
+    if not pending:
+        return "new_message"
+    if time.time() - pending.get("requested_at", 0) > CONFIRMATION_TTL_SECONDS:
+        return "new_request"
     
     last_message = state["messages"][-1]
     if isinstance(last_message, HumanMessage):
-        content = last_message.content.lower()
-        if any(word in content for word in ["yes", "confirm", "ok", "proceed"]):
+        answer = confirmation_answer(last_message.content)
+        if answer == "yes":
             return "execute_write_tools"
-        elif any(word in content for word in ["no", "cancel", "stop", "abort"]):
+        elif answer == "no":
             return "cancel_operation"
     
-    return "ask_confirmation_again"
+    # Anything else is a new request; the held order is dropped rather than asked about again
+    return "new_request"
+
+def after_confirmed_tools(state: ChatbotState) -> str:
+    """Receipt already written, or let the LLM explain what went wrong"""
+    last_message = state["messages"][-1]
+    if isinstance(last_message, AIMessage):
+        return "final_response"
+    return should_handle_errors(state)
@@ -0,0 +1,187 @@
+import logging
+import os
+import re
+import time
+from typing import Optional, Dict, Any, List
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from app.Agents.State.state import ChatbotState
+from app.Agents.tools.tools import service
+
+logger = logging.getLogger(__name__)
+
+# Seconds between catalog index reloads; new products are routed after at most this long
+ROUTER_INDEX_TTL_SECONDS = float(os.getenv("ROUTER_INDEX_TTL_SECONDS", "300"))
+ROUTER_MAX_CHARS = int(os.getenv("ROUTER_MAX_CHARS", "120"))
+ROUTER_ENABLED = os.getenv("ROUTER_ENABLED", "1") != "0"
+
+# Longest product name (in words) tried when scanning a message for catalog names
+MAX_NAME_WORDS = 6
+
+INTENTS = {
+    "price": re.compile(r"\b(price|prices|cost|costs|how much|rate|mrp)\b"),
+    "stock": re.compile(r"\b(stock|in stock|available|availability|do you have|have you got|got any|how many|left)\b"),
+    "varieties": re.compile(r"\b(variet(y|ies)|options|types|kinds|flavou?rs|sizes|colou?rs)\b"),
+}
+# Anything that needs reasoning, a basket or a confirmation stays with the LLM
+VETO = re.compile(
+    r"\b(buy|order|purchase|sell|cart|basket|total|want|need|add|compare|vs|versus|why|better|best|recommend|"
+    r"cheap(er|est)?|discount|deliver(y)?|yes|no|confirm|cancel|and|or)\b|\d"
+)
+SKU_TOKEN = re.compile(r"[A-Za-z0-9][A-Za-z0-9_-]*[A-Za-z0-9]")
+WORD = re.compile(r"[a-z0-9]+")
+
+
+def _words(text: str) -> list[str]:
+    return WORD.findall(text.lower())
+
+
+class CatalogIndex:
+    """SKU and normalised-name lookups over the active catalog, reloaded every ROUTER_INDEX_TTL_SECONDS."""
+
+    def __init__(self, ttl_seconds: float = ROUTER_INDEX_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self.by_sku: Dict[str, Dict[str, Any]] = {}
+        self.by_name: Dict[str, List[Dict[str, Any]]] = {}
+        self.loaded_at = 0.0
+
+    async def ensure_fresh(self):
+        if time.monotonic() - self.loaded_at < self.ttl_seconds:
+            return
+        by_sku, by_name = {}, {}
+        for row in await service.catalog_index():
+            entry = {"sku": row["sku"], "name": row["name"], "variety": row["variety"]}
+            by_sku[row["sku"].upper()] = entry
+            by_name.setdefault(" ".join(_words(row["name"])), []).append(entry)
+        self.by_sku, self.by_name = by_sku, by_name
+        self.loaded_at = time.monotonic()
+
+    def match(self, text: str) -> tuple[Optional[Dict[str, Any]], List[Dict[str, Any]], str]:
+        """(exact SKU entry, entries of the longest product name found, text with the match removed)."""
+        skus = {t.upper() for t in SKU_TOKEN.findall(text)} & self.by_sku.keys()
+        if len(skus) == 1:
+            sku = skus.pop()
+            rest = re.sub(re.escape(sku), " ", text, flags=re.IGNORECASE)
+            return self.by_sku[sku], [], rest
+        if skus:
+            return None, [], text
+        words = _words(text)
+        for size in range(min(MAX_NAME_WORDS, len(words)), 0, -1):
+            for start in range(len(words) - size + 1):
+                entries = self.by_name.get(" ".join(words[start:start + size]))
+                if entries:
+                    return None, entries, " ".join(words[:start] + words[start + size:])
+        return None, [], text
+
+
+class RouterStats:
+    """How much traffic the router answers and what those turns cost compared with LLM turns."""
+
+    def __init__(self):
+        self.routed = 0
+        self.llm = 0
+        self.routed_seconds = 0.0
+        self.llm_seconds = 0.0
+        self.by_intent: Dict[str, int] = {}
+
+    def record_intent(self, intent: str):
+        self.by_intent[intent] = self.by_intent.get(intent, 0) + 1
+
+    def record_turn(self, routed: bool, seconds: float):
+        if routed:
+            self.routed += 1
+            self.routed_seconds += seconds
+        else:
+            self.llm += 1
+            self.llm_seconds += seconds
+
+    def snapshot(self) -> Dict[str, Any]:
+        total = self.routed + self.llm
+        avg_routed = self.routed_seconds / self.routed if self.routed else 0.0
+        avg_llm = self.llm_seconds / self.llm if self.llm else 0.0
+        return {
+            "messages": total,
+            "routed": self.routed,
+            "routed_share": round(self.routed / total, 3) if total else 0.0,
+            "avg_routed_ms": round(avg_routed * 1000, 1),
+            "avg_llm_ms": round(avg_llm * 1000, 1),
+            # Estimate: each routed turn would have cost an average LLM turn
+            "saved_seconds": round(self.routed * max(avg_llm - avg_routed, 0.0), 1) if self.llm else None,
+            "by_intent": dict(self.by_intent),
+        }
+
+
+catalog_index = CatalogIndex()
+router_stats = RouterStats()
+
+
+def classify(text: str) -> Optional[Dict[str, Any]]:
+    """Intent and product for messages simple enough to answer without the LLM, else None."""
+    if len(text) > ROUTER_MAX_CHARS:
+        return None
+    entry, named, rest = catalog_index.match(text)
+    if entry is None and not named:
+        return None
+    rest = rest.lower()
+    if VETO.search(rest):
+        return None
+    intents = [name for name, pattern in INTENTS.items() if pattern.search(rest)]
+    if len(intents) > 1:
+        return None
+    intent = intents[0] if intents else "card"
+    # A bare product mention ("WHF001?", "almond flour") reads as a card request; longer
+    # messages without a recognised intent are conversation
+    if intent == "card" and len(_words(rest)) > 3:
+        return None
+    if entry is not None:
+        if intent == "varieties":
+            return {"intent": intent, "name": entry["name"]}
+        return {"intent": intent, **entry}
+    if intent == "varieties" or (intent == "card" and len(named) > 1):
+        return {"intent": "varieties", "name": named[0]["name"]}
+    if len(named) == 1:
+        return {"intent": intent, **named[0]}
+    # A name shared by several varieties needs the LLM to work out which one was meant
+    return None
+
+
+async def render(route: Dict[str, Any]) -> Optional[str]:
+    if route["intent"] == "varieties":
+        options = await service.list_varieties(route["name"])
+        if not options:
+            return None
+        lines = "\n".join(f"• {v}" for v in options)
+        return f"🧾 {route['name']} comes in these varieties:\n{lines}\n\nWhich one would you like? 😊"
+
+    card = await service.product_card(route["sku"], route["variety"])
+    if not card:
+        return None
+    label = f"{card['name']} ({card['variety']})" if card["variety"] else card["name"]
+    price = f"💰 {label} — SKU {card['sku']}: ₹{card['price']:.2f} per unit."
+    stock = (f"✅ {label} — SKU {card['sku']}: {card['quantity']} in stock." if card["quantity"] > 0
+             else f"😔 {label} — SKU {card['sku']} is currently out of stock.")
+    body = {"price": price, "stock": stock, "card": f"{price}\n{stock}"}[route["intent"]]
+    return f"{body}\n\nAnything else I can help you with? 😊"
+
+
+async def router_node(state: ChatbotState) -> ChatbotState:
+    """Answer simple price / stock / variety questions straight from the catalog, skipping the LLM"""
+    last_message = state["messages"][-1]
+    if not ROUTER_ENABLED or state.get("pending_confirmation") or not isinstance(last_message, HumanMessage):
+        return state
+    try:
+        await catalog_index.ensure_fresh()
+        route = classify(last_message.content)
+        reply = await render(route) if route else None
+    except Exception:
+        logger.exception("Router failed; falling back to the LLM")
+        return state
+    if reply is None:
+        return state
+    router_stats.record_intent(route["intent"])
+    return {
+        **state,
+        "messages": state["messages"] + [AIMessage(content=reply)],
+        "route": route,
+    }
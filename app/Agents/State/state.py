@@ -8,3 +8,8 @@ class ChatbotState(TypedDict):
     tool_results: List[Dict[str, Any]]
     error_count: int
     memory_context: List[BaseMessage]
+    route: Optional[Dict[str, Any]]  # set when the router answered without the LLM
+    cached: bool  # set when the response cache answered
+    token_usage: Dict[str, int]  # LLM calls and tokens spent on this turn
+    budget: Dict[str, Any]  # this turn's start time, LLM / tool calls made, and the budget that ran out
+    tool_cache: Dict[str, str]  # tool results this turn, keyed by name + args, so repeated calls are reused
@@ -1,26 +1,79 @@
+import os
+
 from langgraph.graph import StateGraph, END
 from app.Agents.State.state import ChatbotState
 from app.Agents.Nodes.chat import memory_node,llm_node,tool_execution_node,confirmation_node,error_handling_node,final_response_node
-from app.Agents.Nodes.condition import should_execute_tools,should_handle_errors,check_confirmation_response
+from app.Agents.Nodes.chat import execute_confirmed_node,cancel_confirmation_node,drop_confirmation_node,budget_exhausted_node
+from app.Agents.Nodes.condition import should_execute_tools,should_handle_errors,check_confirmation_response,should_skip_llm,after_confirmed_tools,after_error_handling
+from app.Agents.Nodes.router import router_node
+from app.Agents.Nodes.cache import cache_lookup_node
+from app.Agents.Graph.instrumentation import traced_node
+
+# Where graph state lives between messages: "db" (shared by every bot process) or "memory"
+GRAPH_CHECKPOINTER = os.getenv("GRAPH_CHECKPOINTER", "db")
+
+
+def create_checkpointer(kind: str = GRAPH_CHECKPOINTER):
+    if kind == "memory":
+        from langgraph.checkpoint.memory import InMemorySaver
+        return InMemorySaver()
+    if kind == "db":
+        from app.Agents.Graph.checkpointer import DBCheckpointSaver
+        return DBCheckpointSaver()
+    raise ValueError(f"Unknown GRAPH_CHECKPOINTER {kind!r} (expected 'db' or 'memory')")
 
-def create_chatbot_graph():
-    """Create the main chatbot graph"""
+
+def create_chatbot_graph(checkpointer=None):
+    """Create the main chatbot graph. Run it with a thread_id per session so a pending
+    confirmation is still there when the customer answers it."""
     
     # Create the graph
     workflow = StateGraph(ChatbotState)
     
-    # Add nodes
-    workflow.add_node("memory", memory_node)
-    workflow.add_node("llm", llm_node)
-    workflow.add_node("execute_tools", tool_execution_node)
-    workflow.add_node("confirmation", confirmation_node)
-    workflow.add_node("error_handling", error_handling_node)
-    workflow.add_node("final_response", final_response_node)
+    # Add nodes; each run is timed into the turn's trace when the caller opened one
+    workflow.add_node("router", traced_node("router", router_node))
+    workflow.add_node("cache_lookup", traced_node("cache_lookup", cache_lookup_node))
+    workflow.add_node("memory", traced_node("memory", memory_node))
+    workflow.add_node("llm", traced_node("llm", llm_node))
+    workflow.add_node("execute_tools", traced_node("execute_tools", tool_execution_node))
+    workflow.add_node("confirmation", traced_node("confirmation", confirmation_node))
+    workflow.add_node("execute_confirmed", traced_node("execute_confirmed", execute_confirmed_node))
+    workflow.add_node("cancel_confirmation", traced_node("cancel_confirmation", cancel_confirmation_node))
+    workflow.add_node("drop_confirmation", traced_node("drop_confirmation", drop_confirmation_node))
+    workflow.add_node("error_handling", traced_node("error_handling", error_handling_node))
+    workflow.add_node("budget_exhausted", traced_node("budget_exhausted", budget_exhausted_node))
+    workflow.add_node("final_response", traced_node("final_response", final_response_node))
     
-    # Set entry point
-    workflow.set_entry_point("memory")
+    # Entry point: an answer to last turn's confirmation resumes the held tool calls directly;
+    # otherwise simple catalog lookups are answered before any LLM call
+    workflow.set_conditional_entry_point(
+        check_confirmation_response,
+        {
+            "new_message": "router",
+            "execute_write_tools": "execute_confirmed",
+            "cancel_operation": "cancel_confirmation",
+            "new_request": "drop_confirmation"
+        }
+    )
+    workflow.add_edge("drop_confirmation", "router")
     
     # Add edges
+    workflow.add_conditional_edges(
+        "router",
+        should_skip_llm,
+        {
+            "final_response": "final_response",
+            "continue": "cache_lookup"
+        }
+    )
+    workflow.add_conditional_edges(
+        "cache_lookup",
+        should_skip_llm,
+        {
+            "final_response": "final_response",
+            "continue": "memory"
+        }
+    )
     workflow.add_edge("memory", "llm")
     
     # Conditional edges from LLM
@@ -30,7 +83,8 @@ def create_chatbot_graph():
         {
             "execute_tools": "execute_tools",
             "confirmation": "confirmation", 
-            "final_response": "final_response"
+            "final_response": "final_response",
+            "budget_exhausted": "budget_exhausted"
         }
     )
     
@@ -40,26 +94,40 @@ def create_chatbot_graph():
         should_handle_errors,
         {
             "error_handling": "error_handling",
-            "llm_continue": "llm"
+            "llm_continue": "llm",
+            "budget_exhausted": "budget_exhausted"
         }
     )
     
-    # From confirmation, check user response
+    # Confirmation ends the turn; the customer's answer arrives as the next message
+    workflow.add_edge("confirmation", "final_response")
+    workflow.add_edge("cancel_confirmation", "final_response")
     workflow.add_conditional_edges(
-        "confirmation",
-        check_confirmation_response,
+        "execute_confirmed",
+        after_confirmed_tools,
         {
-            "execute_write_tools": "execute_tools",
-            "cancel_operation": "final_response",
-            "ask_confirmation_again": "confirmation"
+            "final_response": "final_response",
+            "error_handling": "error_handling",
+            "llm_continue": "memory",
+            "budget_exhausted": "budget_exhausted"
+        }
+    )
+    
+    # Errors are retried through the LLM while the turn's budget lasts
+    workflow.add_conditional_edges(
+        "error_handling",
+        after_error_handling,
+        {
+            "llm": "llm",
+            "final_response": "final_response"
         }
     )
     
     # Terminal edges
-    workflow.add_edge("error_handling", "llm")
+    workflow.add_edge("budget_exhausted", "final_response")
     workflow.add_edge("final_response", END)
     
-    return workflow.compile()
+    return workflow.compile(checkpointer=checkpointer)
 
 # Create the compiled graph
-chatbot_graph = create_chatbot_graph()
+chatbot_graph = create_chatbot_graph(create_checkpointer())
@@ -2,6 +2,8 @@
 from langchain_core.tools import tool
 from typing import Optional
 from app.DB.services.inventory_service import InventoryService
+from app.DB.services.rollup_service import SalesRollups
+from app.DB.services.reorder_service import ReorderPlanner
 from app.DB.Sql.db_manager import AsyncDBManager
 from app.DB.models.schema import (
     StockResponse, ProductCard, VarietiesResponse
@@ -13,6 +15,7 @@ import datetime
 
 db = AsyncDBManager()
 service = InventoryService(db)
+reorder = ReorderPlanner(db, SalesRollups(db, service))
 
 # --- Tools ---
 
@@ -51,6 +54,19 @@ async def search(q: str, variety: Optional[str] = None) -> dict:
     return {"count": len(items), "items": items}
 
 
+@tool
+async def reorder_suggestions(category: Optional[str] = None, limit: int = 20) -> dict:
+    """List products that should be reordered now (stock at or below their reorder point), most urgent first.
+
+    Each item has on_hand, avg_daily_demand, days_of_cover, reorder_point and suggested_qty to order.
+
+    Args:
+        category: Only products in this category (optional)
+        limit: Maximum number of products to return (default: 20)
+    """
+    return await reorder.suggestions(True, None, category, limit)
+
+
 @tool
 async def sell_single_item(
     sku: str, 
@@ -122,7 +138,8 @@ async def sell_multiple_items(
     order_id: str,
     items: List[Dict[str, Any]],
     channel: Optional[str] = "chatbot",
-    notes: Optional[str] = None
+    notes: Optional[str] = None,
+    expected_versions: Optional[Dict[str, int]] = None
 ) -> dict:
     """Sell multiple items in one transaction - all items must be available or none are sold.
     
@@ -131,6 +148,8 @@ async def sell_multiple_items(
         items: List of items to sell, each containing: sku, variety?, quantity, sale_price?
         channel: Sales channel (default: "chatbot")
         notes: Order-level notes (optional)
+        expected_versions: The stock_versions map returned by compute_order_total; if stock moved
+            since that quote the order is refused with error "stock_changed" (optional)
         
     Example items format:
     [
@@ -143,7 +162,8 @@ async def sell_multiple_items(
             order_id=order_id,
             channel=channel,
             notes=notes,
-            items=items
+            items=items,
+            expected_versions=expected_versions
         )
         
         total_items = sum(item.get("quantity", 0) for item in items)
@@ -166,6 +186,16 @@ async def sell_multiple_items(
     except ValueError as e:
         error_msg = str(e)
         
+        # Stock moved after the quote the customer confirmed
+        if e.args and isinstance(e.args[0], dict) and e.args[0].get("stale"):
+            return {
+                "status": "error",
+                "error": "stock_changed",
+                "message": "❌ Stock changed since the order total was calculated; please re-check the basket",
+                "order_id": order_id,
+                "changed": e.args[0]["stale"]
+            }
+
         # Handle shortage errors (contains details about which items are short)
         if "shortages" in error_msg.lower() or isinstance(e.args[0], dict):
             try:
@@ -224,7 +254,10 @@ async def compute_order_total(items: List[Dict[str, Any]]) -> dict:
         line_items = []
         grand_total = 0.0
         unavailable_items = []
-        
+        # One lookup for the whole basket: prices, balances and stock versions
+        cards = await service.product_cards(list(dict.fromkeys(item["sku"] for item in items if item.get("sku"))))
+        requested = {}
+
         for item in items:
             sku = item.get("sku")
             variety = item.get("variety")
@@ -232,11 +265,9 @@ async def compute_order_total(items: List[Dict[str, Any]]) -> dict:
             
             if not sku:
                 continue
-                
-            # Get product card (price + availability)
-            card = await service.product_card(sku, variety)
-            
-            if not card:
+
+            card = cards.get(sku)
+            if not card or (variety is not None and card["variety"] != variety):
                 unavailable_items.append({
                     "sku": sku,
                     "variety": variety,
@@ -248,6 +279,8 @@ async def compute_order_total(items: List[Dict[str, Any]]) -> dict:
             available_qty = card["quantity"]
             line_total = unit_price * quantity
             grand_total += line_total
+            # Repeated SKUs draw on the same stock
+            requested[sku] = requested.get(sku, 0) + quantity
             
             line_items.append({
                 "sku": sku,
@@ -257,7 +290,7 @@ async def compute_order_total(items: List[Dict[str, Any]]) -> dict:
                 "unit_price": unit_price,
                 "line_total": line_total,
                 "available": available_qty,
-                "in_stock": available_qty >= quantity
+                "in_stock": available_qty >= requested[sku]
             })
         
         return {
@@ -269,7 +302,9 @@ async def compute_order_total(items: List[Dict[str, Any]]) -> dict:
             "unavailable_items": unavailable_items if unavailable_items else None,
             "all_available": len(unavailable_items) == 0 and all(
                 item["in_stock"] for item in line_items
-            )
+            ),
+            # Pass to sell_multiple_items as expected_versions to catch stock moving in between
+            "stock_versions": {sku: cards[sku]["stock_version"] for sku in requested}
         }
         
     except Exception as e:
@@ -1,8 +1,13 @@
-﻿import os
+﻿import asyncio
+import logging
+import os
+import uuid
 from contextlib import asynccontextmanager
 
 from dotenv import load_dotenv
 
+from app.tracing import span, sql_label
+
 # Optional Postgres
 try:
     from psycopg_pool import AsyncConnectionPool
@@ -17,6 +22,12 @@ import sqlite3
 load_dotenv()
 logger = logging.getLogger(__name__)
 
+# SQLite has no ADD COLUMN IF NOT EXISTS: columns added to existing tables are listed here and
+# added on init_schema when an older offline.db lacks them
+SQLITE_ADDED_COLUMNS = {
+    "ingest_jobs": {"owner": "TEXT", "heartbeat_at": "TEXT"},
+}
+
 
 class AsyncDBManager:
     _instance = None
@@ -28,6 +39,7 @@ class AsyncDBManager:
             cls._instance.pool = None
             cls._instance.fallback = None
             cls._instance.sqlite_conn = None
+            cls._instance.stream_slots = None
         return cls._instance
 
     async def open(self):
@@ -86,27 +98,44 @@ class AsyncDBManager:
             logger.info("PostgreSQL schema initialized")
         else:
             self.sqlite_conn.executescript(schema_sql)
+            for table, columns in SQLITE_ADDED_COLUMNS.items():
+                present = {r[1] for r in self.sqlite_conn.execute(f"PRAGMA table_info({table})")}
+                for name, decl in columns.items():
+                    if name not in present:
+                        self.sqlite_conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {decl}")
             logger.info("SQLite schema initialized")
 
+    @asynccontextmanager
+    async def _pg_connection(self):
+        # Explicit checkout so time spent waiting on the pool shows up in request traces
+        with span("db.checkout"):
+            conn = await self.pool.getconn()
+        try:
+            yield conn
+        finally:
+            await self.pool.putconn(conn)
+
     async def execute_query(self, query: str, params: tuple | list | dict | None = None, commit: bool = False):
         if self.fallback == "postgres":
-            async with self.pool.connection() as conn:
+            async with self._pg_connection() as conn:
                 async with conn.cursor(row_factory=dict_row) as cur:
-                    await cur.execute(query, params)
-                    rows = None
-                    if cur.description:
-                        rows = await cur.fetchall()
-                    if commit:
-                        await conn.commit()
+                    with span("db.query", sql_label(query)):
+                        await cur.execute(query, params)
+                        rows = None
+                        if cur.description:
+                            rows = await cur.fetchall()
+                        if commit:
+                            await conn.commit()
                     return rows
         else:
             cur = self.sqlite_conn.cursor()
             # Convert %s -> ? for SQLite
             q = query.replace("%s", "?")
-            cur.execute(q, params or [])
-            rows = cur.fetchall() if cur.description else None
-            if commit:
-                self.sqlite_conn.commit()
+            with span("db.query", sql_label(query)):
+                cur.execute(q, params or [])
+                rows = cur.fetchall() if cur.description else None
+                if commit:
+                    self.sqlite_conn.commit()
             if rows is None:
                 return None
             return [dict(zip([d[0] for d in cur.description], r)) for r in rows]
@@ -122,23 +151,65 @@ class AsyncDBManager:
         else:
             self.sqlite_conn.executescript(script_sql)
 
+    async def stream_query(self, query: str, params: tuple | list | dict | None = None, batch_size: int = 1000):
+        """
+        Yield result rows as dicts without materialising the whole result set.
+
+        Postgres uses a named (server-side) cursor and fetches batch_size rows per round trip;
+        SQLite steps the shared connection's cursor with fetchmany. Concurrent streams are capped
+        by DB_STREAM_SLOTS so long exports cannot take over the connection pool.
+        """
+        if self.stream_slots is None:
+            self.stream_slots = asyncio.Semaphore(int(os.getenv("DB_STREAM_SLOTS", "2")))
+        async with self.stream_slots:
+            if self.fallback == "postgres":
+                async with self._pg_connection() as conn:
+                    async with conn.transaction():
+                        name = f"stream_{uuid.uuid4().hex}"
+                        async with conn.cursor(name=name, row_factory=dict_row) as cur:
+                            await cur.execute(query, params)
+                            while True:
+                                rows = await cur.fetchmany(batch_size)
+                                if not rows:
+                                    break
+                                for row in rows:
+                                    yield row
+            else:
+                cur = self.sqlite_conn.cursor()
+                try:
+                    cur.execute(query.replace("%s", "?"), params or [])
+                    cols = [d[0] for d in cur.description]
+                    while True:
+                        rows = cur.fetchmany(batch_size)
+                        if not rows:
+                            break
+                        for r in rows:
+                            yield dict(zip(cols, r))
+                        # Give other requests a turn on the shared connection between batches
+                        await asyncio.sleep(0)
+                finally:
+                    cur.close()
+
     @asynccontextmanager
     async def transaction(self):
         if self.fallback == "postgres":
-            async with self.pool.connection() as conn:
+            async with self._pg_connection() as conn:
                 try:
                     await conn.execute("BEGIN;")
                     yield conn
-                    await conn.commit()
+                    with span("db.commit"):
+                        await conn.commit()
                 except Exception:
                     await conn.rollback()
                     raise
         else:
             try:
                 # BEGIN IMMEDIATE to get a reserved lock before writes
-                self.sqlite_conn.execute("BEGIN IMMEDIATE;")
+                with span("db.checkout", "BEGIN IMMEDIATE"):
+                    self.sqlite_conn.execute("BEGIN IMMEDIATE;")
                 yield self.sqlite_conn
-                self.sqlite_conn.commit()
+                with span("db.commit"):
+                    self.sqlite_conn.commit()
             except Exception:
                 self.sqlite_conn.rollback()
                 raise
@@ -13,12 +13,15 @@ CREATE TABLE IF NOT EXISTS products (
     name TEXT NOT NULL,
     variety TEXT DEFAULT NULL,
     price NUMERIC(12,2) NOT NULL CHECK (price >= 0),
+    quantity NUMERIC(12,2) NOT NULL DEFAULT 0 CHECK (quantity >= 0),
     attributes JSONB DEFAULT '{}'::jsonb,
     is_active BOOLEAN NOT NULL DEFAULT TRUE,
     created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
     updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
 );
 
+ALTER TABLE products ADD COLUMN IF NOT EXISTS quantity NUMERIC(12,2) NOT NULL DEFAULT 0;
+
 CREATE INDEX IF NOT EXISTS idx_products_name ON products (name);
 CREATE INDEX IF NOT EXISTS idx_products_variety ON products (variety);
 
@@ -64,3 +67,188 @@ CREATE TRIGGER trg_products_updated_at
 BEFORE UPDATE ON products
 FOR EACH ROW
 EXECUTE FUNCTION set_updated_at();
+
+-- Background ingest jobs (bulk catalog / GRN uploads processed in chunks)
+CREATE TABLE IF NOT EXISTS ingest_jobs (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued' CHECK (status IN ('queued','running','completed','failed')),
+    payload JSONB NOT NULL DEFAULT '[]'::jsonb,
+    options JSONB NOT NULL DEFAULT '{}'::jsonb,
+    chunk_size INTEGER NOT NULL CHECK (chunk_size > 0),
+    total_rows INTEGER NOT NULL DEFAULT 0,
+    processed_rows INTEGER NOT NULL DEFAULT 0,
+    failed_rows INTEGER NOT NULL DEFAULT 0,
+    committed_chunks INTEGER NOT NULL DEFAULT 0,
+    errors JSONB NOT NULL DEFAULT '[]'::jsonb,
+    owner TEXT,
+    heartbeat_at TIMESTAMPTZ,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    started_at TIMESTAMPTZ,
+    finished_at TIMESTAMPTZ,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- Lease of the runner processing a job (claimed atomically, renewed with every chunk)
+ALTER TABLE ingest_jobs ADD COLUMN IF NOT EXISTS owner TEXT;
+ALTER TABLE ingest_jobs ADD COLUMN IF NOT EXISTS heartbeat_at TIMESTAMPTZ;
+
+CREATE INDEX IF NOT EXISTS idx_ingest_jobs_status ON ingest_jobs (status);
+
+-- Sales rollups, maintained incrementally from OUT ledger rows (see ledger_cursors)
+CREATE TABLE IF NOT EXISTS sales_daily (
+    product_id UUID NOT NULL REFERENCES products(id) ON DELETE CASCADE,
+    day DATE NOT NULL,
+    units BIGINT NOT NULL DEFAULT 0,
+    revenue NUMERIC(14,2) NOT NULL DEFAULT 0,
+    sales INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (product_id, day)
+);
+
+CREATE INDEX IF NOT EXISTS idx_sales_daily_day ON sales_daily (day);
+
+CREATE TABLE IF NOT EXISTS sales_hourly (
+    product_id UUID NOT NULL REFERENCES products(id) ON DELETE CASCADE,
+    hour TIMESTAMP NOT NULL,
+    units BIGINT NOT NULL DEFAULT 0,
+    revenue NUMERIC(14,2) NOT NULL DEFAULT 0,
+    sales INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (product_id, hour)
+);
+
+CREATE INDEX IF NOT EXISTS idx_sales_hourly_hour ON sales_hourly (hour);
+
+-- High-water marks (last stock_ledger id applied) for incrementally maintained derived tables
+CREATE TABLE IF NOT EXISTS ledger_cursors (
+    name TEXT PRIMARY KEY,
+    last_id BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- Ledger high-water mark at each product's last quantity upsert: products.quantity is a count taken
+-- then, so the stock audit checks it only against OUT movements recorded after this mark
+CREATE TABLE IF NOT EXISTS product_stock_marks (
+    product_id UUID PRIMARY KEY REFERENCES products(id) ON DELETE CASCADE,
+    ledger_id BIGINT NOT NULL,
+    marked_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE OR REPLACE FUNCTION mark_product_stock()
+RETURNS TRIGGER AS $$
+BEGIN
+  INSERT INTO product_stock_marks (product_id, ledger_id, marked_at)
+  VALUES (NEW.id, (SELECT COALESCE(MAX(id), 0) FROM stock_ledger), NOW())
+  ON CONFLICT (product_id) DO UPDATE
+  SET ledger_id = EXCLUDED.ledger_id, marked_at = EXCLUDED.marked_at;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_products_stock_mark ON products;
+CREATE TRIGGER trg_products_stock_mark
+AFTER INSERT OR UPDATE OF quantity ON products
+FOR EACH ROW
+EXECUTE FUNCTION mark_product_stock();
+
+-- FIFO valuation: open (not yet sold) cost layers per product, one per IN/ADJUST ledger row
+CREATE TABLE IF NOT EXISTS cost_layers (
+    ledger_id BIGINT PRIMARY KEY,
+    product_id UUID NOT NULL REFERENCES products(id) ON DELETE CASCADE,
+    unit_cost NUMERIC(14,4) NOT NULL,
+    qty_in INTEGER NOT NULL,
+    qty_remaining INTEGER NOT NULL CHECK (qty_remaining > 0),
+    received_at TIMESTAMPTZ NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_cost_layers_product ON cost_layers (product_id, ledger_id);
+
+-- Cost of goods sold per OUT ledger row; unmatched_qty counts units sold with no layer to cost them
+CREATE TABLE IF NOT EXISTS sale_cogs (
+    ledger_id BIGINT PRIMARY KEY,
+    product_id UUID NOT NULL REFERENCES products(id) ON DELETE CASCADE,
+    quantity INTEGER NOT NULL,
+    cogs NUMERIC(14,4) NOT NULL,
+    revenue NUMERIC(14,2) NOT NULL,
+    unmatched_qty INTEGER NOT NULL DEFAULT 0,
+    sold_at TIMESTAMPTZ NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_sale_cogs_sold_at ON sale_cogs (sold_at);
+CREATE INDEX IF NOT EXISTS idx_sale_cogs_product ON sale_cogs (product_id);
+
+-- Staging copies filled by a full valuation rebuild, swapped into the tables above in one transaction
+-- (no foreign keys or checks: only the swap needs to satisfy those)
+CREATE UNLOGGED TABLE IF NOT EXISTS cost_layers_rebuild (LIKE cost_layers INCLUDING DEFAULTS INCLUDING INDEXES);
+CREATE UNLOGGED TABLE IF NOT EXISTS sale_cogs_rebuild (LIKE sale_cogs INCLUDING DEFAULTS INCLUDING INDEXES);
+
+-- Reorder points per product, recomputed in one batch from sales_daily
+CREATE TABLE IF NOT EXISTS reorder_suggestions (
+    product_id UUID PRIMARY KEY REFERENCES products(id) ON DELETE CASCADE,
+    on_hand INTEGER NOT NULL,
+    avg_daily_demand DOUBLE PRECISION NOT NULL,
+    demand_std DOUBLE PRECISION NOT NULL,
+    days_of_cover DOUBLE PRECISION,
+    safety_stock DOUBLE PRECISION NOT NULL,
+    reorder_point DOUBLE PRECISION NOT NULL,
+    suggested_qty INTEGER NOT NULL,
+    needs_reorder BOOLEAN NOT NULL DEFAULT FALSE,
+    window_days INTEGER NOT NULL,
+    lead_time_days DOUBLE PRECISION NOT NULL,
+    computed_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_reorder_needed ON reorder_suggestions (needs_reorder, days_of_cover);
+
+-- Next-week demand forecasts per product plus the smoothing state needed to roll them forward a day at a time
+CREATE TABLE IF NOT EXISTS demand_forecasts (
+    product_id UUID PRIMARY KEY REFERENCES products(id) ON DELETE CASCADE,
+    method TEXT NOT NULL CHECK (method IN ('ses','croston','none')),
+    daily_rate DOUBLE PRECISION NOT NULL,
+    next_week DOUBLE PRECISION NOT NULL,
+    level DOUBLE PRECISION NOT NULL,
+    size DOUBLE PRECISION NOT NULL,
+    interval_days DOUBLE PRECISION NOT NULL,
+    since_demand INTEGER NOT NULL,
+    nonzero_days INTEGER NOT NULL,
+    observed_days INTEGER NOT NULL,
+    through_day DATE NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- Bot conversation history, append-only; one row per message
+CREATE TABLE IF NOT EXISTS chat_messages (
+    id BIGSERIAL PRIMARY KEY,
+    session_id TEXT NOT NULL,
+    role TEXT NOT NULL CHECK (role IN ('human','ai')),
+    content TEXT NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_chat_messages_session ON chat_messages (session_id, id);
+
+-- Bot graph state (LangGraph checkpoints); only the latest checkpoint per session is kept
+CREATE TABLE IF NOT EXISTS graph_checkpoints (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    parent_checkpoint_id TEXT,
+    type TEXT NOT NULL,
+    checkpoint BYTEA NOT NULL,
+    metadata_type TEXT NOT NULL,
+    metadata BYTEA NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (thread_id, checkpoint_ns)
+);
+
+CREATE TABLE IF NOT EXISTS graph_writes (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    channel TEXT NOT NULL,
+    type TEXT NOT NULL,
+    value BYTEA NOT NULL,
+    task_path TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+);
@@ -54,3 +54,204 @@ FOR EACH ROW
 BEGIN
   UPDATE products SET updated_at = CURRENT_TIMESTAMP WHERE id = OLD.id;
 END;
+
+-- Background ingest jobs (bulk catalog / GRN uploads processed in chunks)
+CREATE TABLE IF NOT EXISTS ingest_jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued' CHECK (status IN ('queued','running','completed','failed')),
+    payload TEXT NOT NULL DEFAULT '[]',
+    options TEXT NOT NULL DEFAULT '{}',
+    chunk_size INTEGER NOT NULL CHECK (chunk_size > 0),
+    total_rows INTEGER NOT NULL DEFAULT 0,
+    processed_rows INTEGER NOT NULL DEFAULT 0,
+    failed_rows INTEGER NOT NULL DEFAULT 0,
+    committed_chunks INTEGER NOT NULL DEFAULT 0,
+    errors TEXT NOT NULL DEFAULT '[]',
+    -- Lease of the runner processing the job (claimed atomically, renewed with every chunk)
+    owner TEXT,
+    heartbeat_at TEXT,
+    created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    started_at TEXT,
+    finished_at TEXT,
+    updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_ingest_jobs_status ON ingest_jobs (status);
+
+-- Sales rollups, maintained incrementally from OUT ledger rows (see ledger_cursors)
+CREATE TABLE IF NOT EXISTS sales_daily (
+    product_id TEXT NOT NULL REFERENCES products(id) ON DELETE CASCADE,
+    day TEXT NOT NULL,
+    units INTEGER NOT NULL DEFAULT 0,
+    revenue REAL NOT NULL DEFAULT 0,
+    sales INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (product_id, day)
+);
+
+CREATE INDEX IF NOT EXISTS idx_sales_daily_day ON sales_daily (day);
+
+CREATE TABLE IF NOT EXISTS sales_hourly (
+    product_id TEXT NOT NULL REFERENCES products(id) ON DELETE CASCADE,
+    hour TEXT NOT NULL,
+    units INTEGER NOT NULL DEFAULT 0,
+    revenue REAL NOT NULL DEFAULT 0,
+    sales INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (product_id, hour)
+);
+
+CREATE INDEX IF NOT EXISTS idx_sales_hourly_hour ON sales_hourly (hour);
+
+-- High-water marks (last stock_ledger id applied) for incrementally maintained derived tables
+CREATE TABLE IF NOT EXISTS ledger_cursors (
+    name TEXT PRIMARY KEY,
+    last_id INTEGER NOT NULL DEFAULT 0,
+    updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Ledger high-water mark at each product's last quantity upsert: products.quantity is a count taken
+-- then, so the stock audit checks it only against OUT movements recorded after this mark
+CREATE TABLE IF NOT EXISTS product_stock_marks (
+    product_id TEXT PRIMARY KEY REFERENCES products(id) ON DELETE CASCADE,
+    ledger_id INTEGER NOT NULL,
+    marked_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+DROP TRIGGER IF EXISTS trg_products_stock_mark_insert;
+CREATE TRIGGER trg_products_stock_mark_insert
+AFTER INSERT ON products
+FOR EACH ROW
+BEGIN
+  INSERT INTO product_stock_marks (product_id, ledger_id, marked_at)
+  VALUES (NEW.id, (SELECT COALESCE(MAX(id), 0) FROM stock_ledger), CURRENT_TIMESTAMP)
+  ON CONFLICT(product_id) DO UPDATE SET ledger_id = excluded.ledger_id, marked_at = excluded.marked_at;
+END;
+
+DROP TRIGGER IF EXISTS trg_products_stock_mark_update;
+CREATE TRIGGER trg_products_stock_mark_update
+AFTER UPDATE OF quantity ON products
+FOR EACH ROW
+BEGIN
+  INSERT INTO product_stock_marks (product_id, ledger_id, marked_at)
+  VALUES (NEW.id, (SELECT COALESCE(MAX(id), 0) FROM stock_ledger), CURRENT_TIMESTAMP)
+  ON CONFLICT(product_id) DO UPDATE SET ledger_id = excluded.ledger_id, marked_at = excluded.marked_at;
+END;
+
+-- FIFO valuation: open (not yet sold) cost layers per product, one per IN/ADJUST ledger row
+CREATE TABLE IF NOT EXISTS cost_layers (
+    ledger_id INTEGER PRIMARY KEY,
+    product_id TEXT NOT NULL REFERENCES products(id) ON DELETE CASCADE,
+    unit_cost REAL NOT NULL,
+    qty_in INTEGER NOT NULL,
+    qty_remaining INTEGER NOT NULL CHECK (qty_remaining > 0),
+    received_at TEXT NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_cost_layers_product ON cost_layers (product_id, ledger_id);
+
+-- Cost of goods sold per OUT ledger row; unmatched_qty counts units sold with no layer to cost them
+CREATE TABLE IF NOT EXISTS sale_cogs (
+    ledger_id INTEGER PRIMARY KEY,
+    product_id TEXT NOT NULL REFERENCES products(id) ON DELETE CASCADE,
+    quantity INTEGER NOT NULL,
+    cogs REAL NOT NULL,
+    revenue REAL NOT NULL,
+    unmatched_qty INTEGER NOT NULL DEFAULT 0,
+    sold_at TEXT NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_sale_cogs_sold_at ON sale_cogs (sold_at);
+CREATE INDEX IF NOT EXISTS idx_sale_cogs_product ON sale_cogs (product_id);
+
+-- Staging copies filled by a full valuation rebuild, swapped into the tables above in one transaction
+-- (no foreign keys or checks: only the swap needs to satisfy those)
+CREATE TABLE IF NOT EXISTS cost_layers_rebuild (
+    ledger_id INTEGER PRIMARY KEY,
+    product_id TEXT NOT NULL,
+    unit_cost REAL NOT NULL,
+    qty_in INTEGER NOT NULL,
+    qty_remaining INTEGER NOT NULL,
+    received_at TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS sale_cogs_rebuild (
+    ledger_id INTEGER PRIMARY KEY,
+    product_id TEXT NOT NULL,
+    quantity INTEGER NOT NULL,
+    cogs REAL NOT NULL,
+    revenue REAL NOT NULL,
+    unmatched_qty INTEGER NOT NULL DEFAULT 0,
+    sold_at TEXT NOT NULL
+);
+
+-- Reorder points per product, recomputed in one batch from sales_daily
+CREATE TABLE IF NOT EXISTS reorder_suggestions (
+    product_id TEXT PRIMARY KEY REFERENCES products(id) ON DELETE CASCADE,
+    on_hand INTEGER NOT NULL,
+    avg_daily_demand REAL NOT NULL,
+    demand_std REAL NOT NULL,
+    days_of_cover REAL,
+    safety_stock REAL NOT NULL,
+    reorder_point REAL NOT NULL,
+    suggested_qty INTEGER NOT NULL,
+    needs_reorder INTEGER NOT NULL DEFAULT 0,
+    window_days INTEGER NOT NULL,
+    lead_time_days REAL NOT NULL,
+    computed_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_reorder_needed ON reorder_suggestions (needs_reorder, days_of_cover);
+
+-- Next-week demand forecasts per product plus the smoothing state needed to roll them forward a day at a time
+CREATE TABLE IF NOT EXISTS demand_forecasts (
+    product_id TEXT PRIMARY KEY REFERENCES products(id) ON DELETE CASCADE,
+    method TEXT NOT NULL CHECK (method IN ('ses','croston','none')),
+    daily_rate REAL NOT NULL,
+    next_week REAL NOT NULL,
+    level REAL NOT NULL,
+    size REAL NOT NULL,
+    interval_days REAL NOT NULL,
+    since_demand INTEGER NOT NULL,
+    nonzero_days INTEGER NOT NULL,
+    observed_days INTEGER NOT NULL,
+    through_day TEXT NOT NULL,
+    updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Bot conversation history, append-only; one row per message
+CREATE TABLE IF NOT EXISTS chat_messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT NOT NULL,
+    role TEXT NOT NULL CHECK (role IN ('human','ai')),
+    content TEXT NOT NULL,
+    created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_chat_messages_session ON chat_messages (session_id, id);
+
+-- Bot graph state (LangGraph checkpoints); only the latest checkpoint per session is kept
+CREATE TABLE IF NOT EXISTS graph_checkpoints (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    parent_checkpoint_id TEXT,
+    type TEXT NOT NULL,
+    checkpoint BLOB NOT NULL,
+    metadata_type TEXT NOT NULL,
+    metadata BLOB NOT NULL,
+    updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (thread_id, checkpoint_ns)
+);
+
+CREATE TABLE IF NOT EXISTS graph_writes (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    channel TEXT NOT NULL,
+    type TEXT NOT NULL,
+    value BLOB NOT NULL,
+    task_path TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+);
@@ -57,6 +57,7 @@
 # class VarietiesResponse(BaseModel):
 #     name: str
 #     varieties: List[str]
+from datetime import datetime
 from typing import Optional, Dict, Any, List
 from pydantic import BaseModel, Field
 
@@ -399,3 +400,47 @@ class VarietiesResponse(BaseModel):
         }
     }
 
+
+class JobSubmitted(BaseModel):
+    job_id: str = Field(
+        description="Identifier of the queued background ingest job; poll GET /jobs/{job_id} for progress.",
+        examples=["3f1c2b7e-8a43-4d5e-9b0a-2f6d1c9e7a10"],
+    )
+    status: str = Field(
+        description="Initial job status, always 'queued' on submission.",
+        examples=["queued"],
+    )
+    total_rows: int = Field(
+        description="Number of parsed rows accepted into the job.",
+        examples=[100000],
+    )
+    rejected_rows: int = Field(
+        default=0,
+        description="Rows dropped during parsing (missing fields, bad numbers, duplicate SKUs).",
+        examples=[3],
+    )
+    rejected: List[Dict[str, Any]] = Field(
+        default_factory=list,
+        description="Sample of rejected rows with their spreadsheet row number and reason.",
+        examples=[[{"row": 17, "sku": "WHF001", "error": "duplicate sku (later row kept)"}]],
+    )
+
+
+class JobStatusResponse(BaseModel):
+    id: str = Field(description="Job identifier.", examples=["3f1c2b7e-8a43-4d5e-9b0a-2f6d1c9e7a10"])
+    kind: str = Field(description="Job type (products_upsert or restock).", examples=["products_upsert"])
+    status: str = Field(description="queued, running, completed or failed.", examples=["running"])
+    total_rows: int = Field(description="Rows in the uploaded payload.", examples=[100000])
+    processed_rows: int = Field(description="Rows committed successfully so far.", examples=[42500])
+    failed_rows: int = Field(description="Rows in chunks that were rolled back due to errors.", examples=[500])
+    committed_chunks: int = Field(description="Chunks finished (committed or recorded as failed).", examples=[86])
+    chunk_size: int = Field(description="Rows written per transaction.", examples=[500])
+    progress: float = Field(description="Fraction of rows handled, from 0.0 to 1.0.", examples=[0.43])
+    errors: List[Dict[str, Any]] = Field(
+        default_factory=list,
+        description="Per-chunk errors with row ranges (capped).",
+        examples=[[{"chunk": 12, "first_row": 6000, "last_row": 6499, "error": "Product not found: WHF001 (None)"}]],
+    )
+    created_at: Optional[datetime] = Field(default=None, description="When the job was submitted.")
+    started_at: Optional[datetime] = Field(default=None, description="When a worker first picked the job up.")
+    finished_at: Optional[datetime] = Field(default=None, description="When the job completed or failed.")
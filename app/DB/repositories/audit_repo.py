@@ -0,0 +1,74 @@
+from typing import Optional, List, Dict, Any
+
+from app.DB.Sql.db_manager import AsyncDBManager
+from app.DB.repositories.valuation_repo import ValuationRepository
+
+SIGNED_QTY = """CASE l.movement
+            WHEN 'IN' THEN l.quantity
+            WHEN 'OUT' THEN -l.quantity
+            WHEN 'ADJUST' THEN l.quantity
+        END"""
+
+
+class AuditRepository:
+    def __init__(self, db: AsyncDBManager):
+        self.db = db
+
+    async def max_ledger_id(self) -> int:
+        rows = await self.db.execute_query("SELECT COALESCE(MAX(id), 0) AS max_id FROM stock_ledger")
+        return int(rows[0]["max_id"])
+
+    async def balances_chunk(self, after_id: Optional[str], limit: int, upto_id: int) -> List[Dict[str, Any]]:
+        """
+        Next `limit` products by id after `after_id`, each with its stored quantity, its ledger balance
+        up to `upto_id`, the units sold between its last quantity upsert (mark_id; NULL for products
+        not upserted since marks were introduced) and `upto_id`, the quantity left in its FIFO cost
+        layers and its balance up to the valuation engine's high-water mark. One statement, so the layers and the mark come from the same snapshot
+        even while the engine is running; nothing is locked.
+        """
+        after = "WHERE id > %s" if after_id is not None else ""
+        q = f"""
+        WITH mark AS (
+            SELECT COALESCE(MAX(last_id), 0) AS valuation_id FROM ledger_cursors WHERE name = %s
+        ),
+        chunk AS (
+            SELECT id, sku, variety, quantity FROM products
+            {after}
+            ORDER BY id
+            LIMIT %s
+        )
+        SELECT c.id AS product_id, c.sku, c.variety, c.quantity AS stored,
+               COALESCE(SUM(CASE WHEN l.id <= %s THEN {SIGNED_QTY} END), 0) AS ledger,
+               mk.ledger_id AS mark_id,
+               COALESCE(SUM(CASE WHEN l.id > mk.ledger_id AND l.movement = 'OUT' THEN l.quantity END), 0)
+                   AS sold_since_mark,
+               COALESCE(SUM(CASE WHEN l.id <= m.valuation_id THEN {SIGNED_QTY} END), 0) AS ledger_at_valuation,
+               m.valuation_id,
+               (SELECT COALESCE(SUM(cl.qty_remaining), 0) FROM cost_layers cl WHERE cl.product_id = c.id) AS layered
+        FROM chunk c
+        CROSS JOIN mark m
+        LEFT JOIN product_stock_marks mk ON mk.product_id = c.id
+        LEFT JOIN stock_ledger l ON l.product_id = c.id AND l.id <= %s
+        GROUP BY c.id, c.sku, c.variety, c.quantity, m.valuation_id, mk.ledger_id
+        ORDER BY c.id
+        """
+        params = (ValuationRepository.CURSOR, *((after_id,) if after_id is not None else ()), limit, upto_id, upto_id)
+        return await self.db.execute_query(q, params) or []
+
+    async def expected_quantities(self, product_ids: list[str], conn) -> dict[str, float]:
+        """Stored quantity less the units sold since the last upsert, for the products that have a mark."""
+        q = f"""
+        SELECT p.id, p.quantity - COALESCE(SUM(l.quantity), 0)
+        FROM products p
+        JOIN product_stock_marks mk ON mk.product_id = p.id
+        LEFT JOIN stock_ledger l ON l.product_id = p.id AND l.id > mk.ledger_id AND l.movement = 'OUT'
+        WHERE p.id IN ({', '.join(['%s'] * len(product_ids))})
+        GROUP BY p.id, p.quantity
+        """
+        if self.db.is_postgres():
+            async with conn.cursor() as cur:
+                await cur.execute(q, product_ids)
+                rows = await cur.fetchall()
+        else:
+            rows = conn.execute(q.replace("%s", "?"), product_ids).fetchall()
+        return {str(r[0]): float(r[1]) for r in rows}
@@ -0,0 +1,41 @@
+from typing import List, Dict, Any
+
+from app.DB.Sql.db_manager import AsyncDBManager
+from app.tracing import span
+
+
+class ChatRepository:
+    def __init__(self, db: AsyncDBManager):
+        self.db = db
+
+    async def append_messages(self, rows: list[tuple]):
+        """Insert (session_id, role, content) rows in one transaction."""
+        q = "INSERT INTO chat_messages (session_id, role, content) VALUES (%s, %s, %s)"
+        async with self.db.transaction() as conn:
+            with span("db.query", "insert chat_messages"):
+                if self.db.is_postgres():
+                    async with conn.cursor() as cur:
+                        await cur.executemany(q, rows)
+                else:
+                    conn.executemany(q.replace("%s", "?"), rows)
+
+    async def recent_messages(self, session_id: str, limit: int) -> List[Dict[str, Any]]:
+        """The session's last `limit` messages, oldest first."""
+        q = """
+        SELECT role, content FROM (
+            SELECT id, role, content FROM chat_messages
+            WHERE session_id = %s
+            ORDER BY id DESC
+            LIMIT %s
+        ) recent
+        ORDER BY id
+        """
+        return await self.db.execute_query(q, (session_id, limit)) or []
+
+    async def message_count(self, session_id: str) -> int:
+        rows = await self.db.execute_query("SELECT COUNT(*) AS n FROM chat_messages WHERE session_id = %s",
+                                           (session_id,))
+        return int(rows[0]["n"]) if rows else 0
+
+    async def delete_session(self, session_id: str):
+        await self.db.execute_query("DELETE FROM chat_messages WHERE session_id = %s", (session_id,), commit=True)
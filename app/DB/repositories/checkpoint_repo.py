@@ -0,0 +1,85 @@
+from typing import Optional, List, Dict, Any
+
+from app.DB.Sql.db_manager import AsyncDBManager
+from app.tracing import span
+
+CHECKPOINT_COLUMNS = ("thread_id", "checkpoint_ns", "checkpoint_id", "parent_checkpoint_id", "type", "checkpoint",
+                      "metadata_type", "metadata")
+WRITE_COLUMNS = ("thread_id", "checkpoint_ns", "checkpoint_id", "task_id", "idx", "channel", "type", "value",
+                 "task_path")
+
+
+class CheckpointRepository:
+    """Storage for the bot graph's checkpoints: one row per (thread, namespace), replaced on every save."""
+
+    def __init__(self, db: AsyncDBManager):
+        self.db = db
+
+    async def latest(self, thread_id: str, checkpoint_ns: str,
+                     checkpoint_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        q = f"SELECT {', '.join(CHECKPOINT_COLUMNS)} FROM graph_checkpoints WHERE thread_id = %s AND checkpoint_ns = %s"
+        params = [thread_id, checkpoint_ns]
+        if checkpoint_id:
+            q += " AND checkpoint_id = %s"
+            params.append(checkpoint_id)
+        rows = await self.db.execute_query(q, tuple(params))
+        return rows[0] if rows else None
+
+    async def writes(self, thread_id: str, checkpoint_ns: str, checkpoint_id: str) -> List[Dict[str, Any]]:
+        q = """
+        SELECT task_id, idx, channel, type, value, task_path FROM graph_writes
+        WHERE thread_id = %s AND checkpoint_ns = %s AND checkpoint_id = %s
+        ORDER BY task_path, task_id, idx
+        """
+        return await self.db.execute_query(q, (thread_id, checkpoint_ns, checkpoint_id)) or []
+
+    async def put(self, row: tuple):
+        """Replace the thread's checkpoint with `row` (CHECKPOINT_COLUMNS order) and drop the old one's writes."""
+        upsert = f"""
+        INSERT INTO graph_checkpoints ({', '.join(CHECKPOINT_COLUMNS)}, updated_at)
+        VALUES ({', '.join(['%s'] * len(CHECKPOINT_COLUMNS))}, CURRENT_TIMESTAMP)
+        ON CONFLICT (thread_id, checkpoint_ns) DO UPDATE SET
+            checkpoint_id = excluded.checkpoint_id,
+            parent_checkpoint_id = excluded.parent_checkpoint_id,
+            type = excluded.type,
+            checkpoint = excluded.checkpoint,
+            metadata_type = excluded.metadata_type,
+            metadata = excluded.metadata,
+            updated_at = excluded.updated_at
+        """
+        prune = "DELETE FROM graph_writes WHERE thread_id = %s AND checkpoint_ns = %s AND checkpoint_id <> %s"
+        async with self.db.transaction() as conn:
+            with span("db.query", "upsert graph_checkpoints"):
+                if self.db.is_postgres():
+                    async with conn.cursor() as cur:
+                        await cur.execute(upsert, row)
+                        await cur.execute(prune, row[:3])
+                else:
+                    conn.execute(upsert.replace("%s", "?"), row)
+                    conn.execute(prune.replace("%s", "?"), row[:3])
+
+    async def put_writes(self, rows: list[tuple], replace: bool):
+        """Store pending writes (WRITE_COLUMNS order); special channels (negative idx) overwrite, others keep the first."""
+        conflict = ("DO UPDATE SET channel = excluded.channel, type = excluded.type, value = excluded.value, "
+                    "task_path = excluded.task_path") if replace else "DO NOTHING"
+        q = f"""
+        INSERT INTO graph_writes ({', '.join(WRITE_COLUMNS)})
+        VALUES ({', '.join(['%s'] * len(WRITE_COLUMNS))})
+        ON CONFLICT (thread_id, checkpoint_ns, checkpoint_id, task_id, idx) {conflict}
+        """
+        async with self.db.transaction() as conn:
+            with span("db.query", "insert graph_writes"):
+                if self.db.is_postgres():
+                    async with conn.cursor() as cur:
+                        await cur.executemany(q, rows)
+                else:
+                    conn.executemany(q.replace("%s", "?"), rows)
+
+    async def delete_thread(self, thread_id: str):
+        async with self.db.transaction() as conn:
+            for table in ("graph_writes", "graph_checkpoints"):
+                q = f"DELETE FROM {table} WHERE thread_id = %s"
+                if self.db.is_postgres():
+                    await conn.execute(q, (thread_id,))
+                else:
+                    conn.execute(q.replace("%s", "?"), (thread_id,))
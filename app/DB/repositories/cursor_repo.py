@@ -0,0 +1,89 @@
+from typing import Optional
+
+from app.DB.Sql.db_manager import AsyncDBManager, dict_row
+from app.tracing import span
+
+
+class LedgerCursorRepository:
+    """
+    High-water marks (last stock_ledger id applied) for tables derived incrementally from the ledger.
+    Subclasses set CURSOR; their (after_id, upto_id] batches are written in the same transaction
+    that advances the mark, so every ledger row is applied exactly once.
+    """
+
+    CURSOR: str = ""
+
+    def __init__(self, db: AsyncDBManager):
+        self.db = db
+
+    async def _exec(self, conn, query: str, params=(), fetch: bool = False, label: Optional[str] = None):
+        # Run one statement on a connection already inside db.transaction()
+        with span("db.query", label):
+            if self.db.is_postgres():
+                async with conn.cursor(row_factory=dict_row) as cur:
+                    await cur.execute(query, params)
+                    return await cur.fetchall() if fetch else None
+            cur = conn.execute(query.replace("%s", "?"), params)
+            if not fetch:
+                return None
+            cols = [d[0] for d in cur.description]
+            return [dict(zip(cols, r)) for r in cur.fetchall()]
+
+    async def _exec_many(self, conn, query: str, rows: list, label: Optional[str] = None):
+        if not rows:
+            return
+        with span("db.query", label):
+            if self.db.is_postgres():
+                async with conn.cursor() as cur:
+                    await cur.executemany(query, rows)
+            else:
+                conn.executemany(query.replace("%s", "?"), rows)
+
+    async def lock_cursor(self, conn) -> int:
+        """Return the high-water mark, creating it at 0; row-locked on Postgres until commit."""
+        await self._exec(conn, "INSERT INTO ledger_cursors (name, last_id) VALUES (%s, 0) ON CONFLICT (name) DO NOTHING",
+                         (self.CURSOR,), label="insert ledger_cursors")
+        q = "SELECT last_id FROM ledger_cursors WHERE name = %s"
+        if self.db.is_postgres():
+            q += " FOR UPDATE"
+        rows = await self._exec(conn, q, (self.CURSOR,), fetch=True, label="select ledger_cursors")
+        return int(rows[0]["last_id"])
+
+    async def set_cursor(self, conn, last_id: int):
+        now = "NOW()" if self.db.is_postgres() else "CURRENT_TIMESTAMP"
+        await self._exec(conn, f"UPDATE ledger_cursors SET last_id = %s, updated_at = {now} WHERE name = %s",
+                         (last_id, self.CURSOR), label="update ledger_cursors")
+
+    async def get_cursor(self) -> tuple[int, int]:
+        """(high-water mark, newest ledger id) in one read, without taking any lock."""
+        q = """
+        SELECT (SELECT last_id FROM ledger_cursors WHERE name = %s) AS last_id,
+               (SELECT MAX(id) FROM stock_ledger) AS max_id
+        """
+        rows = await self.db.execute_query(q, (self.CURSOR,))
+        return int(rows[0]["last_id"] or 0), int(rows[0]["max_id"] or 0)
+
+    async def next_upto(self, conn, after_id: int, batch_size: int, settle_seconds: float) -> int:
+        """
+        Highest ledger id to apply in the next batch (the next batch_size rows past after_id).
+        Rows are counted rather than ids, so a gap in the sequence (rolled back inserts, deleted
+        rows) never stalls the cursor.
+        On Postgres, ids are assigned at insert but become visible at commit, so rows younger than
+        settle_seconds are left for the next pass rather than risk skipping a lower id still in flight.
+        SQLite serialises writers, so ids always commit in order there.
+        """
+        if self.db.is_postgres():
+            q = """
+            SELECT MAX(id) AS upto FROM (
+                SELECT id FROM stock_ledger
+                WHERE id > %s AND created_at <= NOW() - make_interval(secs => %s)
+                ORDER BY id LIMIT %s
+            ) batch
+            """
+            params = (after_id, settle_seconds, batch_size)
+        else:
+            q = "SELECT MAX(id) AS upto FROM (SELECT id FROM stock_ledger WHERE id > %s ORDER BY id LIMIT %s)"
+            params = (after_id, batch_size)
+        rows = await self._exec(conn, q, params, fetch=True, label="select ledger upto")
+        upto = rows[0]["upto"] if rows else None
+        return int(upto) if upto is not None else after_id
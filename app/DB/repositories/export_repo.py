@@ -0,0 +1,86 @@
+from datetime import datetime, timezone
+from typing import Optional, AsyncIterator, Dict, Any
+
+from app.DB.Sql.db_manager import AsyncDBManager
+
+
+class ExportRepository:
+    """
+    Read-only, streaming queries for bulk exports. Queries are written with %s placeholders;
+    AsyncDBManager.stream_query converts them for SQLite.
+    """
+
+    def __init__(self, db: AsyncDBManager):
+        self.db = db
+
+    def _ts(self, value: Optional[datetime]):
+        # SQLite stores CURRENT_TIMESTAMP text in UTC ('YYYY-MM-DD HH:MM:SS')
+        if value is None or self.db.is_postgres():
+            return value
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+
+    def _category_expr(self) -> str:
+        if self.db.is_postgres():
+            return "p.attributes->>'category'"
+        return "json_extract(p.attributes, '$.category')"
+
+    def stream_products(self, skus: Optional[list[str]] = None, category: Optional[str] = None,
+                        updated_since: Optional[datetime] = None, updated_until: Optional[datetime] = None,
+                        active_only: bool = False) -> AsyncIterator[Dict[str, Any]]:
+        where, params = [], []
+        if skus:
+            where.append(f"p.sku IN ({', '.join(['%s'] * len(skus))})")
+            params.extend(skus)
+        if category:
+            where.append(f"{self._category_expr()} = %s")
+            params.append(category)
+        if updated_since:
+            where.append("p.updated_at >= %s")
+            params.append(self._ts(updated_since))
+        if updated_until:
+            where.append("p.updated_at < %s")
+            params.append(self._ts(updated_until))
+        if active_only:
+            where.append("p.is_active = %s")
+            params.append(True if self.db.is_postgres() else 1)
+        q = """
+        SELECT p.sku, p.name, p.variety, p.price, p.quantity, p.attributes, p.is_active,
+               p.created_at, p.updated_at
+        FROM products p
+        """
+        if where:
+            q += " WHERE " + " AND ".join(where)
+        q += " ORDER BY p.sku"
+        return self.db.stream_query(q, params)
+
+    def stream_ledger(self, skus: Optional[list[str]] = None, movement: Optional[str] = None,
+                      since: Optional[datetime] = None, until: Optional[datetime] = None,
+                      after_id: Optional[int] = None) -> AsyncIterator[Dict[str, Any]]:
+        where, params = [], []
+        if skus:
+            where.append(f"p.sku IN ({', '.join(['%s'] * len(skus))})")
+            params.extend(skus)
+        if movement:
+            where.append("l.movement = %s")
+            params.append(movement)
+        if since:
+            where.append("l.created_at >= %s")
+            params.append(self._ts(since))
+        if until:
+            where.append("l.created_at < %s")
+            params.append(self._ts(until))
+        if after_id is not None:
+            where.append("l.id > %s")
+            params.append(after_id)
+        q = """
+        SELECT l.id, p.sku, p.variety, l.movement, l.quantity, l.unit_price,
+               l.source, l.ref_id, l.notes, l.created_at
+        FROM stock_ledger l
+        JOIN products p ON p.id = l.product_id
+        """
+        if where:
+            q += " WHERE " + " AND ".join(where)
+        q += " ORDER BY l.id"
+        return self.db.stream_query(q, params)
@@ -0,0 +1,62 @@
+from typing import Optional, List, Dict, Any
+
+from app.DB.Sql.db_manager import AsyncDBManager
+from app.tracing import span
+
+STATE_COLUMNS = ("product_id", "method", "daily_rate", "next_week", "level", "size", "interval_days",
+                 "since_demand", "nonzero_days", "observed_days", "through_day")
+
+
+class ForecastRepository:
+    def __init__(self, db: AsyncDBManager):
+        self.db = db
+
+    async def active_products(self) -> List[Dict[str, Any]]:
+        active = "is_active" if self.db.is_postgres() else "is_active = 1"
+        return await self.db.execute_query(f"SELECT id, created_at FROM products WHERE {active}") or []
+
+    async def load_states(self) -> List[Dict[str, Any]]:
+        q = f"SELECT {', '.join(STATE_COLUMNS)} FROM demand_forecasts"
+        return await self.db.execute_query(q) or []
+
+    async def replace_all(self, rows: list[tuple]):
+        """Swap all stored forecasts for `rows` (tuples in STATE_COLUMNS order) in one transaction."""
+        q = f"""
+        INSERT INTO demand_forecasts ({', '.join(STATE_COLUMNS)})
+        VALUES ({', '.join(['%s'] * len(STATE_COLUMNS))})
+        """
+        async with self.db.transaction() as conn:
+            with span("db.query", "replace demand_forecasts"):
+                if self.db.is_postgres():
+                    async with conn.cursor() as cur:
+                        await cur.execute("DELETE FROM demand_forecasts")
+                        if rows:
+                            await cur.executemany(q, rows)
+                else:
+                    conn.execute("DELETE FROM demand_forecasts")
+                    conn.executemany(q.replace("%s", "?"), rows)
+
+    async def list_forecasts(self, skus: Optional[list[str]] = None, category: Optional[str] = None,
+                             method: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        where, params = [], []
+        if skus:
+            where.append(f"p.sku IN ({', '.join(['%s'] * len(skus))})")
+            params.extend(skus)
+        if category:
+            expr = "p.attributes->>'category'" if self.db.is_postgres() else "json_extract(p.attributes, '$.category')"
+            where.append(f"{expr} = %s")
+            params.append(category)
+        if method:
+            where.append("f.method = %s")
+            params.append(method)
+        where_sql = f"WHERE {' AND '.join(where)}" if where else ""
+        q = f"""
+        SELECT p.sku, p.name, p.variety, f.method, f.daily_rate, f.next_week, f.nonzero_days,
+               f.observed_days, f.through_day, f.updated_at
+        FROM demand_forecasts f
+        JOIN products p ON p.id = f.product_id
+        {where_sql}
+        ORDER BY f.next_week DESC, p.sku
+        LIMIT %s
+        """
+        return await self.db.execute_query(q, [*params, limit]) or []
@@ -1,7 +1,8 @@
 ﻿import uuid
 from typing import Optional, List, Dict, Any
 
-from app.DB.Sql.db_manager import AsyncDBManager
+from app.DB.Sql.db_manager import AsyncDBManager, dict_row
+from app.tracing import span
 # from DB.Sql.db_manager import AsyncDBManager
 
 class InventoryRepository:
@@ -19,8 +20,8 @@ class InventoryRepository:
         attributes = attributes or {}
         if self.db.is_postgres():
             query = """
-            INSERT INTO products (id, sku, name, variety, price, attributes, is_active)
-            VALUES (uuid_generate_v4(), %s, %s, %s, %s, %s::jsonb, %s)
+            INSERT INTO products (id, sku, name, variety, price, quantity, attributes, is_active)
+            VALUES (uuid_generate_v4(), %s, %s, %s, %s, %s, %s::jsonb, %s)
             ON CONFLICT (sku) DO UPDATE
             SET name = EXCLUDED.name,
                 variety = EXCLUDED.variety,
@@ -30,14 +31,14 @@ class InventoryRepository:
                 is_active = EXCLUDED.is_active
             RETURNING id
             """
-            rows = await self.db.execute_query(query, (sku, name, variety, price, quantity, attributes, is_active), commit=True)
+            rows = await self.db.execute_query(query, (sku, name, variety, price, quantity, json_dumps(attributes), is_active), commit=True)
             return rows[0]["id"]
         else:
             # SQLite: need to manage IDs ourselves
             row = await self.db.execute_query("SELECT id FROM products WHERE sku = ?", (sku,))
             if row:
                 await self.db.execute_query(
-                    "UPDATE products SET name=?, variety=?, price=?, qunatity=?, attributes=?, is_active=? WHERE sku=?",
+                    "UPDATE products SET name=?, variety=?, price=?, quantity=?, attributes=?, is_active=? WHERE sku=?",
                     (name, variety, price, quantity, json_dumps(attributes), 1 if is_active else 0, sku),
                     commit=True,
                 )
@@ -59,12 +60,12 @@ class InventoryRepository:
             it.setdefault("is_active", True)
 
         if self.db.is_postgres():
-            cols = ("sku", "name", "variety", "price","quantity","tributes", "is_active")
-            placeholders = ", ".join(["(%s, %s, %s, %s, %s::jsonb, %s)"] * len(items))
+            cols = ("sku", "name", "variety", "price", "quantity", "attributes", "is_active")
+            placeholders = ", ".join(["(%s, %s, %s, %s, %s, %s::jsonb, %s)"] * len(items))
             flat = []
             for it in items:
                 flat.extend([
-                    it["sku"], it["name"], it.get("variety"), it["price"],it["quantity"] ,it["attributes"], it.get("is_active", True)
+                    it["sku"], it["name"], it.get("variety"), it["price"], it["quantity"], json_dumps(it["attributes"]), it.get("is_active", True)
                 ])
             sql = f"""
             INSERT INTO products ({", ".join(cols)})
@@ -141,7 +142,7 @@ class InventoryRepository:
     async def get_stock(self, sku: str, variety: Optional[str] = None, name: Optional[str] = None) -> Dict[str, Any]:
         if self.db.is_postgres():
             q = """
-            SELECT p.sku, p.name, p.variety, COALESCE(sv.quantity,0) AS quantity
+            SELECT p.sku, p.name, p.variety, COALESCE(sv.current_quantity,0) AS quantity
             FROM products p
             LEFT JOIN stock_view sv ON sv.product_id = p.id
             WHERE p.sku = %s AND (%s IS NULL OR p.variety = %s)
@@ -149,7 +150,7 @@ class InventoryRepository:
             rows = await self.db.execute_query(q, (sku, variety, variety))
         else:
             q = """
-            SELECT p.sku, p.name, p.variety, COALESCE(sv.quantity,0) AS quantity
+            SELECT p.sku, p.name, p.variety, COALESCE(sv.current_quantity,0) AS quantity
             FROM products p
             LEFT JOIN stock_view sv ON sv.product_id = p.id
             WHERE p.sku = ? AND (? IS NULL OR p.variety = ?)
@@ -157,7 +158,7 @@ class InventoryRepository:
             rows = await self.db.execute_query(q, (sku, variety, variety))
         if not rows:
             return {"sku": sku, "quantity": 0, "available": False}
-        qty = rows[0]["quantity"] or 0
+        qty = int(rows[0]["quantity"] or 0)
         return {"sku": sku, "quantity": qty, "available": qty > 0}
 
     async def list_varieties(self, name: str) -> List[str]:
@@ -173,8 +174,8 @@ class InventoryRepository:
         if self.db.is_postgres():
             q = """
             SELECT p.sku, p.name, p.variety, p.price,
-                   COALESCE(sv.quantity,0) AS quantity,
-                   (COALESCE(sv.quantity,0) > 0) AS available
+                   COALESCE(sv.current_quantity,0) AS quantity,
+                   (COALESCE(sv.current_quantity,0) > 0) AS available
             FROM products p
             LEFT JOIN stock_view sv ON sv.product_id = p.id
             WHERE p.sku = %s AND (%s IS NULL OR p.variety = %s)
@@ -183,8 +184,8 @@ class InventoryRepository:
         else:
             q = """
             SELECT p.sku, p.name, p.variety, p.price,
-                   COALESCE(sv.quantity,0) AS quantity,
-                   CASE WHEN COALESCE(sv.quantity,0) > 0 THEN 1 ELSE 0 END AS available
+                   COALESCE(sv.current_quantity,0) AS quantity,
+                   CASE WHEN COALESCE(sv.current_quantity,0) > 0 THEN 1 ELSE 0 END AS available
             FROM products p
             LEFT JOIN stock_view sv ON sv.product_id = p.id
             WHERE p.sku = ? AND (? IS NULL OR p.variety = ?)
@@ -198,10 +199,56 @@ class InventoryRepository:
             "name": row["name"],
             "variety": row["variety"],
             "price": float(row["price"]),
-            "quantity": float(row["quantity"]),
+            "quantity": int(row["quantity"]),
             "available": bool(row["available"]),
         }
 
+    async def catalog_index(self) -> List[Dict[str, Any]]:
+        """(id, sku, name, variety) of every active product, for in-memory lookups."""
+        active = "is_active" if self.db.is_postgres() else "is_active = 1"
+        return await self.db.execute_query(f"SELECT id, sku, name, variety FROM products WHERE {active}") or []
+
+    async def catalog_version(self) -> str:
+        """Changes whenever a product is added, removed or edited (not on stock movements)."""
+        rows = await self.db.execute_query("SELECT COUNT(*) AS n, MAX(updated_at) AS changed FROM products")
+        return f"{rows[0]['n']}:{rows[0]['changed']}" if rows else "0:"
+
+    async def product_cards(self, skus: list[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Cards for many SKUs in one query, keyed by sku. Balances are summed from the ledger rows of
+        the requested products only (not the whole stock_view), and each card carries a
+        stock_version: the product's newest ledger id, which changes with every stock movement.
+        """
+        if not skus:
+            return {}
+        q = f"""
+        SELECT p.id, p.sku, p.name, p.variety, p.price,
+               COALESCE(SUM(CASE
+                   WHEN l.movement='IN' THEN l.quantity
+                   WHEN l.movement='OUT' THEN -l.quantity
+                   WHEN l.movement='ADJUST' THEN l.quantity
+               END), 0) AS quantity,
+               COALESCE(MAX(l.id), 0) AS stock_version
+        FROM products p
+        LEFT JOIN stock_ledger l ON l.product_id = p.id
+        WHERE p.sku IN ({', '.join(['%s'] * len(skus))})
+        GROUP BY p.id, p.sku, p.name, p.variety, p.price
+        """
+        rows = await self.db.execute_query(q, list(skus)) or []
+        return {
+            row["sku"]: {
+                "product_id": str(row["id"]),
+                "sku": row["sku"],
+                "name": row["name"],
+                "variety": row["variety"],
+                "price": float(row["price"]),
+                "quantity": int(row["quantity"]),
+                "available": int(row["quantity"]) > 0,
+                "stock_version": int(row["stock_version"]),
+            }
+            for row in rows
+        }
+
     async def search(self, query: str, variety: Optional[str] = None) -> List[Dict[str, Any]]:
         """
         Search for products whose SKU or name matches the given query string,
@@ -231,8 +278,9 @@ class InventoryRepository:
         # 'query' is the search string used to match product SKU or name (partial match).
         if self.db.is_postgres():
             q = """
-            SELECT p.sku, p.name, p.variety, p.price, AS quantity,
-                   (COALESCE(sv.quantity,0) > 0) AS available
+            SELECT p.sku, p.name, p.variety, p.price,
+                   COALESCE(sv.current_quantity,0) AS quantity,
+                   (COALESCE(sv.current_quantity,0) > 0) AS available
             FROM products p
             LEFT JOIN stock_view sv ON sv.product_id = p.id
             WHERE (p.sku ILIKE %s OR p.name ILIKE %s)
@@ -243,8 +291,8 @@ class InventoryRepository:
         else:
             q = """
             SELECT p.sku, p.name, p.variety, p.price,
-                   COALESCE(sv.quantity,0) AS quantity,
-                   CASE WHEN COALESCE(sv.quantity,0) > 0 THEN 1 ELSE 0 END AS available
+                   COALESCE(sv.current_quantity,0) AS quantity,
+                   CASE WHEN COALESCE(sv.current_quantity,0) > 0 THEN 1 ELSE 0 END AS available
             FROM products p
             LEFT JOIN stock_view sv ON sv.product_id = p.id
             WHERE (p.sku LIKE ? OR p.name LIKE ?)
@@ -318,7 +366,8 @@ class InventoryRepository:
                 await self.db.execute_query(q, params, commit=True)
             else:
                 async with conn.cursor() as cur:
-                    await cur.execute(q, params)
+                    with span("db.query", "insert stock_ledger"):
+                        await cur.execute(q, params)
         else:
             q = """
             INSERT INTO stock_ledger (product_id, movement, quantity, unit_price, source, ref_id, notes)
@@ -328,7 +377,8 @@ class InventoryRepository:
             if conn is None:
                 await self.db.execute_query(q, params, commit=True)
             else:
-                conn.execute(q.replace("%s", "?"), params)
+                with span("db.query", "insert stock_ledger"):
+                    conn.execute(q.replace("%s", "?"), params)
 
     async def select_stock_for_update(self, product_id: str, conn):
         if self.db.is_postgres():
@@ -343,8 +393,9 @@ class InventoryRepository:
             FOR UPDATE
             """
             async with conn.cursor(row_factory=dict_row) as cur:
-                await cur.execute(q, (product_id,))
-                row = await cur.fetchone()
+                with span("db.query", "select stock for update"):
+                    await cur.execute(q, (product_id,))
+                    row = await cur.fetchone()
                 return int(row["qty"])
         else:
             # SQLite: no row-level locks; BEGIN IMMEDIATE already holds a write lock
@@ -358,8 +409,9 @@ class InventoryRepository:
             WHERE product_id = ?
             """
             cur = conn.cursor()
-            cur.execute(q, (product_id,))
-            row = cur.fetchone()
+            with span("db.query", "select stock for update"):
+                cur.execute(q, (product_id,))
+                row = cur.fetchone()
             return int(row[0] if row and row[0] is not None else 0)
     
     async def resolve_many_product_ids(self, items: list[dict]) -> dict:
@@ -388,8 +440,9 @@ class InventoryRepository:
                 FOR UPDATE
                 """
                 async with conn.cursor() as cur:
-                    await cur.execute(q, (pid,))
-                    row = await cur.fetchone()
+                    with span("db.query", "select stock for update"):
+                        await cur.execute(q, (pid,))
+                        row = await cur.fetchone()
                 stocks[pid] = int(row[0] if row and row[0] is not None else 0)
         else:
             # SQLite: BEGIN IMMEDIATE already holds the database write lock
@@ -404,11 +457,102 @@ class InventoryRepository:
                 WHERE product_id = ?
                 """
                 cur = conn.cursor()
-                cur.execute(q, (pid,))
-                row = cur.fetchone()
+                with span("db.query", "select stock for update"):
+                    cur.execute(q, (pid,))
+                    row = cur.fetchone()
                 stocks[pid] = int(row[0] if row and row[0] is not None else 0)
         return stocks
 
+    async def select_stock_versions(self, product_ids: list[str], conn) -> dict[str, int]:
+        """Newest ledger id per product (0 when it has no movements), read inside the caller's transaction."""
+        q = f"""
+        SELECT product_id, MAX(id) AS version FROM stock_ledger
+        WHERE product_id IN ({', '.join(['%s'] * len(product_ids))})
+        GROUP BY product_id
+        """
+        with span("db.query", "select stock versions"):
+            if self.db.is_postgres():
+                async with conn.cursor() as cur:
+                    await cur.execute(q, product_ids)
+                    rows = await cur.fetchall()
+            else:
+                rows = conn.execute(q.replace("%s", "?"), product_ids).fetchall()
+        versions = {str(r[0]): int(r[1]) for r in rows}
+        return {pid: versions.get(pid, 0) for pid in product_ids}
+
+    def _category_expr(self) -> str:
+        if self.db.is_postgres():
+            return "p.attributes->>'category'"
+        return "json_extract(p.attributes, '$.category')"
+
+    async def max_ledger_id(self, settle_seconds: float = 0) -> int:
+        """
+        Newest ledger id. With settle_seconds, only rows at least that old count on Postgres, where
+        ids are assigned at insert but become visible at commit: a lower id may still be in flight.
+        SQLite serialises writers, so ids always commit in order there.
+        """
+        if settle_seconds and self.db.is_postgres():
+            rows = await self.db.execute_query(
+                "SELECT COALESCE(MAX(id), 0) AS max_id FROM stock_ledger "
+                "WHERE created_at <= NOW() - make_interval(secs => %s)", (settle_seconds,))
+        else:
+            rows = await self.db.execute_query("SELECT COALESCE(MAX(id), 0) AS max_id FROM stock_ledger")
+        return int(rows[0]["max_id"]) if rows else 0
+
+    async def ledger_since(self, after_id: int, limit: int = 1000, skus: Optional[list[str]] = None,
+                           category: Optional[str] = None, upto_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Ledger rows with id > after_id in id order, joined with their product's sku/variety/category.
+        Optional filters restrict to a SKU set, a category (attributes.category) or ids <= upto_id.
+        Placeholders are %s on both backends (execute_query converts them for SQLite).
+        """
+        where, params = ["l.id > %s"], [after_id]
+        if upto_id is not None:
+            where.append("l.id <= %s")
+            params.append(upto_id)
+        if skus:
+            where.append(f"p.sku IN ({', '.join(['%s'] * len(skus))})")
+            params.extend(skus)
+        if category:
+            where.append(f"{self._category_expr()} = %s")
+            params.append(category)
+        q = f"""
+        SELECT l.id, l.product_id, p.sku, p.variety, {self._category_expr()} AS category,
+               l.movement, l.quantity, l.unit_price, l.source, l.ref_id, l.created_at
+        FROM stock_ledger l
+        JOIN products p ON p.id = l.product_id
+        WHERE {" AND ".join(where)}
+        ORDER BY l.id
+        LIMIT %s
+        """
+        params.append(limit)
+        return await self.db.execute_query(q, params) or []
+
+    async def balances(self, product_ids: list[str], upto_id: Optional[int] = None) -> dict[str, int]:
+        # Aggregates only the requested products' ledger rows (idx_ledger_product) rather than all of stock_view
+        if not product_ids:
+            return {}
+        params = list(product_ids)
+        upto = ""
+        if upto_id is not None:
+            upto = "AND id <= %s"
+            params.append(upto_id)
+        q = f"""
+        SELECT product_id, COALESCE(SUM(CASE
+                   WHEN movement='IN' THEN quantity
+                   WHEN movement='OUT' THEN -quantity
+                   WHEN movement='ADJUST' THEN quantity
+               END), 0) AS qty
+        FROM stock_ledger
+        WHERE product_id IN ({', '.join(['%s'] * len(product_ids))}) {upto}
+        GROUP BY product_id
+        """
+        rows = await self.db.execute_query(q, params)
+        out = {str(pid): 0 for pid in product_ids}
+        for r in rows or []:
+            out[str(r["product_id"])] = int(r["qty"])
+        return out
+
 
 
 def json_dumps(obj) -> str:
@@ -0,0 +1,148 @@
+import json
+import uuid
+from typing import Optional, List, Dict, Any
+
+from app.DB.Sql.db_manager import AsyncDBManager
+from app.DB.repositories.inventory_repo import json_dumps
+
+
+def _json_field(value, default):
+    # Postgres hands JSONB back as Python objects, SQLite as TEXT
+    if value is None:
+        return default
+    if isinstance(value, (str, bytes)):
+        return json.loads(value)
+    return value
+
+
+class JobRepository:
+    def __init__(self, db: AsyncDBManager):
+        self.db = db
+
+    async def create_job(self, kind: str, payload: list[dict], options: Optional[dict], chunk_size: int) -> str:
+        """
+        Persist a new ingest job in the 'queued' state together with its full payload,
+        so the job can be resumed from the last committed chunk after a crash.
+        Returns the job id as a string.
+        """
+        job_id = str(uuid.uuid4())
+        params = (job_id, kind, json_dumps(payload), json_dumps(options or {}), chunk_size, len(payload))
+        if self.db.is_postgres():
+            q = """
+            INSERT INTO ingest_jobs (id, kind, payload, options, chunk_size, total_rows)
+            VALUES (%s, %s, %s::jsonb, %s::jsonb, %s, %s)
+            """
+        else:
+            q = """
+            INSERT INTO ingest_jobs (id, kind, payload, options, chunk_size, total_rows)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """
+        await self.db.execute_query(q, params, commit=True)
+        return job_id
+
+    async def get_job(self, job_id: str, include_payload: bool = False) -> Optional[Dict[str, Any]]:
+        cols = """id, kind, status, options, chunk_size, total_rows, processed_rows, failed_rows,
+                  committed_chunks, errors, created_at, started_at, finished_at, updated_at"""
+        if include_payload:
+            cols += ", payload"
+        if self.db.is_postgres():
+            q = f"SELECT {cols} FROM ingest_jobs WHERE id = %s"
+        else:
+            q = f"SELECT {cols} FROM ingest_jobs WHERE id = ?"
+        rows = await self.db.execute_query(q, (job_id,))
+        if not rows:
+            return None
+        job = dict(rows[0])
+        job["id"] = str(job["id"])
+        job["options"] = _json_field(job.get("options"), {})
+        job["errors"] = _json_field(job.get("errors"), [])
+        if include_payload:
+            job["payload"] = _json_field(job.get("payload"), [])
+        return job
+
+    def _expired(self) -> str:
+        # SQL condition (one parameter: lease seconds) for a running job whose owner stopped renewing
+        if self.db.is_postgres():
+            return "(heartbeat_at IS NULL OR heartbeat_at < NOW() - %s * INTERVAL '1 second')"
+        return "(heartbeat_at IS NULL OR heartbeat_at < datetime('now', '-' || %s || ' seconds'))"
+
+    async def list_resumable_jobs(self, lease_seconds: float) -> List[str]:
+        # Jobs still queued, or interrupted mid-run (worker crash) and no longer renewed by their owner
+        q = f"""
+        SELECT id FROM ingest_jobs
+        WHERE status = 'queued' OR (status = 'running' AND {self._expired()})
+        ORDER BY created_at
+        """
+        rows = await self.db.execute_query(q, (lease_seconds,))
+        return [str(r["id"]) for r in rows or []]
+
+    async def claim_job(self, job_id: str, owner: str, lease_seconds: float) -> bool:
+        """
+        Take the job for `owner` if it is queued or its lease has expired. A single conditional
+        UPDATE, so of several runners (in this process or other workers) exactly one wins.
+        """
+        now = "NOW()" if self.db.is_postgres() else "CURRENT_TIMESTAMP"
+        q = f"""
+        UPDATE ingest_jobs
+        SET status = 'running', owner = %s, heartbeat_at = {now},
+            started_at = COALESCE(started_at, {now}), updated_at = {now}
+        WHERE id = %s AND (status = 'queued' OR (status = 'running' AND {self._expired()}))
+        RETURNING id
+        """
+        rows = await self.db.execute_query(q, (owner, job_id, lease_seconds), commit=True)
+        return bool(rows)
+
+    async def commit_chunk(self, job_id: str, owner: str, chunk_idx: int, processed: int, failed: int,
+                           errors: list[dict], conn) -> bool:
+        """
+        Advance the job past chunk `chunk_idx` and renew the owner's lease. Call it with the
+        connection of the transaction that wrote the chunk's rows, so progress and data commit
+        (or roll back) together. Returns False, and changes nothing, when the job is no longer
+        at that chunk or owned by `owner`; the caller must then roll the chunk back.
+        """
+        params = (processed, failed, json_dumps(errors), job_id, chunk_idx, owner)
+        if self.db.is_postgres():
+            q = """
+            UPDATE ingest_jobs
+            SET processed_rows = processed_rows + %s,
+                failed_rows = failed_rows + %s,
+                committed_chunks = committed_chunks + 1,
+                errors = %s::jsonb,
+                heartbeat_at = NOW(),
+                updated_at = NOW()
+            WHERE id = %s AND committed_chunks = %s AND owner = %s AND status = 'running'
+            """
+            async with conn.cursor() as cur:
+                await cur.execute(q, params)
+                return cur.rowcount == 1
+        else:
+            q = """
+            UPDATE ingest_jobs
+            SET processed_rows = processed_rows + ?,
+                failed_rows = failed_rows + ?,
+                committed_chunks = committed_chunks + 1,
+                errors = ?,
+                heartbeat_at = CURRENT_TIMESTAMP,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE id = ? AND committed_chunks = ? AND owner = ? AND status = 'running'
+            """
+            return conn.execute(q, params).rowcount == 1
+
+    async def finish_job(self, job_id: str, status: str, errors: Optional[list[dict]] = None,
+                         owner: Optional[str] = None):
+        """Close the job; with `owner`, only while that runner still holds it."""
+        guard = " AND owner = %s AND status = 'running'" if owner is not None else ""
+        if self.db.is_postgres():
+            q = f"""
+            UPDATE ingest_jobs
+            SET status = %s, errors = COALESCE(%s::jsonb, errors), finished_at = NOW(), updated_at = NOW()
+            WHERE id = %s{guard}
+            """
+        else:
+            q = f"""
+            UPDATE ingest_jobs
+            SET status = ?, errors = COALESCE(?, errors), finished_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
+            WHERE id = ?{guard.replace("%s", "?")}
+            """
+        params = (status, json_dumps(errors) if errors is not None else None, job_id)
+        await self.db.execute_query(q, params + ((owner,) if owner is not None else ()), commit=True)
@@ -0,0 +1,73 @@
+from typing import Optional, List, Dict, Any
+
+from app.DB.Sql.db_manager import AsyncDBManager
+from app.tracing import span
+
+
+class ReorderRepository:
+    def __init__(self, db: AsyncDBManager):
+        self.db = db
+
+    async def positions(self) -> List[Dict[str, Any]]:
+        """Every active product with its on-hand quantity and creation time."""
+        active = "p.is_active" if self.db.is_postgres() else "p.is_active = 1"
+        q = f"""
+        SELECT p.id AS product_id, p.created_at, COALESCE(sv.current_quantity, 0) AS on_hand
+        FROM products p
+        LEFT JOIN stock_view sv ON sv.product_id = p.id
+        WHERE {active}
+        """
+        return await self.db.execute_query(q) or []
+
+    async def replace_all(self, rows: list[tuple]):
+        """
+        Swap the stored suggestions for `rows` in one transaction. Each row is (product_id, on_hand,
+        avg_daily_demand, demand_std, days_of_cover, safety_stock, reorder_point, suggested_qty,
+        needs_reorder, window_days, lead_time_days).
+        """
+        q = """
+        INSERT INTO reorder_suggestions (product_id, on_hand, avg_daily_demand, demand_std, days_of_cover,
+                                         safety_stock, reorder_point, suggested_qty, needs_reorder,
+                                         window_days, lead_time_days)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        """
+        async with self.db.transaction() as conn:
+            with span("db.query", "replace reorder_suggestions"):
+                if self.db.is_postgres():
+                    async with conn.cursor() as cur:
+                        await cur.execute("DELETE FROM reorder_suggestions")
+                        if rows:
+                            await cur.executemany(q, rows)
+                else:
+                    conn.execute("DELETE FROM reorder_suggestions")
+                    conn.executemany(q.replace("%s", "?"), rows)
+
+    async def list_suggestions(self, only_needed: bool = True, skus: Optional[list[str]] = None,
+                               category: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        where, params = [], []
+        if only_needed:
+            where.append("r.needs_reorder" if self.db.is_postgres() else "r.needs_reorder = 1")
+        if skus:
+            where.append(f"p.sku IN ({', '.join(['%s'] * len(skus))})")
+            params.extend(skus)
+        if category:
+            expr = "p.attributes->>'category'" if self.db.is_postgres() else "json_extract(p.attributes, '$.category')"
+            where.append(f"{expr} = %s")
+            params.append(category)
+        where_sql = f"WHERE {' AND '.join(where)}" if where else ""
+        # Most urgent first: least cover left, products without demand last
+        q = f"""
+        SELECT p.sku, p.name, p.variety, r.on_hand, r.avg_daily_demand, r.demand_std, r.days_of_cover,
+               r.safety_stock, r.reorder_point, r.suggested_qty, r.needs_reorder, r.window_days,
+               r.lead_time_days, r.computed_at
+        FROM reorder_suggestions r
+        JOIN products p ON p.id = r.product_id
+        {where_sql}
+        ORDER BY CASE WHEN r.days_of_cover IS NULL THEN 1 ELSE 0 END, r.days_of_cover, p.sku
+        LIMIT %s
+        """
+        return await self.db.execute_query(q, [*params, limit]) or []
+
+    async def last_computed_at(self):
+        rows = await self.db.execute_query("SELECT MAX(computed_at) AS computed_at FROM reorder_suggestions")
+        return rows[0]["computed_at"] if rows else None
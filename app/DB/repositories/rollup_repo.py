@@ -0,0 +1,99 @@
+from datetime import date, datetime, timedelta
+from typing import Optional, List, Dict, Any
+
+from app.DB.repositories.cursor_repo import LedgerCursorRepository
+
+
+class RollupRepository(LedgerCursorRepository):
+    """
+    Daily and hourly per-product sales rollups built from OUT rows of stock_ledger.
+
+    Rollups are advanced in ledger id order from the "sales_rollup" high-water mark; buckets are UTC.
+    """
+
+    CURSOR = "sales_rollup"
+
+    async def apply(self, conn, after_id: int, upto_id: int):
+        """Fold OUT rows with after_id < id <= upto_id into sales_daily and sales_hourly."""
+        if self.db.is_postgres():
+            day = "(l.created_at AT TIME ZONE 'UTC')::date"
+            hour = "date_trunc('hour', l.created_at AT TIME ZONE 'UTC')"
+        else:
+            day = "date(l.created_at)"
+            hour = "strftime('%Y-%m-%d %H:00:00', l.created_at)"
+        for table, bucket_col, bucket in (("sales_daily", "day", day), ("sales_hourly", "hour", hour)):
+            # A missing sale price falls back to the list price
+            q = f"""
+            INSERT INTO {table} (product_id, {bucket_col}, units, revenue, sales)
+            SELECT l.product_id, {bucket}, SUM(l.quantity), SUM(l.quantity * COALESCE(l.unit_price, p.price)), COUNT(*)
+            FROM stock_ledger l
+            JOIN products p ON p.id = l.product_id
+            WHERE l.movement = 'OUT' AND l.id > %s AND l.id <= %s
+            GROUP BY l.product_id, {bucket}
+            ON CONFLICT (product_id, {bucket_col}) DO UPDATE
+            SET units = {table}.units + EXCLUDED.units,
+                revenue = {table}.revenue + EXCLUDED.revenue,
+                sales = {table}.sales + EXCLUDED.sales
+            """
+            await self._exec(conn, q, (after_id, upto_id), label=f"upsert {table}")
+
+    async def daily_units(self, start: date, end: date) -> List[Dict[str, Any]]:
+        """(product_id, day, units) rows from sales_daily for start <= day < end."""
+        q = "SELECT product_id, day, units FROM sales_daily WHERE day >= %s AND day < %s"
+        if self.db.is_postgres():
+            return await self.db.execute_query(q, (start, end)) or []
+        return await self.db.execute_query(q, (start.isoformat(), end.isoformat())) or []
+
+    def _range(self, granularity: str, start: date, end: date):
+        # Inclusive start/end dates -> (table, bucket column, lower bound, exclusive upper bound)
+        if granularity == "hour":
+            lo = datetime(start.year, start.month, start.day)
+            hi = datetime(end.year, end.month, end.day) + timedelta(days=1)
+            if not self.db.is_postgres():
+                lo, hi = lo.strftime("%Y-%m-%d %H:%M:%S"), hi.strftime("%Y-%m-%d %H:%M:%S")
+            return "sales_hourly", "hour", lo, hi
+        lo, hi = start, end + timedelta(days=1)
+        if not self.db.is_postgres():
+            lo, hi = lo.isoformat(), hi.isoformat()
+        return "sales_daily", "day", lo, hi
+
+    def _filters(self, skus: Optional[list[str]], category: Optional[str]):
+        where, params = [], []
+        if skus:
+            where.append(f"p.sku IN ({', '.join(['%s'] * len(skus))})")
+            params.extend(skus)
+        if category:
+            expr = "p.attributes->>'category'" if self.db.is_postgres() else "json_extract(p.attributes, '$.category')"
+            where.append(f"{expr} = %s")
+            params.append(category)
+        return "".join(f" AND {w}" for w in where), params
+
+    async def sales_series(self, start: date, end: date, granularity: str = "day",
+                           skus: Optional[list[str]] = None, category: Optional[str] = None) -> List[Dict[str, Any]]:
+        table, col, lo, hi = self._range(granularity, start, end)
+        extra, params = self._filters(skus, category)
+        q = f"""
+        SELECT r.{col} AS bucket, SUM(r.units) AS units, SUM(r.revenue) AS revenue, SUM(r.sales) AS sales
+        FROM {table} r
+        JOIN products p ON p.id = r.product_id
+        WHERE r.{col} >= %s AND r.{col} < %s{extra}
+        GROUP BY r.{col}
+        ORDER BY r.{col}
+        """
+        return await self.db.execute_query(q, [lo, hi, *params]) or []
+
+    async def top_sellers(self, start: date, end: date, by: str = "revenue", limit: int = 10,
+                          category: Optional[str] = None) -> List[Dict[str, Any]]:
+        _, _, lo, hi = self._range("day", start, end)
+        extra, params = self._filters(None, category)
+        order = "revenue" if by == "revenue" else "units"
+        q = f"""
+        SELECT p.sku, p.name, p.variety, SUM(r.units) AS units, SUM(r.revenue) AS revenue, SUM(r.sales) AS sales
+        FROM sales_daily r
+        JOIN products p ON p.id = r.product_id
+        WHERE r.day >= %s AND r.day < %s{extra}
+        GROUP BY p.sku, p.name, p.variety
+        ORDER BY {order} DESC, p.sku
+        LIMIT %s
+        """
+        return await self.db.execute_query(q, [lo, hi, *params, limit]) or []
@@ -0,0 +1,151 @@
+from datetime import date, datetime, timedelta, timezone
+from typing import Optional, List, Dict, Any, AsyncIterator
+
+from app.DB.repositories.cursor_repo import LedgerCursorRepository
+
+
+class ValuationRepository(LedgerCursorRepository):
+    """
+    Storage for the FIFO valuation engine: open cost layers (cost_layers) and per-sale cost of
+    goods sold (sale_cogs), advanced from the "valuation" high-water mark.
+    """
+
+    CURSOR = "valuation"
+    # Staging tables a full rebuild writes into before swap_staging()
+    STAGING = {"cost_layers": "cost_layers_rebuild", "sale_cogs": "sale_cogs_rebuild"}
+    COLUMNS = {
+        "cost_layers": "ledger_id, product_id, unit_cost, qty_in, qty_remaining, received_at",
+        "sale_cogs": "ledger_id, product_id, quantity, cogs, revenue, unmatched_qty, sold_at",
+    }
+
+    def _ledger_sql(self, upto_id: Optional[int]) -> str:
+        q = """
+        SELECT l.id, l.product_id, l.movement, l.quantity, l.unit_price, l.created_at, p.price AS list_price
+        FROM stock_ledger l
+        JOIN products p ON p.id = l.product_id
+        WHERE l.id > %s
+        """
+        if upto_id is not None:
+            q += " AND l.id <= %s"
+        return q + " ORDER BY l.id"
+
+    async def ledger_rows(self, conn, after_id: int, upto_id: int) -> List[Dict[str, Any]]:
+        return await self._exec(conn, self._ledger_sql(upto_id), (after_id, upto_id), fetch=True,
+                                label="select stock_ledger batch")
+
+    def stream_ledger(self, after_id: int = 0, upto_id: Optional[int] = None,
+                      batch_size: int = 5000) -> AsyncIterator[Dict[str, Any]]:
+        params = [after_id] if upto_id is None else [after_id, upto_id]
+        return self.db.stream_query(self._ledger_sql(upto_id), params, batch_size=batch_size)
+
+    async def open_layers(self, conn, product_ids: list[str]) -> List[Dict[str, Any]]:
+        if not product_ids:
+            return []
+        q = f"""
+        SELECT ledger_id, product_id, unit_cost, qty_in, qty_remaining, received_at
+        FROM cost_layers
+        WHERE product_id IN ({', '.join(['%s'] * len(product_ids))})
+        ORDER BY product_id, ledger_id
+        """
+        return await self._exec(conn, q, list(product_ids), fetch=True, label="select cost_layers")
+
+    async def replace_layers(self, conn, product_ids: list[str], layers: list[tuple], staging: bool = False):
+        """Swap the open layers of product_ids for `layers` (ledger_id, product_id, unit_cost, qty_in, qty_remaining, received_at)."""
+        table = self.STAGING["cost_layers"] if staging else "cost_layers"
+        if product_ids:
+            q = f"DELETE FROM {table} WHERE product_id IN ({', '.join(['%s'] * len(product_ids))})"
+            await self._exec(conn, q, list(product_ids), label=f"delete {table}")
+        await self._exec_many(conn, f"""
+            INSERT INTO {table} (ledger_id, product_id, unit_cost, qty_in, qty_remaining, received_at)
+            VALUES (%s, %s, %s, %s, %s, %s)
+            """, layers, label=f"insert {table}")
+
+    async def insert_cogs(self, conn, sales: list[tuple], staging: bool = False):
+        """Upsert (ledger_id, product_id, quantity, cogs, revenue, unmatched_qty, sold_at) rows."""
+        table = self.STAGING["sale_cogs"] if staging else "sale_cogs"
+        await self._exec_many(conn, f"""
+            INSERT INTO {table} (ledger_id, product_id, quantity, cogs, revenue, unmatched_qty, sold_at)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+            ON CONFLICT (ledger_id) DO UPDATE
+            SET cogs = EXCLUDED.cogs, revenue = EXCLUDED.revenue, unmatched_qty = EXCLUDED.unmatched_qty
+            """, sales, label=f"upsert {table}")
+
+    async def clear_staging(self, conn):
+        for staging in self.STAGING.values():
+            await self._exec(conn, f"DELETE FROM {staging}", label=f"delete {staging}")
+
+    async def swap_staging(self, conn, upto_id: int):
+        """
+        Replace cost_layers and sale_cogs with the staged rebuild, as of ledger id upto_id.
+        Products deleted while the rebuild ran are left out.
+        """
+        await self.lock_cursor(conn)
+        for table, staging in self.STAGING.items():
+            await self._exec(conn, f"DELETE FROM {table}", label=f"delete {table}")
+            await self._exec(conn, f"""
+                INSERT INTO {table} ({self.COLUMNS[table]})
+                SELECT {self.COLUMNS[table]} FROM {staging} WHERE product_id IN (SELECT id FROM products)
+                """, label=f"insert {table}")
+            await self._exec(conn, f"DELETE FROM {staging}", label=f"delete {staging}")
+        await self.set_cursor(conn, upto_id)
+
+    def _filters(self, skus: Optional[list[str]], category: Optional[str]):
+        where, params = [], []
+        if skus:
+            where.append(f"p.sku IN ({', '.join(['%s'] * len(skus))})")
+            params.extend(skus)
+        if category:
+            expr = "p.attributes->>'category'" if self.db.is_postgres() else "json_extract(p.attributes, '$.category')"
+            where.append(f"{expr} = %s")
+            params.append(category)
+        return "".join(f" AND {w}" for w in where), params
+
+    def _day_bounds(self, start: date, end: date):
+        lo = datetime(start.year, start.month, start.day, tzinfo=timezone.utc)
+        hi = datetime(end.year, end.month, end.day, tzinfo=timezone.utc) + timedelta(days=1)
+        if self.db.is_postgres():
+            return lo, hi
+        # SQLite stores CURRENT_TIMESTAMP text in UTC ('YYYY-MM-DD HH:MM:SS')
+        return lo.strftime("%Y-%m-%d %H:%M:%S"), hi.strftime("%Y-%m-%d %H:%M:%S")
+
+    async def stock_value(self, skus: Optional[list[str]] = None, category: Optional[str] = None) -> List[Dict[str, Any]]:
+        extra, params = self._filters(skus, category)
+        q = f"""
+        SELECT p.sku, p.name, p.variety, SUM(c.qty_remaining) AS quantity,
+               SUM(c.qty_remaining * c.unit_cost) AS value, MIN(c.received_at) AS oldest_layer_at
+        FROM cost_layers c
+        JOIN products p ON p.id = c.product_id
+        WHERE 1 = 1{extra}
+        GROUP BY p.sku, p.name, p.variety
+        ORDER BY p.sku
+        """
+        return await self.db.execute_query(q, params) or []
+
+    async def cogs_summary(self, start: date, end: date, skus: Optional[list[str]] = None,
+                           category: Optional[str] = None) -> Dict[str, Any]:
+        lo, hi = self._day_bounds(start, end)
+        extra, params = self._filters(skus, category)
+        q = f"""
+        SELECT COALESCE(SUM(s.quantity), 0) AS units, COALESCE(SUM(s.revenue), 0) AS revenue,
+               COALESCE(SUM(s.cogs), 0) AS cogs, COALESCE(SUM(s.unmatched_qty), 0) AS unmatched_units,
+               COUNT(*) AS sales
+        FROM sale_cogs s
+        JOIN products p ON p.id = s.product_id
+        WHERE s.sold_at >= %s AND s.sold_at < %s{extra}
+        """
+        rows = await self.db.execute_query(q, [lo, hi, *params])
+        return rows[0]
+
+    async def cogs_items(self, start: date, end: date, skus: Optional[list[str]] = None,
+                         category: Optional[str] = None, after_id: int = 0, limit: int = 100) -> List[Dict[str, Any]]:
+        lo, hi = self._day_bounds(start, end)
+        extra, params = self._filters(skus, category)
+        q = f"""
+        SELECT s.ledger_id, p.sku, p.variety, s.quantity, s.revenue, s.cogs, s.unmatched_qty, s.sold_at
+        FROM sale_cogs s
+        JOIN products p ON p.id = s.product_id
+        WHERE s.sold_at >= %s AND s.sold_at < %s AND s.ledger_id > %s{extra}
+        ORDER BY s.ledger_id
+        LIMIT %s
+        """
+        return await self.db.execute_query(q, [lo, hi, after_id, *params, limit]) or []
@@ -0,0 +1,180 @@
+"""
+Stock reconciliation audit.
+
+Compares, product by product, the balance derived from stock_ledger with what the catalog implies,
+and with the quantity left in the FIFO valuation's cost layers, and writes one JSON line per
+drifting product. The ledger is the source of truth. products.quantity is only a count taken at the
+product's last upsert, so the audit expects the ledger to hold that count less the units sold since
+(product_stock_marks records the ledger id at each upsert). Restocks after the upsert may be the
+same goods the count already covered, so they are not added to the expectation. Products not
+upserted since the marks were introduced are compared against their cost layers only.
+
+Products are read in id-ordered chunks against a ledger high-water mark fixed at the start, so the
+audit runs next to live traffic in bounded memory and only ever holds short locks.
+
+With --fix, products whose ledger balance is below that expectation get a corrective ADJUST row
+(source 'audit'). Ledger quantities are positive, so a ledger above it is reported but never
+adjusted down.
+
+Usage:
+    python -m app.DB.services.audit_service [--fix] [--out drift.jsonl] [--chunk-size 1000]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+import uuid
+from typing import Optional, TextIO
+
+from app.DB.Sql.db_manager import AsyncDBManager
+from app.DB.repositories.audit_repo import AuditRepository
+from app.DB.services.inventory_service import InventoryService
+
+logger = logging.getLogger(__name__)
+
+
+def _number(value) -> float:
+    return float(value or 0)
+
+
+class StockAuditor:
+    def __init__(self, db: AsyncDBManager, service: InventoryService, chunk_size: Optional[int] = None,
+                 pause_seconds: Optional[float] = None):
+        self.db = db
+        self.service = service
+        self.repo = AuditRepository(db)
+        self.chunk_size = chunk_size or int(os.getenv("AUDIT_CHUNK_SIZE", "1000"))
+        # Breather between chunks so a large audit does not crowd out request traffic
+        self.pause_seconds = pause_seconds if pause_seconds is not None else float(
+            os.getenv("AUDIT_PAUSE_SECONDS", "0.05"))
+
+    async def scan(self, upto_id: int):
+        """Yield (products scanned, drift records) per chunk, in product id order."""
+        after = None
+        while True:
+            rows = await self.repo.balances_chunk(after, self.chunk_size, upto_id)
+            if not rows:
+                return
+            after = str(rows[-1]["product_id"])
+            yield len(rows), [d for d in (self._drift(r) for r in rows) if d]
+            if len(rows) < self.chunk_size:
+                return
+            await asyncio.sleep(self.pause_seconds)
+
+    @staticmethod
+    def _drift(row: dict) -> Optional[dict]:
+        stored, ledger = _number(row["stored"]), _number(row["ledger"])
+        # Without a mark there is no count to hold the ledger to
+        expected = stored - _number(row["sold_since_mark"]) if row["mark_id"] is not None else None
+        issues = []
+        if ledger < 0:
+            issues.append("negative_ledger")
+        if expected is not None and ledger < expected:
+            issues.append("ledger_below_expected")
+        elif expected is not None and ledger > expected:
+            issues.append("ledger_above_expected")
+        layered = _number(row["layered"])
+        at_valuation = _number(row["ledger_at_valuation"])
+        # Open FIFO layers should add up to the (non-negative) balance the valuation engine has reached
+        if row["valuation_id"] and layered != max(at_valuation, 0):
+            issues.append("valuation_layers")
+        if not issues:
+            return None
+        return {
+            "product_id": str(row["product_id"]),
+            "sku": row["sku"],
+            "variety": row["variety"],
+            "stored": stored,
+            "expected": expected,
+            "ledger": ledger,
+            "drift": round(expected - ledger, 2) if expected is not None else None,
+            "layered": layered,
+            "ledger_at_valuation": at_valuation,
+            "issues": issues,
+        }
+
+    async def _adjust(self, drifts: list[dict], run_id: str) -> dict[str, int]:
+        """
+        Top the ledger up to the expected quantity for the given products in one short transaction.
+        Balances and expectations are re-read under lock, so sales since the scan are taken into
+        account; products without a mark are never topped up.
+        """
+        ids = [d["product_id"] for d in drifts]
+        adjusted = {}
+        async with self.db.transaction() as conn:
+            live = await self.service.repo.select_many_stocks_for_update(ids, conn)
+            expected = await self.repo.expected_quantities(ids, conn)
+            for pid in ids:
+                if pid not in expected:
+                    continue
+                gap = int(expected[pid] - live.get(pid, 0))
+                if gap > 0:
+                    await self.service.repo.insert_ledger(pid, "ADJUST", gap, None, "audit", run_id,
+                                                          "reconcile ledger to products.quantity less sales", conn=conn)
+                    adjusted[pid] = gap
+        if adjusted:
+            self.service.notify_ledger_committed()
+        return adjusted
+
+    async def run(self, fix: bool = False, out: Optional[TextIO] = None) -> dict:
+        """Audit every product, writing drift records as JSON lines to `out`; returns a summary."""
+        started = time.perf_counter()
+        run_id = f"audit-{uuid.uuid4().hex[:12]}"
+        # Rows committed after this mark belong to the next audit
+        upto_id = await self.repo.max_ledger_id()
+        summary = {"run_id": run_id, "ledger_id": upto_id, "products": 0, "drifting": 0, "issues": {}, "adjusted_products": 0, "adjusted_units": 0, "unresolved": 0}
+        async for scanned, drifts in self.scan(upto_id):
+            summary["products"] += scanned
+            summary["drifting"] += len(drifts)
+            adjusted = {}
+            if fix:
+                short = [d for d in drifts if "ledger_below_expected" in d["issues"]]
+                if short:
+                    adjusted = await self._adjust(short, run_id)
+            for d in drifts:
+                for issue in d["issues"]:
+                    summary["issues"][issue] = summary["issues"].get(issue, 0) + 1
+                d["adjusted"] = adjusted.get(d["product_id"], 0)
+                if not (d["issues"] == ["ledger_below_expected"] and d["adjusted"] >= d["drift"]):
+                    summary["unresolved"] += 1
+                if out is not None:
+                    out.write(json.dumps(d) + "\n")
+            summary["adjusted_products"] += len(adjusted)
+            summary["adjusted_units"] += sum(adjusted.values())
+        summary["seconds"] = round(time.perf_counter() - started, 3)
+        return summary
+
+
+async def _main(args):
+    db = AsyncDBManager()
+    await db.open()
+    try:
+        auditor = StockAuditor(db, InventoryService(db), chunk_size=args.chunk_size)
+        if args.out:
+            with open(args.out, "w", encoding="utf-8") as out:
+                summary = await auditor.run(fix=args.fix, out=out)
+        else:
+            summary = await auditor.run(fix=args.fix, out=sys.stdout)
+    finally:
+        await db.close()
+    print(json.dumps(summary), file=sys.stderr)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--fix", action="store_true", help="write ADJUST rows where the ledger is short")
+    parser.add_argument("--out", help="drift report path (JSON lines); default stdout")
+    parser.add_argument("--chunk-size", type=int, default=None)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+    summary = asyncio.run(_main(args))
+    # Non-zero exit when drift remains, so the audit can gate a cron job or CI step
+    sys.exit(1 if summary["unresolved"] else 0)
+
+
+if __name__ == "__main__":
+    main()
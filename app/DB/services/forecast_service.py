@@ -0,0 +1,226 @@
+import asyncio
+import logging
+import os
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import Optional
+
+from app.DB.Sql.db_manager import AsyncDBManager
+from app.DB.repositories.forecast_repo import ForecastRepository
+from app.DB.services.rollup_service import SalesRollups, as_date
+
+logger = logging.getLogger(__name__)
+
+# Syntetos-Boylan cut-off: average inter-demand interval above this counts as intermittent demand
+INTERMITTENT_ADI = 1.32
+METHODS = ("none", "ses", "croston")
+
+
+class SmoothingState:
+    """
+    Per-product smoothing state as parallel NumPy arrays, so every product advances one day per
+    vectorised step. SES keeps a level; Croston keeps the smoothed demand size, the smoothed
+    interval between demands and the days since the last demand.
+    """
+
+    FIELDS = ("level", "size", "interval", "since", "nonzero", "observed")
+
+    def __init__(self, n: int):
+        import numpy as np
+
+        for name in self.FIELDS:
+            setattr(self, name, np.zeros(n))
+
+    def advance(self, demand, alpha: float, beta: float):
+        """Fold a (products x days) matrix of daily units into the state, oldest day first."""
+        import numpy as np
+
+        for t in range(demand.shape[1]):
+            y = demand[:, t]
+            self.level = np.where(self.observed == 0, y, self.level + alpha * (y - self.level))
+            self.observed += 1
+            self.since += 1
+            hit = y > 0
+            first = hit & (self.nonzero == 0)
+            again = hit & ~first
+            self.size = np.where(first, y, np.where(again, self.size + beta * (y - self.size), self.size))
+            self.interval = np.where(first, self.since,
+                                     np.where(again, self.interval + beta * (self.since - self.interval),
+                                              self.interval))
+            self.nonzero += hit
+            self.since = np.where(hit, 0, self.since)
+
+    def forecast(self, beta: float):
+        """(method codes into METHODS, forecast units per day) for every product."""
+        import numpy as np
+
+        seen = self.nonzero > 0
+        with np.errstate(divide="ignore", invalid="ignore"):
+            adi = np.where(seen, self.observed / self.nonzero, np.inf)
+            # Croston with the Syntetos-Boylan bias correction
+            croston = np.where(seen & (self.interval > 0), self.size / self.interval * (1 - beta / 2), 0.0)
+        use_croston = seen & (adi > INTERMITTENT_ADI)
+        rate = np.where(use_croston, croston, np.maximum(self.level, 0.0))
+        method = np.where(~seen, 0, np.where(use_croston, 2, 1))
+        return method, np.where(seen, rate, 0.0)
+
+
+class DemandForecaster:
+    """
+    Next-week demand forecasts for every product from the sales_daily rollup.
+
+    Products seen for the first time are fitted over the last history_days complete days; after
+    that each refresh only folds in the days since the stored through_day, so the nightly run
+    reads one day of rollups per product. SES is used for regular demand and Croston's method
+    for intermittent demand.
+    """
+
+    def __init__(self, db: AsyncDBManager, rollups: SalesRollups, history_days: Optional[int] = None,
+                 alpha: Optional[float] = None, beta: Optional[float] = None, horizon_days: int = 7,
+                 refresh_hour: Optional[int] = None):
+        self.db = db
+        self.rollups = rollups
+        self.repo = ForecastRepository(db)
+        self.history_days = history_days or int(os.getenv("FORECAST_HISTORY_DAYS", "90"))
+        self.alpha = alpha or float(os.getenv("FORECAST_SES_ALPHA", "0.2"))
+        self.beta = beta or float(os.getenv("FORECAST_CROSTON_ALPHA", "0.1"))
+        self.horizon_days = horizon_days
+        # UTC hour of the nightly refresh
+        self.refresh_hour = refresh_hour if refresh_hour is not None else int(os.getenv("FORECAST_REFRESH_HOUR", "2"))
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self.last_refresh: Optional[dict] = None
+
+    async def start(self):
+        self._stopping = False
+        self._task = asyncio.create_task(self._run(), name="demand-forecaster")
+
+    async def stop(self):
+        if self._task:
+            self._stopping = True
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                # Also catches up at startup if last night's run was missed
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Demand forecast refresh failed")
+            now = datetime.now(timezone.utc)
+            next_run = now.replace(hour=self.refresh_hour, minute=0, second=0, microsecond=0)
+            if next_run <= now:
+                next_run += timedelta(days=1)
+            await asyncio.sleep((next_run - now).total_seconds())
+
+    async def refresh(self, today: Optional[date] = None) -> dict:
+        """Bring every active product's forecast up to yesterday (UTC); returns a summary."""
+        import numpy as np
+
+        async with self._lock:
+            started = time.perf_counter()
+            today = today or datetime.now(timezone.utc).date()
+            through = today - timedelta(days=1)
+            products = await self.repo.active_products()
+            product_ids = [str(p["id"]) for p in products]
+            stored = {str(r["product_id"]): r for r in await self.repo.load_states()}
+            fresh_start = through - timedelta(days=self.history_days - 1)
+            # Offsets are relative to fresh_start. New products are fitted from their creation day so
+            # the days before they were listed do not count as zero demand; a product stored further
+            # back than the history window is simply refitted over the window
+            resume = np.array([
+                (as_date(stored[pid]["through_day"]) + timedelta(days=1) - fresh_start).days
+                if pid in stored else (as_date(p["created_at"]) - fresh_start).days
+                for pid, p in zip(product_ids, products)
+            ], dtype=int)
+            resume = np.clip(resume, 0, self.history_days)
+            is_new = np.array([pid not in stored for pid in product_ids], dtype=bool)
+            pending = (resume < self.history_days) | is_new
+            if not pending.any():
+                return self._summary(len(product_ids), 0, started, through)
+
+            await self.rollups.catch_up()
+            first_day = fresh_start + timedelta(days=int(resume[pending].min()))
+            index = {pid: i for i, pid in enumerate(product_ids)}
+            demand = np.zeros((len(product_ids), self.history_days))
+            rows, cols, units = [], [], []
+            # At most history_days distinct days, so parse each once rather than once per row
+            day_cols = {}
+            for r in await self.rollups.repo.daily_units(first_day, today):
+                i = index.get(str(r["product_id"]))
+                if i is not None:
+                    day = r["day"]
+                    col = day_cols.get(day)
+                    if col is None:
+                        col = day_cols[day] = (as_date(day) - fresh_start).days
+                    rows.append(i)
+                    cols.append(col)
+                    units.append(float(r["units"]))
+            if rows:
+                demand[np.array(rows), np.array(cols)] = np.array(units)
+
+            state = SmoothingState(len(product_ids))
+            for i, pid in enumerate(product_ids):
+                s = stored.get(pid)
+                if s is not None and resume[i] > 0:
+                    state.level[i], state.size[i], state.interval[i] = s["level"], s["size"], s["interval_days"]
+                    state.since[i], state.nonzero[i], state.observed[i] = (s["since_demand"], s["nonzero_days"],
+                                                                           s["observed_days"])
+            # One vectorised pass per distinct resume day (normally two: new products and everyone else)
+            for offset in np.unique(resume[pending]):
+                group = np.flatnonzero(resume == offset)
+                sub = SmoothingState(len(group))
+                for name in SmoothingState.FIELDS:
+                    setattr(sub, name, getattr(state, name)[group])
+                sub.advance(demand[group, offset:], self.alpha, self.beta)
+                for name in SmoothingState.FIELDS:
+                    getattr(state, name)[group] = getattr(sub, name)
+
+            method, rate = state.forecast(self.beta)
+            through_value = through if self.db.is_postgres() else through.isoformat()
+            records = [(
+                product_ids[i],
+                METHODS[int(method[i])],
+                round(float(rate[i]), 4),
+                round(float(rate[i]) * self.horizon_days, 2),
+                float(state.level[i]),
+                float(state.size[i]),
+                float(state.interval[i]),
+                int(state.since[i]),
+                int(state.nonzero[i]),
+                int(state.observed[i]),
+                through_value,
+            ) for i in range(len(product_ids))]
+            await self.repo.replace_all(records)
+            return self._summary(len(product_ids), int(pending.sum()), started, through)
+
+    def _summary(self, products: int, updated: int, started: float, through: date) -> dict:
+        self.last_refresh = {
+            "products": products,
+            "updated": updated,
+            "through_day": through.isoformat(),
+            "seconds": round(time.perf_counter() - started, 3),
+            "finished_at": time.time(),
+        }
+        return self.last_refresh
+
+    async def forecasts(self, skus: Optional[list[str]] = None, category: Optional[str] = None,
+                        method: Optional[str] = None, limit: int = 100) -> dict:
+        rows = await self.repo.list_forecasts(skus, category, method, limit)
+        items = [{
+            "sku": r["sku"],
+            "name": r["name"],
+            "variety": r["variety"],
+            "method": r["method"],
+            "daily_rate": r["daily_rate"],
+            "next_week": r["next_week"],
+            "demand_days": int(r["nonzero_days"]),
+            "observed_days": int(r["observed_days"]),
+            "through_day": str(r["through_day"]),
+        } for r in rows]
+        return {"count": len(items), "horizon_days": self.horizon_days, "items": items}
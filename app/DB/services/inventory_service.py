@@ -1,19 +1,38 @@
-﻿from typing import Optional
+﻿import logging
+from typing import Optional
 
 from app.DB.Sql.db_manager import AsyncDBManager
 from app.DB.repositories.inventory_repo import InventoryRepository
+from app.DB.repositories.export_repo import ExportRepository
 
 
 # from DB.Sql.db_manager import AsyncDBManager
 # from DB.repositories.inventory_repo import InventoryRepository
 
+logger = logging.getLogger(__name__)
+
+
 class InventoryService:
     def __init__(self, db: AsyncDBManager):
         self.db = db
         self.repo = InventoryRepository(db)
-
-    async def ingest_product(self, sku: str, name: str, variety: Optional[str], price: float, attributes: dict | None):
-        return await self.repo.upsert_product(sku, name, variety, price, attributes or {}, True)
+        self.exports = ExportRepository(db)
+        self.ledger_listeners: list = []
+
+    def add_ledger_listener(self, callback):
+        """Register a zero-argument callable run after ledger rows are committed (e.g. to wake stock feeds)."""
+        self.ledger_listeners.append(callback)
+
+    def notify_ledger_committed(self):
+        for callback in self.ledger_listeners:
+            try:
+                callback()
+            except Exception:
+                logger.exception("Ledger listener failed")
+
+    async def ingest_product(self, sku: str, name: str, variety: Optional[str], price: float, quantity: float,
+                             attributes: dict | None):
+        return await self.repo.upsert_product(sku, name, variety, price, quantity, attributes or {}, True)
     
     async def upsert_products_batch(self, items: list[dict]) -> list[dict]:
         # All-or-nothing for Postgres in one statement; SQLite uses one txn with per-row upserts
@@ -29,6 +48,7 @@ class InventoryService:
             raise ValueError("Product not found; create it before restocking")
         # Append IN movement
         await self.repo.insert_ledger(product_id, "IN", quantity, unit_price, source, ref_id, notes)
+        self.notify_ledger_committed()
 
     async def sell_out(self, sku: str, variety: Optional[str], quantity: int,
                        sale_price: Optional[float], ref_id: Optional[str] = None, notes: Optional[str] = None):
@@ -43,43 +63,66 @@ class InventoryService:
                 raise ValueError(f"Insufficient stock. Available={current_qty}, requested={quantity}")
             # Append OUT movement
             await self.repo.insert_ledger(product_id, "OUT", quantity, sale_price, "sale", ref_id, notes, conn=conn)
+        self.notify_ledger_committed()
 
-    async def batch_restock_in(self, supplier: str | None, batch_ref_id: str | None, notes: str | None, items: list[dict]):
+    async def batch_restock_in(self, supplier: str | None, batch_ref_id: str | None, notes: str | None, items: list[dict],
+                               conn=None):
         # items: list of RestockIN-like dicts
-        # Single transaction for atomic batch posting
-        async with self.db.transaction() as conn:
-            # Resolve product ids
-            ids = await self.repo.resolve_many_product_ids(items)
-            # Insert ledger rows
-            for it in items:
-                pid = ids[(it["sku"], it.get("variety"))]
-                ref = it.get("ref_id") or batch_ref_id
-                note_line = it.get("notes") or notes
-                await self.repo.insert_ledger(
-                    product_id=pid,
-                    movement="IN",
-                    quantity=int(it["quantity"]),
-                    unit_price=it.get("unit_price"),
-                    source=supplier or "supplier",
-                    ref_id=ref,
-                    notes=note_line,
-                    conn=conn,
-                )
-
-    async def sell_order(self, order_id: str, channel: str | None, notes: str | None, items: list[dict]):
+        # Single transaction for atomic batch posting; callers may pass their own (e.g. ingest jobs)
+        if conn is None:
+            async with self.db.transaction() as conn:
+                await self.batch_restock_in(supplier, batch_ref_id, notes, items, conn=conn)
+            self.notify_ledger_committed()
+            return
+        # Resolve product ids
+        ids = await self.repo.resolve_many_product_ids(items)
+        # Insert ledger rows
+        for it in items:
+            pid = ids[(it["sku"], it.get("variety"))]
+            ref = it.get("ref_id") or batch_ref_id
+            note_line = it.get("notes") or notes
+            await self.repo.insert_ledger(
+                product_id=pid,
+                movement="IN",
+                quantity=int(it["quantity"]),
+                unit_price=it.get("unit_price"),
+                source=supplier or "supplier",
+                ref_id=ref,
+                notes=note_line,
+                conn=conn,
+            )
+
+    async def sell_order(self, order_id: str, channel: str | None, notes: str | None, items: list[dict],
+                         expected_versions: Optional[dict[str, int]] = None):
         # items: list of OrderItem-like dicts
+        # expected_versions: {sku: stock_version} as quoted by product_cards; the order is refused if
+        # any of those products has moved since
         async with self.db.transaction() as conn:
             # 1) Resolve product ids
             ids = await self.repo.resolve_many_product_ids(items)
             product_ids = [ids[(it["sku"], it.get("variety"))] for it in items]
             # 2) Lock and read stocks for all products
             stocks = await self.repo.select_many_stocks_for_update(product_ids, conn)
+            if expected_versions:
+                by_sku = {it["sku"]: ids[(it["sku"], it.get("variety"))] for it in items}
+                current = await self.repo.select_stock_versions(list(dict.fromkeys(product_ids)), conn)
+                stale = [
+                    {"sku": sku, "expected": int(version), "current": current[by_sku[sku]],
+                     "available": stocks.get(by_sku[sku], 0)}
+                    for sku, version in expected_versions.items()
+                    if sku in by_sku and current[by_sku[sku]] != int(version)
+                ]
+                if stale:
+                    raise ValueError({"order_id": order_id, "stale": stale})
             # 3) Validate availability per line
             shortages = []
+            # Lines for the same product draw on one balance
+            remaining = dict(stocks)
             for it in items:
                 pid = ids[(it["sku"], it.get("variety"))]
                 req = int(it["quantity"])
-                have = stocks.get(pid, 0)
+                have = remaining.get(pid, 0)
+                remaining[pid] = have - req
                 if have < req:
                     shortages.append({
                         "sku": it["sku"],
@@ -102,6 +145,7 @@ class InventoryService:
                     notes=notes,
                     conn=conn,
                 )
+        self.notify_ledger_committed()
 
     async def get_price(self, sku: str, variety: Optional[str]):
         return await self.repo.get_price(sku, variety)
@@ -109,6 +153,15 @@ class InventoryService:
     async def get_stock(self, sku: str, variety: Optional[str]):
         return await self.repo.get_stock(sku, variety)
 
+    async def catalog_index(self) -> list[dict]:
+        return await self.repo.catalog_index()
+
+    async def catalog_version(self) -> str:
+        return await self.repo.catalog_version()
+
+    async def product_cards(self, skus: list[str]) -> dict[str, dict]:
+        return await self.repo.product_cards(skus)
+
     async def product_card(self, sku: str, variety: Optional[str]):
         return await self.repo.product_card(sku, variety)
 
@@ -118,3 +171,10 @@ class InventoryService:
     async def search(self, query: str, variety: Optional[str]):
         return await self.repo.search(query, variety)
 
+    def export_products(self, skus: Optional[list[str]] = None, category: Optional[str] = None,
+                        updated_since=None, updated_until=None, active_only: bool = False):
+        return self.exports.stream_products(skus, category, updated_since, updated_until, active_only)
+
+    def export_ledger(self, skus: Optional[list[str]] = None, movement: Optional[str] = None,
+                      since=None, until=None, after_id: Optional[int] = None):
+        return self.exports.stream_ledger(skus, movement, since, until, after_id)
@@ -0,0 +1,163 @@
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from typing import Optional
+
+from app.DB.Sql.db_manager import AsyncDBManager
+from app.DB.repositories.job_repo import JobRepository
+from app.DB.services.inventory_service import InventoryService
+
+logger = logging.getLogger(__name__)
+
+# Keep the error list on the job row bounded for very dirty uploads
+MAX_JOB_ERRORS = 100
+
+
+class JobLeaseLost(RuntimeError):
+    """Another runner took the job over (our lease expired); the current chunk was rolled back."""
+
+
+class IngestJobRunner:
+    """
+    In-process runner for large uploads. Jobs are persisted in the ingest_jobs table and
+    drained by a fixed number of worker tasks, one chunk per transaction. Each chunk's rows
+    and the job's progress commit together, so a restarted process resumes every queued or
+    interrupted job from its last committed chunk.
+
+    Several API workers may run a runner against the same database. A job is processed only
+    by the runner that claimed it; every committed chunk renews that claim, and a job whose
+    owner stopped renewing for INGEST_JOB_LEASE_SECONDS is picked up by another runner.
+    """
+
+    def __init__(self, db: AsyncDBManager, service: InventoryService,
+                 concurrency: Optional[int] = None, chunk_size: Optional[int] = None):
+        self.db = db
+        self.service = service
+        self.repo = JobRepository(db)
+        self.concurrency = concurrency or int(os.getenv("INGEST_JOB_CONCURRENCY", "2"))
+        self.chunk_size = chunk_size or int(os.getenv("INGEST_JOB_CHUNK_SIZE", "500"))
+        # Must comfortably exceed the time one chunk takes
+        self.lease_seconds = float(os.getenv("INGEST_JOB_LEASE_SECONDS", "60"))
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.queue: asyncio.Queue[str] = asyncio.Queue()
+        self.workers: list[asyncio.Task] = []
+        # Job ids waiting in or taken from the local queue, so rescans do not queue them twice
+        self.pending: set[str] = set()
+        self.handlers = {
+            "products_upsert": self._upsert_products_chunk,
+            "restock": self._restock_chunk,
+        }
+
+    async def start(self):
+        for i in range(self.concurrency):
+            self.workers.append(asyncio.create_task(self._worker(), name=f"ingest-worker-{i}"))
+        await self._enqueue_resumable()
+        self.workers.append(asyncio.create_task(self._watch(), name="ingest-lease-watch"))
+
+    async def _enqueue_resumable(self):
+        resumable = [j for j in await self.repo.list_resumable_jobs(self.lease_seconds) if j not in self.pending]
+        for job_id in resumable:
+            self._enqueue(job_id)
+        if resumable:
+            logger.info(f"Resuming {len(resumable)} ingest job(s)")
+
+    async def _watch(self):
+        # Jobs of runners that died after we started (or before their lease ran out) are only
+        # claimable once the lease expires, so look again periodically
+        while True:
+            await asyncio.sleep(self.lease_seconds / 2)
+            try:
+                await self._enqueue_resumable()
+            except Exception:
+                logger.exception("Ingest job rescan failed")
+
+    def _enqueue(self, job_id: str):
+        self.pending.add(job_id)
+        self.queue.put_nowait(job_id)
+
+    async def stop(self):
+        for task in self.workers:
+            task.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers.clear()
+
+    async def submit(self, kind: str, items: list[dict], options: Optional[dict] = None) -> str:
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        job_id = await self.repo.create_job(kind, items, options, self.chunk_size)
+        self._enqueue(job_id)
+        return job_id
+
+    async def get_status(self, job_id: str) -> Optional[dict]:
+        return await self.repo.get_job(job_id)
+
+    async def _worker(self):
+        while True:
+            job_id = await self.queue.get()
+            try:
+                await self._run(job_id)
+            except asyncio.CancelledError:
+                raise
+            except JobLeaseLost:
+                logger.warning(f"Ingest job {job_id} was taken over by another runner")
+            except Exception as e:
+                logger.exception(f"Ingest job {job_id} failed")
+                await self.repo.finish_job(job_id, "failed", [{"error": str(e)}], owner=self.owner)
+            finally:
+                self.pending.discard(job_id)
+                self.queue.task_done()
+
+    async def _run(self, job_id: str):
+        if not await self.repo.claim_job(job_id, self.owner, self.lease_seconds):
+            # Finished, or held by a runner that is still renewing its lease
+            return
+        # Read after claiming, so committed_chunks includes a previous owner's last chunk
+        job = await self.repo.get_job(job_id, include_payload=True)
+        handler = self.handlers.get(job["kind"])
+        if handler is None:
+            await self.repo.finish_job(job_id, "failed", [{"error": f"Unknown job kind: {job['kind']}"}],
+                                       owner=self.owner)
+            return
+
+        items = job["payload"]
+        size = job["chunk_size"]
+        errors = list(job["errors"])
+        n_chunks = (len(items) + size - 1) // size
+
+        for idx in range(job["committed_chunks"], n_chunks):
+            chunk = items[idx * size:(idx + 1) * size]
+            try:
+                async with self.db.transaction() as conn:
+                    await handler(chunk, job["options"], conn)
+                    if not await self.repo.commit_chunk(job_id, self.owner, idx, len(chunk), 0, errors, conn):
+                        raise JobLeaseLost(job_id)
+                if job["kind"] == "restock":
+                    self.service.notify_ledger_committed()
+            except JobLeaseLost:
+                raise
+            except Exception as e:
+                # The chunk rolled back as a unit; record it and move on to the next one
+                if len(errors) < MAX_JOB_ERRORS:
+                    errors.append({
+                        "chunk": idx,
+                        "first_row": idx * size,
+                        "last_row": idx * size + len(chunk) - 1,
+                        "error": str(e),
+                    })
+                async with self.db.transaction() as conn:
+                    if not await self.repo.commit_chunk(job_id, self.owner, idx, 0, len(chunk), errors, conn):
+                        raise JobLeaseLost(job_id)
+            # Let request handlers in between chunks
+            await asyncio.sleep(0)
+
+        await self.repo.finish_job(job_id, "completed", owner=self.owner)
+
+    async def _upsert_products_chunk(self, chunk: list[dict], options: dict, conn):
+        await self.service.repo.upsert_products_batch(chunk, conn=conn)
+
+    async def _restock_chunk(self, chunk: list[dict], options: dict, conn):
+        await self.service.batch_restock_in(
+            options.get("supplier"), options.get("ref_id"), options.get("notes"), chunk, conn=conn
+        )
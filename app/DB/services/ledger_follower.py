@@ -0,0 +1,82 @@
+import asyncio
+import logging
+import os
+from typing import Optional
+
+from app.DB.Sql.db_manager import AsyncDBManager
+from app.DB.repositories.cursor_repo import LedgerCursorRepository
+from app.DB.services.inventory_service import InventoryService
+
+logger = logging.getLogger(__name__)
+
+
+class LedgerFollower:
+    """
+    Keeps a ledger-derived table current. Catch-up runs in the background after every ledger
+    commit notification (and every poll_interval seconds for writes from other processes), and
+    callers run it once more before reading, so a read only folds in the rows posted since the
+    last pass. `env_prefix` names the BATCH_SIZE / POLL_SECONDS / SETTLE_SECONDS settings.
+    """
+
+    def __init__(self, db: AsyncDBManager, service: InventoryService, repo: LedgerCursorRepository,
+                 env_prefix: str, batch_size: Optional[int] = None, poll_interval: Optional[float] = None,
+                 settle_seconds: Optional[float] = None):
+        self.db = db
+        self.repo = repo
+        self.batch_size = batch_size or int(os.getenv(f"{env_prefix}_BATCH_SIZE", "5000"))
+        self.poll_interval = poll_interval or float(os.getenv(f"{env_prefix}_POLL_SECONDS", "30"))
+        self.settle_seconds = settle_seconds if settle_seconds is not None else float(
+            os.getenv(f"{env_prefix}_SETTLE_SECONDS", "2"))
+        self._lock = asyncio.Lock()
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        service.add_ledger_listener(self._wake.set)
+
+    async def start(self):
+        self._stopping = False
+        self._task = asyncio.create_task(self._run(), name=f"{self.repo.CURSOR}-follower")
+
+    async def stop(self):
+        if self._task:
+            # wait_for() can swallow a cancel that races the wake-up, so the loop also checks a flag
+            self._stopping = True
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def catch_up(self) -> int:
+        """Apply all pending ledger rows; returns the new high-water mark."""
+        async with self._lock:
+            last_id, max_id = await self.repo.get_cursor()
+            if max_id <= last_id:
+                # Nothing new: skip the write transaction entirely
+                return last_id
+            while True:
+                async with self.db.transaction() as conn:
+                    after = await self.repo.lock_cursor(conn)
+                    upto = await self.repo.next_upto(conn, after, self.batch_size, self.settle_seconds)
+                    if upto > after:
+                        await self.apply(conn, after, upto)
+                        await self.repo.set_cursor(conn, upto)
+                if upto == after:
+                    return upto
+                # Backfills run in batches; let requests through in between
+                await asyncio.sleep(0)
+
+    async def apply(self, conn, after_id: int, upto_id: int):
+        await self.repo.apply(conn, after_id, upto_id)
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await self.catch_up()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception(f"{self.repo.CURSOR} catch-up failed; retrying")
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
@@ -0,0 +1,179 @@
+import asyncio
+import logging
+import math
+import os
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import Optional
+
+from app.DB.Sql.db_manager import AsyncDBManager
+from app.DB.repositories.reorder_repo import ReorderRepository
+from app.DB.services.rollup_service import SalesRollups, as_date
+
+logger = logging.getLogger(__name__)
+
+
+def compute_reorder_points(demand, history_days, on_hand, lead_time_days: float, service_z: float,
+                           cover_days: float) -> dict:
+    """
+    Reorder metrics for every product at once.
+
+    demand is a (products x days) matrix of units sold per day, oldest day first; only the last
+    history_days[i] columns count for product i, so new products are not diluted by days before
+    they existed. Reorder point = mean demand over the lead time + z * std * sqrt(lead time);
+    a product needs reordering when on hand <= reorder point, and the suggested quantity tops it
+    up to the reorder point plus cover_days of average demand.
+    """
+    import numpy as np
+
+    n_days = demand.shape[1]
+    n = np.clip(history_days, 1, n_days).astype(float)
+    mask = np.arange(n_days)[None, :] >= (n_days - n)[:, None]
+    observed = np.where(mask, demand, 0.0)
+    mean = observed.sum(axis=1) / n
+    dev = np.where(mask, demand - mean[:, None], 0.0)
+    std = np.sqrt((dev ** 2).sum(axis=1) / np.maximum(n - 1, 1))
+
+    safety = service_z * std * math.sqrt(lead_time_days)
+    reorder_point = mean * lead_time_days + safety
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cover = np.where(mean > 0, on_hand / mean, np.nan)
+    needs = (mean > 0) & (on_hand <= reorder_point)
+    suggested = np.where(needs, np.ceil(np.maximum(reorder_point + mean * cover_days - on_hand, 0)), 0)
+    return {
+        "mean": mean,
+        "std": std,
+        "safety": safety,
+        "reorder_point": reorder_point,
+        "cover": cover,
+        "needs": needs,
+        "suggested": suggested.astype(int),
+    }
+
+
+class ReorderPlanner:
+    """
+    Batch reorder-point computation across the whole catalog. Per-product daily units come from
+    the sales_daily rollup, so a refresh reads (products x window days) rows rather than the ledger,
+    and results are stored in reorder_suggestions for instant lookups by the API and the bot.
+    """
+
+    def __init__(self, db: AsyncDBManager, rollups: SalesRollups, window_days: Optional[int] = None,
+                 lead_time_days: Optional[float] = None, service_z: Optional[float] = None,
+                 cover_days: Optional[float] = None, refresh_interval: Optional[float] = None):
+        self.db = db
+        self.rollups = rollups
+        self.repo = ReorderRepository(db)
+        self.window_days = window_days or int(os.getenv("REORDER_WINDOW_DAYS", "56"))
+        self.lead_time_days = lead_time_days or float(os.getenv("REORDER_LEAD_TIME_DAYS", "7"))
+        # 1.65 ~ 95% cycle service level under normally distributed demand
+        self.service_z = service_z or float(os.getenv("REORDER_SERVICE_Z", "1.65"))
+        self.cover_days = cover_days or float(os.getenv("REORDER_COVER_DAYS", "14"))
+        self.refresh_interval = refresh_interval or float(os.getenv("REORDER_REFRESH_SECONDS", "3600"))
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self.last_refresh: Optional[dict] = None
+
+    async def start(self):
+        self._stopping = False
+        self._task = asyncio.create_task(self._run(), name="reorder-planner")
+
+    async def stop(self):
+        if self._task:
+            self._stopping = True
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Reorder refresh failed")
+            await asyncio.sleep(self.refresh_interval)
+
+    async def refresh(self, today: Optional[date] = None) -> dict:
+        """Recompute and store suggestions for every active product; returns a summary."""
+        import numpy as np
+
+        async with self._lock:
+            started = time.perf_counter()
+            await self.rollups.catch_up()
+            today = today or datetime.now(timezone.utc).date()
+            # Complete days only: today's partial sales would understate demand
+            start = today - timedelta(days=self.window_days)
+            positions = await self.repo.positions()
+            sales = await self.rollups.repo.daily_units(start, today)
+
+            index = {str(p["product_id"]): i for i, p in enumerate(positions)}
+            demand = np.zeros((len(positions), self.window_days))
+            rows, cols, units = [], [], []
+            for r in sales:
+                i = index.get(str(r["product_id"]))
+                if i is not None:
+                    rows.append(i)
+                    cols.append((as_date(r["day"]) - start).days)
+                    units.append(float(r["units"]))
+            if rows:
+                demand[np.array(rows), np.array(cols)] = np.array(units)
+            on_hand = np.array([float(p["on_hand"]) for p in positions])
+            history = np.array([(today - as_date(p["created_at"])).days for p in positions])
+
+            m = compute_reorder_points(demand, history, on_hand, self.lead_time_days, self.service_z,
+                                       self.cover_days)
+            window = np.clip(history, 1, self.window_days)
+            records = [(
+                positions[i]["product_id"],
+                int(on_hand[i]),
+                round(float(m["mean"][i]), 4),
+                round(float(m["std"][i]), 4),
+                None if np.isnan(m["cover"][i]) else round(float(m["cover"][i]), 2),
+                round(float(m["safety"][i]), 2),
+                round(float(m["reorder_point"][i]), 2),
+                int(m["suggested"][i]),
+                bool(m["needs"][i]) if self.db.is_postgres() else int(m["needs"][i]),
+                int(window[i]),
+                self.lead_time_days,
+            ) for i in range(len(positions))]
+            await self.repo.replace_all(records)
+
+            self.last_refresh = {
+                "products": len(positions),
+                "needs_reorder": int(m["needs"].sum()),
+                "window_days": self.window_days,
+                "seconds": round(time.perf_counter() - started, 3),
+                "finished_at": time.time(),
+            }
+            return self.last_refresh
+
+    async def suggestions(self, only_needed: bool = True, skus: Optional[list[str]] = None,
+                          category: Optional[str] = None, limit: int = 50) -> dict:
+        # Compute on first use (e.g. in the bot process, which runs no refresh loop)
+        if await self.repo.last_computed_at() is None:
+            await self.refresh()
+        rows = await self.repo.list_suggestions(only_needed, skus, category, limit)
+        items = [{
+            "sku": r["sku"],
+            "name": r["name"],
+            "variety": r["variety"],
+            "on_hand": int(r["on_hand"]),
+            "avg_daily_demand": r["avg_daily_demand"],
+            "demand_std": r["demand_std"],
+            "days_of_cover": r["days_of_cover"],
+            "safety_stock": r["safety_stock"],
+            "reorder_point": r["reorder_point"],
+            "suggested_qty": int(r["suggested_qty"]),
+            "needs_reorder": bool(r["needs_reorder"]),
+        } for r in rows]
+        computed_at = rows[0]["computed_at"] if rows else await self.repo.last_computed_at()
+        return {
+            "count": len(items),
+            "items": items,
+            "lead_time_days": self.lead_time_days,
+            "window_days": self.window_days,
+            "computed_at": str(computed_at) if computed_at is not None else None,
+        }
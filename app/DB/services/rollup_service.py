@@ -0,0 +1,66 @@
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Optional
+
+from app.DB.Sql.db_manager import AsyncDBManager
+from app.DB.repositories.rollup_repo import RollupRepository
+from app.DB.services.inventory_service import InventoryService
+from app.DB.services.ledger_follower import LedgerFollower
+
+
+def _number(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    return value if value is not None else 0
+
+
+def as_date(value) -> date:
+    # Postgres returns date/datetime objects, SQLite 'YYYY-MM-DD[ HH:MM:SS]' text
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+class SalesRollups(LedgerFollower):
+    """Keeps sales_daily / sales_hourly current with the ledger and answers analytics from them."""
+
+    def __init__(self, db: AsyncDBManager, service: InventoryService, **kwargs):
+        super().__init__(db, service, RollupRepository(db), "SALES_ROLLUP", **kwargs)
+
+    async def sales(self, start: date, end: date, granularity: str = "day",
+                    skus: Optional[list[str]] = None, category: Optional[str] = None) -> dict:
+        as_of = await self.catch_up()
+        rows = await self.repo.sales_series(start, end, granularity, skus, category)
+        series = [{
+            "bucket": str(r["bucket"]),
+            "units": int(_number(r["units"])),
+            "revenue": round(_number(r["revenue"]), 2),
+            "sales": int(_number(r["sales"])),
+        } for r in rows]
+        return {
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+            "granularity": granularity,
+            "units": sum(s["units"] for s in series),
+            "revenue": round(sum(s["revenue"] for s in series), 2),
+            "sales": sum(s["sales"] for s in series),
+            "series": series,
+            "as_of_ledger_id": as_of,
+        }
+
+    async def top_sellers(self, start: date, end: date, by: str = "revenue", limit: int = 10,
+                          category: Optional[str] = None) -> dict:
+        as_of = await self.catch_up()
+        rows = await self.repo.top_sellers(start, end, by, limit, category)
+        items = [{
+            "sku": r["sku"],
+            "name": r["name"],
+            "variety": r["variety"],
+            "units": int(_number(r["units"])),
+            "revenue": round(_number(r["revenue"]), 2),
+            "sales": int(_number(r["sales"])),
+        } for r in rows]
+        return {"start": start.isoformat(), "end": end.isoformat(), "by": by, "items": items,
+                "as_of_ledger_id": as_of}
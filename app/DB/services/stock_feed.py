@@ -0,0 +1,196 @@
+import asyncio
+import logging
+import os
+from datetime import datetime, date
+from decimal import Decimal
+from typing import Optional, AsyncIterator
+
+from app.DB.repositories.inventory_repo import InventoryRepository
+from app.DB.services.inventory_service import InventoryService
+
+logger = logging.getLogger(__name__)
+
+SIGN = {"IN": 1, "OUT": -1, "ADJUST": 1}
+
+
+class FeedFull(Exception):
+    pass
+
+
+class _Subscriber:
+    __slots__ = ("skus", "category", "queue", "dropped")
+
+    def __init__(self, skus: Optional[set[str]], category: Optional[str], max_pending: int):
+        self.skus = skus
+        self.category = category
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+        self.dropped = False
+
+    def wants(self, event: dict) -> bool:
+        if self.skus and event["sku"] not in self.skus:
+            return False
+        if self.category and event["category"] != self.category:
+            return False
+        return True
+
+
+def _plain(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+class StockFeed:
+    """
+    Fan-out of committed stock ledger rows to long-lived subscribers (SSE clients).
+
+    One tailer task reads new ledger rows once per commit notification - or every poll_interval
+    seconds, which also picks up writes made by other worker processes - and pushes deltas into
+    per-subscriber queues filtered by SKU set or category. The cursor only passes rows older than
+    settle_seconds, so a lower id that commits after a higher one is not skipped. Subscribers resume from a ledger id:
+    rows they missed are replayed from the database before they join the live stream. A subscriber
+    that falls max_pending events behind is dropped and told to reconnect with its last id.
+    """
+
+    def __init__(self, service: InventoryService, poll_interval: Optional[float] = None,
+                 max_subscribers: Optional[int] = None, max_pending: int = 1000, batch_size: int = 500,
+                 settle_seconds: Optional[float] = None):
+        self.service = service
+        self.repo: InventoryRepository = service.repo
+        self.poll_interval = poll_interval or float(os.getenv("STOCK_FEED_POLL_SECONDS", "2"))
+        self.max_subscribers = max_subscribers or int(os.getenv("STOCK_FEED_MAX_SUBSCRIBERS", "5000"))
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self.settle_seconds = settle_seconds if settle_seconds is not None else float(
+            os.getenv("STOCK_FEED_SETTLE_SECONDS", "2"))
+        self.cursor = 0
+        self.subscribers: set[_Subscriber] = set()
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        service.add_ledger_listener(self.notify)
+
+    def notify(self):
+        self._wake.set()
+
+    async def start(self):
+        self._stopping = False
+        self.cursor = await self.repo.max_ledger_id(self.settle_seconds)
+        self._task = asyncio.create_task(self._tail(), name="stock-feed-tailer")
+
+    async def stop(self):
+        if self._task:
+            # wait_for() can swallow a cancel that races the wake-up, so the loop also checks a flag
+            self._stopping = True
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _events(self, rows: list[dict]) -> list[dict]:
+        # Balance as of the last row in the batch, then walk backwards so each event carries
+        # the product's quantity right after that movement
+        balance = await self.repo.balances(sorted({str(r["product_id"]) for r in rows}), upto_id=int(rows[-1]["id"]))
+        events = []
+        for r in reversed(rows):
+            pid = str(r["product_id"])
+            delta = SIGN.get(r["movement"], 1) * int(r["quantity"])
+            events.append({
+                "id": int(r["id"]),
+                "sku": r["sku"],
+                "variety": r["variety"],
+                "category": r["category"],
+                "movement": r["movement"],
+                "delta": delta,
+                "quantity": balance.get(pid, 0),
+                "unit_price": _plain(r["unit_price"]),
+                "ref_id": r["ref_id"],
+                "at": _plain(r["created_at"]),
+            })
+            balance[pid] = balance.get(pid, 0) - delta
+        events.reverse()
+        return events
+
+    async def _tail(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            if not self.subscribers:
+                # Nobody listening: just keep the cursor current
+                self.cursor = await self.repo.max_ledger_id(self.settle_seconds)
+                continue
+            try:
+                upto = await self.repo.max_ledger_id(self.settle_seconds)
+                while self.cursor < upto:
+                    rows = await self.repo.ledger_since(self.cursor, self.batch_size, upto_id=upto)
+                    if not rows:
+                        self.cursor = upto
+                        break
+                    events = await self._events(rows)
+                    self.cursor = events[-1]["id"]
+                    self._broadcast(events)
+                    if len(rows) < self.batch_size:
+                        break
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Stock feed tail failed; retrying")
+
+    def _broadcast(self, events: list[dict]):
+        for sub in list(self.subscribers):
+            for event in events:
+                if not sub.wants(event):
+                    continue
+                try:
+                    sub.queue.put_nowait(event)
+                except asyncio.QueueFull:
+                    # Slow consumer: cut it loose rather than buffer without bound
+                    sub.dropped = True
+                    self.subscribers.discard(sub)
+                    break
+
+    def is_full(self) -> bool:
+        return len(self.subscribers) >= self.max_subscribers
+
+    async def subscribe(self, skus: Optional[list[str]] = None, category: Optional[str] = None,
+                        last_id: Optional[int] = None, heartbeat: float = 15.0) -> AsyncIterator[Optional[dict]]:
+        """
+        Yield stock events for the given filters, starting after last_id (or from now).
+        Yields None as a heartbeat when nothing happened for `heartbeat` seconds.
+        Raises FeedFull when the subscriber limit is reached.
+        """
+        if self.is_full():
+            raise FeedFull(f"Stock feed is at its limit of {self.max_subscribers} subscribers")
+        sub = _Subscriber(set(skus) if skus else None, category, self.max_pending)
+        # Register before replaying so nothing committed during the replay is missed
+        self.subscribers.add(sub)
+        delivered = last_id if last_id is not None else self.cursor
+        try:
+            upto = self.cursor
+            while delivered < upto:
+                rows = await self.repo.ledger_since(delivered, self.batch_size, skus=skus, category=category,
+                                                    upto_id=upto)
+                if not rows:
+                    break
+                for event in await self._events(rows):
+                    delivered = event["id"]
+                    yield event
+            while True:
+                if sub.dropped:
+                    yield {"event": "resync", "last_id": delivered}
+                    return
+                try:
+                    event = await asyncio.wait_for(sub.queue.get(), timeout=heartbeat)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                if event["id"] <= delivered:
+                    continue
+                delivered = event["id"]
+                yield event
+        finally:
+            self.subscribers.discard(sub)
@@ -0,0 +1,217 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from datetime import date
+from decimal import Decimal
+from typing import Optional
+
+from app.DB.Sql.db_manager import AsyncDBManager
+from app.DB.repositories.valuation_repo import ValuationRepository
+from app.DB.services.inventory_service import InventoryService
+from app.DB.services.ledger_follower import LedgerFollower
+
+logger = logging.getLogger(__name__)
+
+
+def _number(value) -> float:
+    if isinstance(value, Decimal):
+        return float(value)
+    return float(value) if value is not None else 0.0
+
+
+class FifoBook:
+    """
+    Open FIFO cost layers per product, applied to ledger rows in id order.
+
+    IN and ADJUST rows (ADJUST quantities are positive in this ledger) open a layer at the row's
+    unit price, or at the product's newest layer cost when the row has none. OUT rows consume the
+    oldest layers first; units sold beyond the open layers are costed at the last known cost and
+    reported as unmatched.
+    """
+
+    def __init__(self):
+        # product_id -> deque of [ledger_id, unit_cost, qty_in, qty_remaining, received_at]
+        self.layers: dict[str, deque] = {}
+        self.last_cost: dict[str, float] = {}
+        self.touched: set[str] = set()
+
+    def load(self, rows: list[dict]):
+        for r in rows:
+            pid = str(r["product_id"])
+            cost = _number(r["unit_cost"])
+            self.layers.setdefault(pid, deque()).append(
+                [int(r["ledger_id"]), cost, int(r["qty_in"]), int(r["qty_remaining"]), r["received_at"]])
+            self.last_cost[pid] = cost
+
+    def apply(self, row: dict) -> Optional[tuple]:
+        """Apply one ledger row; returns a sale_cogs tuple for OUT rows."""
+        pid = str(row["product_id"])
+        qty = int(row["quantity"])
+        layers = self.layers.setdefault(pid, deque())
+        self.touched.add(pid)
+        if row["movement"] != "OUT":
+            cost = _number(row["unit_price"]) if row["unit_price"] is not None else self.last_cost.get(pid, 0.0)
+            layers.append([int(row["id"]), cost, qty, qty, row["created_at"]])
+            self.last_cost[pid] = cost
+            return None
+
+        remaining, cogs = qty, 0.0
+        while remaining and layers:
+            layer = layers[0]
+            take = min(remaining, layer[3])
+            cogs += take * layer[1]
+            layer[3] -= take
+            remaining -= take
+            if layer[3] == 0:
+                layers.popleft()
+        cogs += remaining * self.last_cost.get(pid, 0.0)
+        price = row["unit_price"] if row["unit_price"] is not None else row["list_price"]
+        return (int(row["id"]), row["product_id"], qty, round(cogs, 4), round(qty * _number(price), 2),
+                remaining, row["created_at"])
+
+    def layer_rows(self, product_ids) -> list[tuple]:
+        return [(layer[0], pid, layer[1], layer[2], layer[3], layer[4])
+                for pid in product_ids for layer in self.layers.get(pid, ())]
+
+
+class ValuationEngine(LedgerFollower):
+    """
+    FIFO inventory valuation kept current with the ledger. Each incremental batch loads only
+    the open layers of the products it touches, so stock value and per-sale COGS never need a
+    replay of history. rebuild() recomputes everything from one streaming pass over the ledger
+    without holding up readers.
+    """
+
+    def __init__(self, db: AsyncDBManager, service: InventoryService, **kwargs):
+        super().__init__(db, service, ValuationRepository(db), "VALUATION", **kwargs)
+        self.rebuilding = False
+        self.last_rebuild: Optional[dict] = None
+        self._rebuild_task: Optional[asyncio.Task] = None
+
+    async def apply(self, conn, after_id: int, upto_id: int):
+        rows = await self.repo.ledger_rows(conn, after_id, upto_id)
+        book = FifoBook()
+        book.load(await self.repo.open_layers(conn, sorted({str(r["product_id"]) for r in rows})))
+        sales = [sale for sale in map(book.apply, rows) if sale]
+        touched = sorted(book.touched)
+        await self.repo.replace_layers(conn, touched, book.layer_rows(touched))
+        await self.repo.insert_cogs(conn, sales)
+
+    async def rebuild(self, chunk_size: int = 5000) -> dict:
+        """
+        Recompute all cost layers and sale COGS from the full ledger. Rows are streamed in id
+        order into staging tables, sale_cogs every chunk_size sales, so memory stays proportional
+        to the open layers rather than the ledger. Readers keep the current valuation meanwhile;
+        the staged one is swapped in with one transaction, and catch-up then applies the rows
+        posted during the rebuild.
+        """
+        self.rebuilding = True
+        started = time.perf_counter()
+        try:
+            async with self.db.transaction() as conn:
+                await self.repo.clear_staging(conn)
+            _, upto = await self.repo.get_cursor()
+            book, pending, processed = FifoBook(), [], 0
+            async for row in self.repo.stream_ledger(0, upto, batch_size=chunk_size):
+                sale = book.apply(row)
+                processed += 1
+                if sale:
+                    pending.append(sale)
+                if len(pending) >= chunk_size:
+                    async with self.db.transaction() as conn:
+                        await self.repo.insert_cogs(conn, pending, staging=True)
+                    pending = []
+            # The lock keeps an incremental batch from landing between the swap and its cursor
+            async with self._lock:
+                async with self.db.transaction() as conn:
+                    await self.repo.insert_cogs(conn, pending, staging=True)
+                    await self.repo.replace_layers(conn, [], book.layer_rows(sorted(book.layers)), staging=True)
+                    await self.repo.swap_staging(conn, upto)
+            self.last_rebuild = {
+                "rows": processed,
+                "upto_ledger_id": upto,
+                "seconds": round(time.perf_counter() - started, 3),
+                "finished_at": time.time(),
+            }
+            logger.info(f"Valuation rebuilt from {processed} ledger rows in {self.last_rebuild['seconds']}s")
+            return self.last_rebuild
+        finally:
+            self.rebuilding = False
+
+    def start_rebuild(self) -> bool:
+        """Run rebuild() in the background; False if one is already running."""
+        if self.rebuilding:
+            return False
+        self.rebuilding = True
+        self._rebuild_task = asyncio.create_task(self.rebuild(), name="valuation-rebuild")
+        self._rebuild_task.add_done_callback(self._rebuild_done)
+        return True
+
+    def _rebuild_done(self, task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Valuation rebuild failed", exc_info=task.exception())
+            self.last_rebuild = {"error": str(task.exception()), "finished_at": time.time()}
+
+    async def stop(self):
+        if self._rebuild_task and not self._rebuild_task.done():
+            self._rebuild_task.cancel()
+            await asyncio.gather(self._rebuild_task, return_exceptions=True)
+        await super().stop()
+
+    async def status(self) -> dict:
+        last_id, max_id = await self.repo.get_cursor()
+        return {"as_of_ledger_id": last_id, "ledger_max_id": max_id, "rebuilding": self.rebuilding,
+                "last_rebuild": self.last_rebuild}
+
+    async def stock_value(self, skus: Optional[list[str]] = None, category: Optional[str] = None) -> dict:
+        as_of = await self.catch_up()
+        items = []
+        for r in await self.repo.stock_value(skus, category):
+            quantity, value = int(_number(r["quantity"])), _number(r["value"])
+            items.append({
+                "sku": r["sku"],
+                "name": r["name"],
+                "variety": r["variety"],
+                "quantity": quantity,
+                "value": round(value, 2),
+                "avg_unit_cost": round(value / quantity, 4) if quantity else None,
+                "oldest_layer_at": str(r["oldest_layer_at"]),
+            })
+        return {
+            "total_units": sum(i["quantity"] for i in items),
+            "total_value": round(sum(i["value"] for i in items), 2),
+            "items": items,
+            "as_of_ledger_id": as_of,
+        }
+
+    async def cogs(self, start: date, end: date, skus: Optional[list[str]] = None, category: Optional[str] = None,
+                   after_id: int = 0, limit: int = 100) -> dict:
+        as_of = await self.catch_up()
+        totals = await self.repo.cogs_summary(start, end, skus, category)
+        revenue, cogs = _number(totals["revenue"]), _number(totals["cogs"])
+        items = [{
+            "ledger_id": int(r["ledger_id"]),
+            "sku": r["sku"],
+            "variety": r["variety"],
+            "quantity": int(r["quantity"]),
+            "revenue": round(_number(r["revenue"]), 2),
+            "cogs": round(_number(r["cogs"]), 2),
+            "margin": round(_number(r["revenue"]) - _number(r["cogs"]), 2),
+            "unmatched_qty": int(r["unmatched_qty"]),
+            "sold_at": str(r["sold_at"]),
+        } for r in await self.repo.cogs_items(start, end, skus, category, after_id, limit)]
+        return {
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+            "units": int(_number(totals["units"])),
+            "sales": int(_number(totals["sales"])),
+            "revenue": round(revenue, 2),
+            "cogs": round(cogs, 2),
+            "gross_margin": round(revenue - cogs, 2),
+            "margin_pct": round((revenue - cogs) / revenue * 100, 2) if revenue else None,
+            "unmatched_units": int(_number(totals["unmatched_units"])),
+            "items": items,
+            "next_after_id": items[-1]["ledger_id"] if len(items) == limit else None,
+            "as_of_ledger_id": as_of,
+        }
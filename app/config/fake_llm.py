@@ -0,0 +1,119 @@
+import asyncio
+import json
+import re
+from typing import Any, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+# Catalog codes: upper-case words containing a digit (WHF001, TSHIRT-BLK-M1)
+SKU_RE = re.compile(r"\b(?=[A-Z0-9-]*\d)[A-Z][A-Z0-9-]{2,}\b")
+NUMBER_RE = re.compile(r"(?<![\w-])(\d+)(?![\w-])")
+GREETINGS = {"hi", "hello", "hey", "thanks", "thank you", "ok", "okay", "bye"}
+STOPWORDS = {"do", "you", "have", "any", "is", "there", "are", "the", "a", "an", "some", "please", "i", "want",
+             "need", "looking", "for", "find", "search", "show", "me", "of", "in", "stock", "what", "which",
+             "tell", "about", "detail", "details", "more", "can", "get"}
+
+
+def _words(text: str) -> List[str]:
+    return re.findall(r"[a-z]+", text.lower())
+
+
+def scripted_tool_call(text: str) -> Optional[tuple[str, dict]]:
+    """The tool call a customer message maps to, by keyword; None for small talk."""
+    lowered = text.lower()
+    if lowered.strip(" !.?") in GREETINGS:
+        return None
+    skus = SKU_RE.findall(text)
+    numbers = NUMBER_RE.findall(text)
+    quantity = int(numbers[0]) if numbers else 1
+    if skus:
+        sku = skus[0]
+        if "total" in lowered:
+            return "compute_order_total", {"items": [{"sku": s, "quantity": quantity} for s in skus]}
+        if any(w in lowered for w in ("buy", "order", "take")):
+            if len(skus) > 1:
+                return "sell_multiple_items", {"order_id": f"ORD-{'-'.join(skus)}",
+                                               "items": [{"sku": s, "quantity": quantity} for s in skus]}
+            return "sell_single_item", {"sku": sku, "quantity": quantity}
+        if "price" in lowered or "cost" in lowered or "how much" in lowered:
+            return "get_price", {"sku": sku}
+        if "stock" in lowered or "available" in lowered:
+            return "get_stock", {"sku": sku}
+        return "get_card", {"sku": sku}
+    if "reorder" in lowered or "restock" in lowered:
+        return "reorder_suggestions", {}
+    terms = [w for w in _words(text) if w not in STOPWORDS]
+    if "variet" in lowered:
+        return "varieties", {"name": " ".join(w for w in terms if not w.startswith("variet"))}
+    if terms:
+        return "search", {"q": " ".join(terms)}
+    return None
+
+
+def scripted_answer(results: List[ToolMessage]) -> str:
+    lines = []
+    for msg in results:
+        try:
+            result = json.loads(msg.content)
+        except ValueError:
+            lines.append(str(msg.content)[:200])
+            continue
+        if isinstance(result, dict) and isinstance(result.get("items"), list):
+            lines.append(f"I found {len(result['items'])} matching products.")
+            result = result["items"][:3]
+        for item in result if isinstance(result, list) else [result]:
+            if isinstance(item, dict):
+                lines.append(", ".join(f"{k}: {v}" for k, v in item.items() if v is not None and k != "items"))
+    return "\n".join(lines) or "Sorry, I couldn't find that."
+
+
+class ScriptedChatModel(BaseChatModel):
+    """
+    Deterministic stand-in for the chat model (LLM_PROVIDER=fake): a customer message becomes one
+    tool call chosen by keyword, tool results become a plain summary. Token usage is a chars/4
+    estimate, and latency_ms simulates the provider's response time.
+    """
+
+    latency_ms: float = 0.0
+    tool_names: tuple = ()
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def bind_tools(self, tools, **kwargs: Any):
+        names = tuple(getattr(t, "name", None) or t.__name__ for t in tools)
+        return self.model_copy(update={"tool_names": names})
+
+    def respond(self, messages: List[BaseMessage]) -> AIMessage:
+        last = messages[-1] if messages else HumanMessage(content="")
+        if isinstance(last, ToolMessage):
+            results = []
+            for msg in reversed(messages):
+                if not isinstance(msg, ToolMessage):
+                    break
+                results.insert(0, msg)
+            reply = AIMessage(content=scripted_answer(results))
+        else:
+            call = scripted_tool_call(str(last.content))
+            if call is None or (self.tool_names and call[0] not in self.tool_names):
+                reply = AIMessage(content="Hello! Ask me about any product's price, stock or varieties.")
+            else:
+                # Ids from the message count keep replays identical
+                reply = AIMessage(content="", tool_calls=[{"name": call[0], "args": call[1],
+                                                           "id": f"call_{len(messages)}"}])
+        input_tokens = sum(len(str(m.content)) for m in messages) // 4
+        output_tokens = (len(str(reply.content)) + len(json.dumps(reply.tool_calls))) // 4
+        reply.usage_metadata = {"input_tokens": input_tokens, "output_tokens": output_tokens,
+                                "total_tokens": input_tokens + output_tokens}
+        return reply
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        return ChatResult(generations=[ChatGeneration(message=self.respond(messages))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        if self.latency_ms:
+            await asyncio.sleep(self.latency_ms / 1000)
+        return ChatResult(generations=[ChatGeneration(message=self.respond(messages))])
@@ -1,13 +1,131 @@
-﻿from langchain_google_genai import ChatGoogleGenerativeAI
-from app.Agents.tools.tools import get_card,get_price,get_stock,varieties,search
+﻿import logging
+import os
+import time
+from functools import lru_cache
+from typing import Any, Dict
 
-llm = ChatGoogleGenerativeAI(model="gemini-2.5-flash")
+logger = logging.getLogger(__name__)
 
-tools = [get_price, get_stock, get_card, varieties, search]
-llm_with_tools = llm.bind_tools(tools)
+# "google": Gemini via langchain_google_genai; "fake": a scripted offline model (benchmarks, local runs)
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "google")
+LLM_MODEL = os.getenv("LLM_MODEL", "gemini-2.5-flash")
+# Simulated response time of the fake provider
+FAKE_LLM_LATENCY_MS = float(os.getenv("FAKE_LLM_LATENCY_MS", "0"))
+# "implicit": rely on Gemini's automatic prefix caching (the system prompt and tool declarations are
+# sent byte-identical first on every call); "explicit": upload them once as cached content
+LLM_CONTEXT_CACHE = os.getenv("LLM_CONTEXT_CACHE", "implicit")
+LLM_CONTEXT_CACHE_TTL_SECONDS = int(os.getenv("LLM_CONTEXT_CACHE_TTL_SECONDS", "3600"))
 
-# # Example
-response = llm_with_tools.invoke("What is the price of product TSHIRT-BLK-M?")
-print(response)
-print("Tool calls:", response.tool_calls)
 
+def _google_llm():
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    return ChatGoogleGenerativeAI(model=LLM_MODEL)
+
+
+def _fake_llm():
+    from app.config.fake_llm import ScriptedChatModel
+    return ScriptedChatModel(latency_ms=FAKE_LLM_LATENCY_MS)
+
+
+# Chat model factories by LLM_PROVIDER; each imports its client only when called
+LLM_PROVIDERS = {"google": _google_llm, "fake": _fake_llm}
+
+
+@lru_cache(maxsize=None)
+def get_llm(provider: str | None = None):
+    """Build the provider's chat model on first use; importing the Gemini client costs seconds at startup."""
+    provider = provider or LLM_PROVIDER
+    if provider not in LLM_PROVIDERS:
+        raise ValueError(f"Unknown LLM_PROVIDER {provider!r} (expected one of {', '.join(LLM_PROVIDERS)})")
+    return LLM_PROVIDERS[provider]()
+
+
+def chat_tools() -> list:
+    """Tools the chat model may call, in a fixed order so the request prefix stays cacheable."""
+    from app.Agents.tools.tools import (get_card, get_price, get_stock, varieties, search, reorder_suggestions,
+                                        compute_order_total, sell_single_item, sell_multiple_items)
+
+    return [get_price, get_stock, get_card, varieties, search, reorder_suggestions, compute_order_total,
+            sell_single_item, sell_multiple_items]
+
+
+@lru_cache(maxsize=None)
+def get_llm_with_tools(provider: str | None = None):
+    return get_llm(provider).bind_tools(chat_tools())
+
+
+def create_context_cache(system_prompt: str, ttl_seconds: int = LLM_CONTEXT_CACHE_TTL_SECONDS) -> tuple[str, float]:
+    """Upload the system prompt and tool declarations as Gemini cached content; returns (name, expiry)."""
+    from datetime import timedelta
+    import google.ai.generativelanguage_v1beta as glm
+    from langchain_google_genai._function_utils import convert_to_genai_function_declarations
+
+    api_key = os.getenv("GOOGLE_API_KEY") or os.getenv("GEMINI_API_KEY")
+    client = glm.CacheServiceClient(client_options={"api_key": api_key} if api_key else None)
+    cache = client.create_cached_content(cached_content=glm.CachedContent(
+        model=LLM_MODEL if LLM_MODEL.startswith("models/") else f"models/{LLM_MODEL}",
+        display_name="inventorybot-prompt",
+        system_instruction=glm.Content(parts=[glm.Part(text=system_prompt)]),
+        tools=[convert_to_genai_function_declarations(chat_tools())],
+        ttl=timedelta(seconds=ttl_seconds),
+    ))
+    logger.info("Created context cache %s", cache.name)
+    return cache.name, time.time() + ttl_seconds
+
+
+def get_cached_llm(cache_name: str):
+    """Chat model reading its system prompt and tools from cached content (neither may be resent)."""
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    return ChatGoogleGenerativeAI(model=LLM_MODEL, cached_content=cache_name)
+
+
+class TokenUsage:
+    """Running totals of the token counts providers report in each response's usage_metadata."""
+
+    def __init__(self):
+        self.calls = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.cached_tokens = 0
+
+    @staticmethod
+    def of(message) -> Dict[str, int]:
+        usage = getattr(message, "usage_metadata", None) or {}
+        return {
+            "calls": 1,
+            "input_tokens": usage.get("input_tokens", 0),
+            "output_tokens": usage.get("output_tokens", 0),
+            "cached_tokens": (usage.get("input_token_details") or {}).get("cache_read", 0) or 0,
+        }
+
+    def record(self, message) -> Dict[str, int]:
+        """Add one LLM response to the totals and return its own counts."""
+        counts = self.of(message)
+        self.calls += 1
+        self.input_tokens += counts["input_tokens"]
+        self.output_tokens += counts["output_tokens"]
+        self.cached_tokens += counts["cached_tokens"]
+        return counts
+
+    def snapshot(self) -> Dict[str, Any]:
+        calls = self.calls or 1
+        return {
+            "calls": self.calls,
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "cached_tokens": self.cached_tokens,
+            "avg_input_tokens": round(self.input_tokens / calls),
+            "avg_output_tokens": round(self.output_tokens / calls),
+            "cached_share": round(self.cached_tokens / self.input_tokens, 3) if self.input_tokens else 0.0,
+        }
+
+
+token_usage = TokenUsage()
+
+
+def add_usage(total: Dict[str, int] | None, counts: Dict[str, int]) -> Dict[str, int]:
+    """Per-turn accumulation of TokenUsage.of counts (kept in the graph state)."""
+    total = dict(total or {})
+    for key, value in counts.items():
+        total[key] = total.get(key, 0) + value
+    return total
@@ -1,7 +1,4 @@
 
-from app.Agents.graph import chatbot_graph 
-from app.Agents.Graph import memory_manager
-
 from app.DB.Sql.db_manager import AsyncDBManager
 
 
@@ -12,6 +9,7 @@ from typing import Dict, Any
 import os
 import signal
 import sys
+import time
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import (
     Application, 
@@ -25,6 +23,11 @@ from telegram.constants import ChatAction
 from dotenv import load_dotenv
 from langchain_core.messages import HumanMessage, AIMessage
 
+from app.Agents.Nodes.budget import new_turn_budget, degraded_turns
+from app.telegram.streaming import StreamingReply, chunk_text, split_message
+from app.tracing import start_trace, end_trace, span
+from app.Agents.Graph.instrumentation import graph_stats, turn_summary, write_trace
+
 
 load_dotenv()
 
@@ -36,10 +39,18 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 TELEGRAM_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
+# Stream LLM tokens into the reply by editing it as they arrive (see app/telegram/streaming.py)
+TELEGRAM_STREAMING = os.getenv("TELEGRAM_STREAMING", "1") != "0"
 
 class TelegramInventoryBot:
     def __init__(self):
         self.db_manager = None
+        self.graph = None
+        self.memory_manager = None
+        self.router_stats = None
+        self.response_cache = None
+        self.token_usage = None
+        # Seconds from receiving a message to the first reply text the customer sees
         self.active_sessions: Dict[int, Dict[str, Any]] = {}
         self.application = None
         self.is_running = False
@@ -51,6 +62,19 @@ class TelegramInventoryBot:
             await self.db_manager.open()
             await self.db_manager.init_schema()
             logger.info("✅ Database initialized")
+
+            # The agent stack (LangGraph, LangChain) is imported here rather than at module
+            # load so the process is up and the DB connected before paying for it
+            from app.Agents.graph import chatbot_graph
+            from app.Agents.Graph.memory_manager import memory_manager
+            from app.Agents.Nodes.router import router_stats
+            from app.Agents.Nodes.cache import response_cache
+            from app.config.llm import token_usage
+            self.graph = chatbot_graph
+            self.memory_manager = memory_manager
+            self.router_stats = router_stats
+            self.response_cache = response_cache
+            self.token_usage = token_usage
         except Exception as e:
             logger.error(f"Database initialization failed: {e}")
             raise
@@ -58,6 +82,9 @@ class TelegramInventoryBot:
     async def cleanup(self):
         """Clean shutdown"""
         logger.info("🧹 Cleaning up...")
+        if self.memory_manager:
+            # Buffered conversation writes go out before the pool closes
+            await self.memory_manager.close()
         if self.db_manager:
             await self.db_manager.close()
             logger.info("Database connection closed")
@@ -136,7 +163,10 @@ Just type naturally - I understand context!
         """Clear conversation memory"""
         user_id = update.effective_user.id
         session_id = f"telegram_{user_id}"
-        memory_manager.clear_memory(session_id)
+        await self.memory_manager.clear_memory(session_id)
+        if self.graph.checkpointer:
+            # Also forgets an order waiting for confirmation
+            await self.graph.checkpointer.adelete_thread(session_id)
         
         await update.message.reply_text("🧹 Memory cleared! Starting fresh.")
     
@@ -150,17 +180,67 @@ Just type naturally - I understand context!
             else:
                 db_status = "❌ Not initialized"
             
+            routing = ""
+            if self.router_stats:
+                r = self.router_stats.snapshot()
+                saved = f", ~{r['saved_seconds']}s saved" if r["saved_seconds"] is not None else ""
+                routing = (f"⚡ Fast path: {r['routed']}/{r['messages']} messages ({r['routed_share']:.0%}), "
+                           f"{r['avg_routed_ms']} ms vs {r['avg_llm_ms']} ms via LLM{saved}")
+            if self.response_cache:
+                c = self.response_cache.snapshot()
+                routing += (f"\n🗃️ Answer cache: {c['entries']} entries, {c['hit_rate']:.0%} hit rate "
+                            f"({c['hits']} hits, {c['stale_evictions']} stale)")
+            if self.token_usage:
+                t = self.token_usage.snapshot()
+                routing += (f"\n🔤 LLM: {t['calls']} calls, avg {t['avg_input_tokens']} in "
+                            f"({t['cached_share']:.0%} cached) / {t['avg_output_tokens']} out tokens")
+            if degraded_turns:
+                stops = ", ".join(f"{reason} {n}" for reason, n in degraded_turns.most_common())
+                routing += f"\n🛑 Turns cut short: {stops}"
+            routing += self._latency_status()
             status = f"""
 📊 **System Status**
 🗄️ Database: {db_status}
 👥 Active Users: {len(self.active_sessions)}
+🧠 Memory: {self._memory_status()}
 🤖 Bot: ✅ Running
+{routing}
             """
             await update.message.reply_text(status, parse_mode='Markdown')
             
         except Exception as e:
             await update.message.reply_text(f"❌ Status error: {str(e)}")
     
+    def _latency_status(self) -> str:
+        stats = graph_stats.percentiles()
+        if "turn" not in stats:
+            return ""
+
+        def line(series: str) -> str:
+            p = stats[series]
+            # Markdown parse mode: underscores in node/tool names would open italics
+            label = series.split(":", 1)[-1].replace("_", "-")
+            return f"{label} {p['p50']:.0f}/{p['p95']:.0f}"
+
+        text = f"\n⏱️ Latency p50/p95 ms over {stats['turn']['n']} turns: " + ", ".join(
+            line(s) for s in ("turn", "first_reply", "db", "telegram") if s in stats)
+        nodes = [s for s in stats if s.startswith("node:")]
+        tools = [s for s in stats if s.startswith("tool:")]
+        if nodes:
+            text += "\n🧩 Nodes: " + ", ".join(line(s) for s in sorted(nodes, key=lambda s: -stats[s]["p95"]))
+        if tools:
+            text += "\n🔧 Tools: " + ", ".join(line(s) for s in sorted(tools, key=lambda s: -stats[s]["p95"]))
+        return text
+
+    def _memory_status(self) -> str:
+        if not self.memory_manager:
+            return "not loaded"
+        m = self.memory_manager.snapshot()
+        status = f"{m['sessions']} sessions, {m['chars'] / 1024:.0f} KiB, {m['evicted']} evicted"
+        if "pending" in m:
+            status += f", {m['pending']} unsaved messages"
+        return status
+
     async def callback_handler(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle button callbacks"""
         query = update.callback_query
@@ -187,50 +267,95 @@ Just type naturally - I understand context!
             await update.message.reply_text("👋 Please use /start first!")
             return
         
+        # Nodes, tools, DB queries and Telegram calls of this turn are timed into the trace
+        trace, token = start_trace(f"turn {session_id}")
+        reply = None
         try:
             # Show typing
             await update.message.reply_chat_action(ChatAction.TYPING)
             
-            # Prepare state for graph
+            # Prepare state for graph; pending_confirmation is left to the checkpoint so a "yes"
+            # resumes the order held last turn
             initial_state = {
                 "messages": [HumanMessage(content=user_input)],
                 "session_id": session_id,
-                "pending_confirmation": None,
                 "tool_results": [],
                 "error_count": 0,
-                "memory_context": []
+                "memory_context": [],
+                "route": None,
+                "cached": False,
+                "token_usage": {},
+                "budget": new_turn_budget(),
+                "tool_cache": {}
             }
             
             # Use your compiled graph
-            final_state = await chatbot_graph.ainvoke(initial_state)
+            started = time.perf_counter()
+            config = {"configurable": {"thread_id": session_id}}
+            reply = StreamingReply(update) if TELEGRAM_STREAMING else None
+            if reply:
+                final_state = await self._run_streaming(initial_state, config, reply)
+            else:
+                # durability="exit": the checkpoint is written once, when the turn ends
+                final_state = await self.graph.ainvoke(initial_state, config, durability="exit")
+            if not final_state.get("cached"):
+                self.router_stats.record_turn(bool(final_state.get("route")), time.perf_counter() - started)
+            if final_state.get("token_usage"):
+                logger.info("LLM usage for %s: %s", session_id, final_state["token_usage"])
             
             # Extract response
             response = "Sorry, I couldn't process that."
             for msg in reversed(final_state["messages"]):
                 if isinstance(msg, AIMessage):
-                    response = msg.content
+                    response = chunk_text(msg.content) or response
                     break
             
+            if reply:
+                await reply.finish(response, context)
             # Handle long messages
-            if len(response) > 4000:
-                parts = [response[i:i+3900] for i in range(0, len(response), 3900)]
+            elif len(response) > 4000:
+                parts = split_message(response)
                 for i, part in enumerate(parts):
-                    if i == 0:
-                        await update.message.reply_text(part)
-                    else:
-                        await context.bot.send_message(
-                            chat_id=update.effective_chat.id,
-                            text=part
-                        )
+                    with span("telegram", "send"):
+                        if i == 0:
+                            await update.message.reply_text(part)
+                        else:
+                            await context.bot.send_message(
+                                chat_id=update.effective_chat.id,
+                                text=part
+                            )
             else:
-                await update.message.reply_text(response)
+                with span("telegram", "send"):
+                    await update.message.reply_text(response)
+            first_reply = reply.first_sent_at if reply and reply.first_sent_at else time.perf_counter()
+            write_trace(turn_summary(trace, session_id, final_state, (first_reply - started) * 1000))
                 
         except Exception as e:
             logger.error(f"Message processing error: {e}")
-            await update.message.reply_text(
-                "❌ Something went wrong. Please try again."
-            )
+            error = "❌ Something went wrong. Please try again."
+            # A streamed preview is turned into the error rather than left with its cursor
+            if not (reply and await reply.abort(error)):
+                await update.message.reply_text(error)
+        finally:
+            if reply:
+                await reply.close()
+            end_trace(token)
     
+    async def _run_streaming(self, initial_state: Dict[str, Any], config: Dict[str, Any],
+                             reply: StreamingReply) -> Dict[str, Any]:
+        """Run the graph, feeding the llm node's tokens to `reply`; returns the final state."""
+        final_state = None
+        async for event in self.graph.astream_events(initial_state, config, version="v2", durability="exit"):
+            kind = event["event"]
+            if event.get("metadata", {}).get("langgraph_node") == "llm":
+                if kind == "on_chat_model_start":
+                    reply.reset()
+                elif kind == "on_chat_model_stream":
+                    reply.push(chunk_text(event["data"]["chunk"].content))
+            elif kind == "on_chain_end" and not event.get("parent_ids"):
+                final_state = event["data"]["output"]
+        return final_state
+
     async def error_handler(self, update: object, context: ContextTypes.DEFAULT_TYPE):
         """Global error handler"""
         logger.error(f"Exception while handling update: {context.error}")
@@ -0,0 +1,140 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Optional
+
+from telegram import Message, Update
+from telegram.error import BadRequest, RetryAfter
+
+from app.tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Telegram allows roughly one edit per second per chat before answering with RetryAfter
+TELEGRAM_EDIT_INTERVAL_SECONDS = float(os.getenv("TELEGRAM_EDIT_INTERVAL_SECONDS", "1.0"))
+TELEGRAM_MESSAGE_LIMIT = 4000
+CURSOR = " ▌"
+
+
+def chunk_text(content) -> str:
+    """Text of a streamed message chunk; some providers send a list of content blocks."""
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return "".join(block if isinstance(block, str) else block.get("text", "")
+                       for block in content if isinstance(block, (str, dict)))
+    return ""
+
+
+def split_message(text: str, size: int = 3900) -> list[str]:
+    return [text[i:i + size] for i in range(0, len(text), size)] or [""]
+
+
+class StreamingReply:
+    """
+    One bot reply that grows while the LLM streams: the first tokens are sent as a new message at
+    once, later text is applied by editing it at most every TELEGRAM_EDIT_INTERVAL_SECONDS. Edits
+    run in the background, so a slow Telegram call never holds up the token stream, and only the
+    latest text is sent when several updates arrive within one interval.
+    """
+
+    def __init__(self, update: Update, interval: float = TELEGRAM_EDIT_INTERVAL_SECONDS):
+        self.update = update
+        self.interval = interval
+        self.text = ""
+        self.message: Optional[Message] = None
+        self.shown = ""
+        self.first_sent_at: Optional[float] = None
+        self._next_edit = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self._dirty = asyncio.Event()
+
+    def reset(self):
+        """A new LLM call started; text streamed so far (e.g. before a tool call) is superseded."""
+        self.text = ""
+
+    def push(self, delta: str):
+        if not delta:
+            return
+        self.text += delta
+        self._dirty.set()
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await self._dirty.wait()
+            self._dirty.clear()
+            delay = self._next_edit - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            preview = self.text[:TELEGRAM_MESSAGE_LIMIT - len(CURSOR)]
+            if preview.strip() and preview != self.shown:
+                await self._show(preview + CURSOR)
+                self.shown = preview
+
+    async def _show(self, text: str) -> bool:
+        try:
+            if self.message is None:
+                with span("telegram", "send"):
+                    self.message = await self.update.message.reply_text(text)
+                self.first_sent_at = time.perf_counter()
+            else:
+                with span("telegram", "edit"):
+                    await self.message.edit_text(text)
+            self._next_edit = time.monotonic() + self.interval
+            return True
+        except RetryAfter as e:
+            retry = e.retry_after.total_seconds() if hasattr(e.retry_after, "total_seconds") else e.retry_after
+            self._next_edit = time.monotonic() + float(retry)
+        except BadRequest as e:
+            # Editing to identical text is rejected, but the message already shows it
+            if "not modified" in str(e).lower():
+                return True
+            logger.warning("Streaming edit failed: %s", e)
+        return False
+
+    async def close(self) -> None:
+        """Stop the background edits; safe to call more than once."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def abort(self, text: str) -> bool:
+        """
+        The turn failed: stop editing and replace the preview (and its cursor) with `text`.
+        Returns False when nothing was shown yet or the edit failed, so the caller replies instead.
+        """
+        await self.close()
+        if self.message is None:
+            return False
+        return await self._show(text)
+
+    async def finish(self, final_text: str, context) -> None:
+        """Replace the preview with the final answer (the graph's last AI message)."""
+        await self.close()
+        parts = split_message(final_text)
+        if self.message is None:
+            with span("telegram", "send"):
+                await self.update.message.reply_text(parts[0])
+            self.first_sent_at = time.perf_counter()
+        else:
+            delay = self._next_edit - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if not await self._show(parts[0]):
+                # Could not edit (flood control or an error): wait it out once, then send afresh
+                delay = self._next_edit - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                if not await self._show(parts[0]):
+                    with span("telegram", "send"):
+                        await self.update.message.reply_text(parts[0])
+        for part in parts[1:]:
+            with span("telegram", "send"):
+                await context.bot.send_message(chat_id=self.update.effective_chat.id, text=part)
@@ -0,0 +1,76 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+_current_trace: ContextVar[Optional["Trace"]] = ContextVar("current_trace", default=None)
+
+
+class Trace:
+    """Timings collected for one unit of work (an API request, a bot turn)."""
+
+    __slots__ = ("name", "started", "marks", "spans", "attrs")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started = time.perf_counter()
+        self.marks: dict[str, float] = {}
+        self.spans: list[dict] = []
+        self.attrs: dict = {}
+
+    def mark(self, label: str):
+        self.marks[label] = time.perf_counter()
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000
+
+    def between_ms(self, start: str, end: str) -> Optional[float]:
+        if start in self.marks and end in self.marks:
+            return (self.marks[end] - self.marks[start]) * 1000
+        return None
+
+    def total_ms(self, kind: str) -> float:
+        return sum(s["ms"] for s in self.spans if s["kind"] == kind)
+
+    def count(self, kind: str) -> int:
+        return sum(1 for s in self.spans if s["kind"] == kind)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+def start_trace(name: str):
+    """Make a new Trace current; returns (trace, token) - pass the token to end_trace."""
+    trace = Trace(name)
+    return trace, _current_trace.set(trace)
+
+
+def end_trace(token):
+    _current_trace.reset(token)
+
+
+def detach_trace():
+    """For long-lived tasks started during traced work: stop recording into that work's trace."""
+    _current_trace.set(None)
+
+
+@contextmanager
+def span(kind: str, detail: Optional[str] = None):
+    """Time a block into the current trace, if any. A no-op outside traced work."""
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+        return
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        entry = {"kind": kind, "ms": (time.perf_counter() - t0) * 1000}
+        if detail:
+            entry["detail"] = detail
+        trace.spans.append(entry)
+
+
+def sql_label(query: str, limit: int = 80) -> str:
+    return " ".join(query.split())[:limit]
@@ -0,0 +1,175 @@
+"""
+End-to-end throughput of the bot's agent graph, offline, with per-node latency.
+
+A throwaway SQLite catalog is seeded and stocked, and chatbot_graph is driven with synthetic customer
+conversations exactly as the Telegram bot drives it (one thread per session, a fresh turn budget per
+message). The LLM is the scripted fake provider (LLM_PROVIDER=fake), which maps each question to a
+deterministic tool call, so everything but the model itself is measured: router, answer cache,
+memory, tools, DB, checkpointer and the order confirmation flow. --llm-ms adds a simulated model
+response time. Each turn is traced like a bot turn; the report gives throughput, turn latency and
+p50/p95 per node and tool.
+
+Usage:
+    python -m benchmarks.bench_agent [--conversations 2000] [--concurrency 16] [--products 500]
+                                     [--llm-ms 0] [--no-router] [--no-cache] [--trace-file turns.jsonl]
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+BRANDS = ["Aashirvaad", "Tata", "Fortune", "Patanjali", "Amul", "Saffola", "Dabur", "Local"]
+ITEMS = ["Basmati Rice", "Whole Wheat Flour", "Toor Dal", "Sunflower Oil", "Sugar", "Tea", "Salt",
+         "Turmeric Powder", "Biscuits", "Soap", "Shampoo", "Toothpaste", "Ghee", "Poha", "Besan"]
+SIZES = ["250g", "500g", "1kg", "5kg"]
+
+
+def catalog(products: int, rng: random.Random) -> list[dict]:
+    return [{"sku": f"SKU{i:05d}", "name": f"{BRANDS[i % len(BRANDS)]} {ITEMS[i // len(BRANDS) % len(ITEMS)]}",
+             "variety": SIZES[i % len(SIZES)], "price": round(rng.uniform(10, 900), 2), "quantity": 0}
+            for i in range(products)]
+
+
+def conversation(products: list[dict], weights: list[float], rng: random.Random) -> list[str]:
+    """2-5 customer messages: questions about a few products, sometimes an order and its confirmation."""
+    p = rng.choices(products, weights)[0]
+    item = p["name"].split(" ", 1)[1].lower()
+    turns = [rng.choice([f"do you have {item}?", "hi", f"show me {p['name'].lower()}", f"varieties of {item}"])]
+    for _ in range(rng.randint(1, 3)):
+        p = rng.choices(products, weights)[0]
+        turns.append(rng.choice([f"what is the price of {p['sku']}?", f"is {p['sku']} in stock?",
+                                 f"tell me about {p['sku']}", f"total for {rng.randint(1, 5)} {p['sku']}"]))
+    if rng.random() < 0.3:
+        turns += [f"I want to buy {rng.randint(1, 3)} {p['sku']}", rng.choice(["yes", "yes please", "no"])]
+    return turns
+
+
+async def seed(products: list[dict]):
+    from app.Agents.tools.tools import service
+    await service.upsert_products_batch(products)
+    await service.batch_restock_in("bench", "BENCH-SEED", None,
+                                   [{"sku": p["sku"], "variety": p["variety"], "quantity": 10 ** 6,
+                                     "unit_price": round(p["price"] * 0.8, 2)} for p in products])
+
+
+async def run_turn(graph, session_id: str, text: str, trace_file: str) -> dict:
+    from langchain_core.messages import HumanMessage
+    from app.Agents.Graph.instrumentation import turn_summary, write_trace
+    from app.Agents.Nodes.budget import new_turn_budget
+    from app.tracing import end_trace, start_trace
+
+    trace, token = start_trace(f"turn {session_id}")
+    try:
+        state = await graph.ainvoke({
+            "messages": [HumanMessage(content=text)], "session_id": session_id, "tool_results": [],
+            "error_count": 0, "memory_context": [], "route": None, "cached": False, "token_usage": {},
+            "budget": new_turn_budget(), "tool_cache": {},
+        }, {"configurable": {"thread_id": session_id}}, durability="exit")
+        record = turn_summary(trace, session_id, state)
+        write_trace(record, trace_file)
+        return record
+    finally:
+        end_trace(token)
+
+
+async def bench(args) -> bool:
+    from app.Agents.graph import chatbot_graph
+    from app.Agents.Graph.instrumentation import graph_stats
+    from app.Agents.Graph.memory_manager import memory_manager
+    from app.DB.Sql.db_manager import AsyncDBManager
+    from app.config.llm import token_usage
+
+    db = AsyncDBManager()
+    await db.open()
+    await db.init_schema()
+    rng = random.Random(args.seed)
+    products = catalog(args.products, rng)
+    t0 = time.perf_counter()
+    await seed(products)
+    print(f"seeded {len(products)} products in {time.perf_counter() - t0:.2f}s")
+    # A few products draw most of the questions (Zipf-like), as in a real shop
+    weights = [1 / (rank + 1) for rank in range(len(products))]
+    conversations = [conversation(products, weights, rng) for _ in range(args.conversations)]
+
+    # Warm-up (imports, router index, prepared statements), then measure from a clean slate
+    await run_turn(chatbot_graph, "bench_warmup", "do you have basmati rice?", "")
+    graph_stats.samples.clear()
+    calls_before = token_usage.snapshot()
+
+    slots = asyncio.Semaphore(args.concurrency)
+    records, failures = [], 0
+
+    async def converse(i: int, turns: list[str]):
+        nonlocal failures
+        async with slots:
+            for text in turns:
+                try:
+                    records.append(await run_turn(chatbot_graph, f"bench_{i}", text, args.trace_file))
+                except Exception as e:
+                    failures += 1
+                    if failures <= 3:
+                        print(f"turn failed: {e!r}", file=sys.stderr)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(converse(i, turns) for i, turns in enumerate(conversations)))
+    wall = time.perf_counter() - t0
+    await memory_manager.close()
+    await db.close()
+
+    turns = len(records)
+    latencies = sorted(r["total_ms"] for r in records)
+    usage = token_usage.snapshot()
+    llm_calls = usage["calls"] - calls_before["calls"]
+    print(f"{len(conversations)} conversations, {turns} turns in {wall:.2f}s: "
+          f"{turns / wall:.0f} turns/s, {len(conversations) / wall:.0f} conversations/s "
+          f"(concurrency {args.concurrency}, llm {args.llm_ms:.0f} ms)")
+    if latencies:
+        print(f"turn ms: p50 {statistics.median(latencies):.1f}, p95 {latencies[int(0.95 * turns)]:.1f}, "
+              f"p99 {latencies[min(int(0.99 * turns), turns - 1)]:.1f}, max {latencies[-1]:.1f}")
+        routed = sum(1 for r in records if r["route"])
+        cached = sum(1 for r in records if r["cached"])
+        cut = sum(1 for r in records if r["budget_exhausted"])
+        print(f"fast path {routed / turns:.0%}, answer cache {cached / turns:.0%}, budget cut {cut}, "
+              f"failed {failures}; {llm_calls / turns:.2f} LLM calls and "
+              f"{sum(r['db_queries'] for r in records) / turns:.1f} DB queries per turn")
+    print(f"\n{'series':<28} {'n':>7} {'p50 ms':>8} {'p95 ms':>8}")
+    stats = graph_stats.percentiles()
+    order = {"turn": 0, "db": 1, "node": 2, "tool": 3}
+    for series in sorted(stats, key=lambda s: (order.get(s.split(":")[0], 4), -stats[s]["p95"])):
+        p = stats[series]
+        print(f"{series:<28} {p['n']:>7} {p['p50']:>8.2f} {p['p95']:>8.2f}")
+    return failures == 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--conversations", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=16, help="conversations in flight at once")
+    parser.add_argument("--products", type=int, default=500)
+    parser.add_argument("--llm-ms", type=float, default=0.0, help="simulated LLM response time per call")
+    parser.add_argument("--no-router", action="store_true", help="send every question through the LLM path")
+    parser.add_argument("--no-cache", action="store_true", help="disable the answer cache")
+    parser.add_argument("--trace-file", default="", help="append one JSON line per turn here")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    if args.trace_file:
+        args.trace_file = os.path.abspath(args.trace_file)
+
+    # Module-level settings are read at import, so configure before the agent stack is loaded
+    os.environ.update(LLM_PROVIDER="fake", FAKE_LLM_LATENCY_MS=str(args.llm_ms), BOT_STATS_WINDOW="10000000",
+                      ROUTER_ENABLED="0" if args.no_router else "1",
+                      RESPONSE_CACHE_ENABLED="0" if args.no_cache else "1")
+    # offline.db is created in the working directory; keep it out of the repo
+    os.environ.pop("POSTGRES_URL", None)
+    with tempfile.TemporaryDirectory() as tmp:
+        cwd = os.getcwd()
+        os.chdir(tmp)
+        try:
+            ok = asyncio.run(bench(args))
+        finally:
+            os.chdir(cwd)
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,144 @@
+"""
+Batch demand forecasting over synthetic daily sales.
+
+Builds a (SKUs x days) matrix mixing smooth demand (Poisson, fitted with SES) and intermittent
+demand (rare Poisson bursts, fitted with Croston), then times the vectorised full fit, the
+forecast step and a one-day incremental update, which is what the nightly refresh does once
+every product has stored state.
+
+With --db the same synthetic history is written to a throwaway SQLite database as OUT ledger
+rows, and the timings cover the real pipeline: the sales_daily rollup catch-up, the first
+DemandForecaster.refresh and the next night's incremental refresh.
+
+Target: the full fit for 100k SKUs over 90 days finishes in seconds on one core.
+
+Usage:
+    python -m benchmarks.bench_forecast [--skus 100000] [--days 90] [--seed 7]
+    python -m benchmarks.bench_forecast --db [--skus 20000]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from app.DB.services.forecast_service import METHODS, SmoothingState
+
+TARGET_SECONDS = 10.0
+
+
+def synthetic_demand(skus: int, days: int, seed: int) -> np.ndarray:
+    """60% smooth sellers, 40% intermittent ones; integer units per day."""
+    rng = np.random.default_rng(seed)
+    smooth = rng.random(skus) < 0.6
+    rate = np.where(smooth, rng.gamma(2.0, 2.0, skus), 0.0)
+    p_demand = np.where(smooth, 1.0, rng.uniform(0.03, 0.3, skus))
+    size = np.where(smooth, 0.0, rng.uniform(1.0, 5.0, skus))
+    hits = rng.random((skus, days)) < p_demand[:, None]
+    units = np.where(smooth[:, None], rng.poisson(rate[:, None], (skus, days)),
+                     1 + rng.poisson(size[:, None], (skus, days)))
+    return np.where(hits, units, 0).astype(float)
+
+
+def timed(label: str, fn):
+    t = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - t
+    print(f"   {label:<34} {elapsed * 1000:>9.1f} ms")
+    return result, elapsed
+
+
+def bench_kernel(skus: int, days: int, seed: int, alpha: float, beta: float) -> bool:
+    demand = synthetic_demand(skus, days, seed)
+    print(f"== {skus:,} SKUs x {days} days, {int((demand > 0).sum()):,} non-zero product-days")
+    state = SmoothingState(skus)
+    _, fit = timed(f"full fit ({days} days)", lambda: state.advance(demand[:, :-1], alpha, beta))
+    _, step = timed("incremental fit (1 day)", lambda: state.advance(demand[:, -1:], alpha, beta))
+    (method, rate), fc = timed("forecast", lambda: state.forecast(beta))
+    counts = {name: int((method == i).sum()) for i, name in enumerate(METHODS)}
+    print(f"   methods: {counts}; mean next-week units {rate.mean() * 7:.2f}")
+    total = fit + step + fc
+    verdict = "OK" if total <= TARGET_SECONDS else f"OVER TARGET ({TARGET_SECONDS:.0f} s)"
+    print(f"   total {total:.2f} s {verdict}")
+    return total <= TARGET_SECONDS
+
+
+async def bench_db(skus: int, days: int, seed: int) -> bool:
+    from app.DB.Sql.db_manager import AsyncDBManager
+    from app.DB.services.forecast_service import DemandForecaster
+    from app.DB.services.inventory_service import InventoryService
+    from app.DB.services.rollup_service import SalesRollups
+
+    demand = synthetic_demand(skus, days, seed)
+    today = datetime.now(timezone.utc).date()
+    first = today - timedelta(days=days)
+    created = (first - timedelta(days=1)).isoformat() + " 00:00:00"
+    ids = [str(uuid.uuid4()) for _ in range(skus)]
+
+    db = AsyncDBManager()
+    await db.open()
+    await db.init_schema()
+    conn = db.sqlite_conn
+    t = time.perf_counter()
+    conn.execute("BEGIN")
+    conn.executemany(
+        "INSERT INTO products (id, sku, name, price, quantity, created_at) VALUES (?, ?, ?, 1.0, 0, ?)",
+        [(pid, f"SKU{i:06d}", f"Product {i}", created) for i, pid in enumerate(ids)],
+    )
+    rows, cols = np.nonzero(demand)
+    conn.executemany(
+        "INSERT INTO stock_ledger (product_id, movement, quantity, unit_price, source, created_at) "
+        "VALUES (?, 'OUT', ?, 1.0, 'bench', ?)",
+        ((ids[r], int(demand[r, c]), (first + timedelta(days=int(c))).isoformat() + " 12:00:00")
+         for r, c in zip(rows.tolist(), cols.tolist())),
+    )
+    conn.execute("COMMIT")
+    print(f"== SQLite: {skus:,} SKUs, {len(rows):,} OUT ledger rows over {days} days "
+          f"(seeded in {time.perf_counter() - t:.1f} s)")
+
+    rollups = SalesRollups(db, InventoryService(db), settle_seconds=0)
+    forecaster = DemandForecaster(db, rollups, history_days=days)
+    t = time.perf_counter()
+    await rollups.catch_up()
+    print(f"   {'sales_daily rollup catch-up':<34} {(time.perf_counter() - t) * 1000:>9.1f} ms")
+    full = await forecaster.refresh(today)
+    print(f"   {'first refresh (full fit)':<34} {full['seconds'] * 1000:>9.1f} ms  ({full['updated']:,} updated)")
+    nightly = await forecaster.refresh(today + timedelta(days=1))
+    print(f"   {'next night (incremental)':<34} {nightly['seconds'] * 1000:>9.1f} ms  ({nightly['updated']:,} updated)")
+    await db.close()
+    return full["seconds"] <= TARGET_SECONDS
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--skus", type=int, default=None, help="default 100000 (20000 with --db)")
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--alpha", type=float, default=0.2)
+    parser.add_argument("--beta", type=float, default=0.1)
+    parser.add_argument("--db", action="store_true", help="run the full pipeline against a temporary SQLite db")
+    args = parser.parse_args()
+
+    if args.db:
+        skus = args.skus or 20000
+        # offline.db is created in the working directory; keep it out of the repo
+        os.environ.pop("POSTGRES_URL", None)
+        with tempfile.TemporaryDirectory() as tmp:
+            cwd = os.getcwd()
+            os.chdir(tmp)
+            try:
+                ok = asyncio.run(bench_db(skus, args.days, args.seed))
+            finally:
+                os.chdir(cwd)
+    else:
+        ok = bench_kernel(args.skus or 100000, args.days, args.seed, args.alpha, args.beta)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
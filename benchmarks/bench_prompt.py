@@ -0,0 +1,116 @@
+"""
+Prompt tokens (and, with --live, LLM latency) per bot turn for each system prompt variant.
+
+A scripted conversation is replayed the way llm_node sends it: system prompt, tool declarations,
+the session's budgeted history and the current turn's messages. Offline, tokens are counted locally
+(tiktoken's cl100k_base when available, else the memory manager's 4-chars-per-token estimate), so
+they approximate Gemini's counts. --live sends each turn's first call to the configured model and
+reports the provider's own usage_metadata, including tokens served from its context cache.
+
+Usage:
+    python -m benchmarks.bench_prompt [--turns 12] [--live]
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+from app.Agents.Graph.memory_manager import SessionMemory, estimate_tokens
+from app.Agents.Graph.prompts import SYSTEM_PROMPTS, build_prompt
+from app.config.llm import TokenUsage, chat_tools
+
+CARD = {"sku": "WHF001", "name": "Whole Wheat Flour", "variety": "5kg", "price": 245.0, "quantity": 48,
+        "available": True}
+SCRIPT = [
+    ("Do you have whole wheat flour?", "search", {"q": "whole wheat flour"}, [CARD],
+     "😊 Yes! Whole Wheat Flour (5kg, WHF001) is in stock: 48 packs at ₹245."),
+    ("How much for 3 of them?", "compute_order_total", {"items": [{"sku": "WHF001", "quantity": 3}]},
+     {"total": 735.0, "lines": [dict(CARD, quantity=3, line_total=735.0)]},
+     "🧮 3 x Whole Wheat Flour (5kg) = ₹735.00."),
+    ("Why is it better than maida?", "get_card", {"sku": "WHF001"}, CARD,
+     "✨ Whole wheat flour keeps the bran and germ, so it has more fibre than refined flour."),
+    ("Okay, I'll take 3", "sell_multiple_items", {"order_id": "ORD-1", "items": [{"sku": "WHF001", "quantity": 3}]},
+     {"status": "success", "message": "✅ Order ORD-1 completed successfully"},
+     "🛒 3 x Whole Wheat Flour (5kg), total ₹735.00."),
+]
+
+
+def token_counter():
+    try:
+        import tiktoken
+        encoding = tiktoken.get_encoding("cl100k_base")
+        return lambda text: len(encoding.encode(text)), "cl100k_base"
+    except Exception:
+        return estimate_tokens, "chars/4 estimate"
+
+
+def turn_messages(i: int):
+    question, tool, args, result, answer = SCRIPT[i % len(SCRIPT)]
+    call = AIMessage(content="", tool_calls=[{"name": tool, "args": args, "id": f"call_{i}"}])
+    return question, [HumanMessage(content=question), call,
+                      ToolMessage(content=json.dumps(result), tool_call_id=f"call_{i}")], answer
+
+
+def offline(turns: int):
+    count, method = token_counter()
+    tools_tokens = sum(count(json.dumps(convert_to_openai_tool(t))) for t in chat_tools())
+    print(f"token counts: {method}; tool declarations: {tools_tokens} tokens on every call")
+    print(f"{'variant':<8} {'system':>7} {'in/call':>8} {'in/turn':>8} {'total':>8} {'render ms':>10}")
+    results = {}
+    for variant in SYSTEM_PROMPTS:
+        prompt = build_prompt(variant)
+        memory = SessionMemory()
+        per_turn, render = [], 0.0
+        for i in range(turns):
+            question, messages, answer = turn_messages(i)
+            history = memory.history()
+            tokens = 0
+            # Two LLM calls per tool turn: the question, then the question plus the tool result
+            for current in (messages[:1], messages):
+                t0 = time.perf_counter()
+                rendered = prompt.invoke({"chat_history": history, "messages": current}).to_messages()
+                render += time.perf_counter() - t0
+                tokens += tools_tokens + sum(count(str(m.content)) + count(json.dumps(getattr(m, "tool_calls", None)
+                                                                                      or "")) for m in rendered)
+            per_turn.append(tokens)
+            memory.save_turn(question, answer)
+        system = count(SYSTEM_PROMPTS[variant])
+        results[variant] = sum(per_turn)
+        print(f"{variant:<8} {system:>7} {statistics.mean(per_turn) / 2:>8.0f} {statistics.mean(per_turn):>8.0f} "
+              f"{sum(per_turn):>8} {render / turns * 1000:>10.2f}")
+    if {"full", "compact"} <= results.keys():
+        print(f"compact saves {1 - results['compact'] / results['full']:.0%} of prompt tokens over {turns} turns")
+
+
+async def live(turns: int):
+    from app.config.llm import get_llm_with_tools
+    llm = get_llm_with_tools()
+    print(f"{'variant':<8} {'p50 ms':>8} {'max ms':>8} {'in':>7} {'cached':>7} {'out':>6}")
+    for variant in SYSTEM_PROMPTS:
+        chain = build_prompt(variant) | llm
+        memory = SessionMemory()
+        latencies, usage = [], TokenUsage()
+        for i in range(turns):
+            question, messages, answer = turn_messages(i)
+            t0 = time.perf_counter()
+            response = await chain.ainvoke({"chat_history": memory.history(), "messages": messages[:1]})
+            latencies.append((time.perf_counter() - t0) * 1000)
+            usage.record(response)
+            memory.save_turn(question, answer)
+        u = usage.snapshot()
+        print(f"{variant:<8} {statistics.median(latencies):>8.0f} {max(latencies):>8.0f} {u['avg_input_tokens']:>7} "
+              f"{u['cached_share']:>7.0%} {u['avg_output_tokens']:>6}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--turns", type=int, default=12)
+    parser.add_argument("--live", action="store_true", help="call the configured LLM (needs GOOGLE_API_KEY)")
+    args = parser.parse_args()
+    offline(args.turns)
+    if args.live:
+        asyncio.run(live(args.turns))
@@ -0,0 +1,96 @@
+"""
+Per-request CPU cost of the hot GET endpoints with and without the fast response path.
+
+The service layer is replaced by canned repository output so only routing, validation and
+serialisation are measured; requests are driven straight through the ASGI app (no HTTP client).
+
+Usage:
+    python -m benchmarks.bench_response_path [--requests 20000]
+"""
+import argparse
+import asyncio
+import time
+
+import api.main as main
+
+CARD = {"sku": "WHF001", "name": "Wheat Flour", "variety": "Regular", "price": 45.0, "quantity": 48, "available": True}
+STOCK = {"sku": "WHF001", "quantity": 48, "available": True}
+SEARCH = [dict(CARD, sku=f"WHF{i:03d}") for i in range(20)]
+
+
+async def _card(sku, variety):
+    return dict(CARD)
+
+
+async def _stock(sku, variety):
+    return dict(STOCK)
+
+
+async def _search(q, variety):
+    return [dict(r) for r in SEARCH]
+
+
+async def asgi_request(app, method: str, path: str, query: bytes = b"", body: bytes = b"") -> int:
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": method, "scheme": "http", "path": path, "raw_path": path.encode(),
+        "query_string": query, "root_path": "", "server": ("bench", 80), "client": ("bench", 1),
+        "headers": [(b"host", b"bench"), (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode())],
+    }
+    status = 0
+    sent = False
+
+    async def receive():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(scope, receive, send)
+    return status
+
+
+async def run_case(name: str, method: str, path: str, n: int, body: bytes = b"") -> dict:
+    for _ in range(200):  # warm-up
+        await asgi_request(main.app, method, path, body=body)
+    cpu0, wall0 = time.process_time(), time.perf_counter()
+    for _ in range(n):
+        status = await asgi_request(main.app, method, path, body=body)
+    cpu, wall = time.process_time() - cpu0, time.perf_counter() - wall0
+    assert status == 200, f"{name}: HTTP {status}"
+    return {"case": name, "cpu_us": cpu / n * 1e6, "wall_us": wall / n * 1e6}
+
+
+async def main_async(n: int):
+    main.service.product_card = _card
+    main.service.get_stock = _stock
+    main.service.search = _search
+    cases = [
+        ("get_card", "GET", "/products/WHF001/card", b""),
+        ("get_stock", "GET", "/products/WHF001/stock", b""),
+        ("search(20)", "POST", "/products/search", b'{"q": "WHF"}'),
+    ]
+    print(f"{'endpoint':<12} {'mode':<8} {'cpu us/req':>11} {'wall us/req':>12}")
+    for name, method, path, body in cases:
+        results = {}
+        for mode, flag in (("default", False), ("fast", True)):
+            main.FAST_PATH = flag
+            r = await run_case(name, method, path, n, body)
+            results[mode] = r
+            print(f"{name:<12} {mode:<8} {r['cpu_us']:>11.1f} {r['wall_us']:>12.1f}")
+        saved = 1 - results["fast"]["cpu_us"] / results["default"]["cpu_us"]
+        print(f"{name:<12} {'saving':<8} {saved:>10.0%}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20000)
+    args = parser.parse_args()
+    asyncio.run(main_async(args.requests))
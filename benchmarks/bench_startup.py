@@ -0,0 +1,86 @@
+"""
+Cold-start import cost of the service entry points.
+
+Each entry module is imported in a fresh interpreter under `python -X importtime`; the script
+reports total wall time, the cost grouped by top-level package and the most expensive modules,
+and fails (exit 1) when an entry point misses its cold-start target.
+
+Targets: a new uvicorn worker should import api.main in under 1000 ms so autoscaled workers
+take traffic quickly; the bot process should be polling within 1000 ms (the agent graph is
+loaded after that, during initialisation).
+
+Usage:
+    python -m benchmarks.bench_startup [--top 15] [--runs 3]
+"""
+import argparse
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+TARGETS_MS = {
+    "api.main": 1000,
+    "app.telegram.bot": 1000,
+    "app.Agents.graph": None,  # reported for reference; loaded lazily by the bot
+}
+
+
+def import_profile(module: str) -> tuple[float, list[tuple[str, int, int]]]:
+    """Return (wall ms, [(module, self us, cumulative us)]) for one cold import."""
+    code = (
+        "import time; t = time.perf_counter(); "
+        f"import {module}; "
+        "print((time.perf_counter() - t) * 1000)"
+    )
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="0")
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True, text=True, env=env,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+    wall_ms = float(proc.stdout.strip().splitlines()[-1])
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cum_us, name = line[len("import time:"):].split("|", 2)
+        rows.append((name.strip(), int(self_us), int(cum_us)))
+    return wall_ms, rows
+
+
+def report(module: str, runs: int, top: int) -> bool:
+    walls, rows = [], []
+    for _ in range(runs):
+        wall_ms, rows = import_profile(module)
+        walls.append(wall_ms)
+    wall = sorted(walls)[len(walls) // 2]
+
+    by_package: dict[str, int] = defaultdict(int)
+    for name, self_us, _ in rows:
+        by_package[name.split(".")[0]] += self_us
+
+    target = TARGETS_MS.get(module)
+    verdict = "" if target is None else (" OK" if wall <= target else f" OVER TARGET ({target} ms)")
+    print(f"\n== {module}: {wall:.0f} ms median of {runs}{verdict}")
+    print(f"   {'package':<28} {'self ms':>9}")
+    for pkg, us in sorted(by_package.items(), key=lambda kv: -kv[1])[:top]:
+        print(f"   {pkg:<28} {us / 1000:>9.1f}")
+    print(f"   {'module':<48} {'self ms':>9} {'cum ms':>9}")
+    for name, self_us, cum_us in sorted(rows, key=lambda r: -r[1])[:top]:
+        print(f"   {name:<48} {self_us / 1000:>9.1f} {cum_us / 1000:>9.1f}")
+    return target is None or wall <= target
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("modules", nargs="*", default=list(TARGETS_MS))
+    args = parser.parse_args()
+    ok = all([report(m, args.runs, args.top) for m in args.modules])
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
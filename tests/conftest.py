@@ -0,0 +1,19 @@
+import asyncio
+
+import pytest
+
+from app.DB.Sql.db_manager import AsyncDBManager
+from app.DB.services.inventory_service import InventoryService
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    """InventoryService over a fresh SQLite database in a temporary directory."""
+    # offline.db is created in the working directory
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv("POSTGRES_URL", raising=False)
+    db = AsyncDBManager()
+    asyncio.run(db.open())
+    asyncio.run(db.init_schema())
+    yield InventoryService(db)
+    asyncio.run(db.close())
@@ -0,0 +1,36 @@
+import time
+
+import pytest
+from langchain_core.messages import HumanMessage
+
+from app.Agents.Nodes.chat import confirmation_answer
+from app.Agents.Nodes.condition import check_confirmation_response
+
+
+@pytest.mark.parametrize("text", ["yes", "Yes please", "ok", "y", "confirm", "ok, do it!"])
+def test_bare_affirmation_confirms(text):
+    assert confirmation_answer(text) == "yes"
+
+
+@pytest.mark.parametrize("text", ["no", "No thanks", "cancel it", "yes... no, cancel"])
+def test_refusal_cancels(text):
+    assert confirmation_answer(text) == "no"
+
+
+@pytest.mark.parametrize("text", [
+    "actually I want to buy 2 wheat flour instead",
+    "go with the large one instead",
+    "ok what about sugar price?",
+    "buy",
+])
+def test_longer_reply_is_a_new_request(text):
+    assert confirmation_answer(text) is None
+
+
+def test_held_order_is_not_placed_by_a_new_request():
+    def route(text):
+        return check_confirmation_response({"messages": [HumanMessage(content=text)],
+                                            "pending_confirmation": {"requested_at": time.time()}})
+
+    assert route("actually I want to buy 2 wheat flour instead") == "new_request"
+    assert route("yes please") == "execute_write_tools"
@@ -0,0 +1,28 @@
+import asyncio
+import io
+from datetime import datetime
+
+import pandas as pd
+
+from api.ingest import parse_catalog
+from app.DB.services.job_service import IngestJobRunner
+
+
+def test_upload_with_date_column_is_queued(service):
+    buf = io.BytesIO()
+    pd.DataFrame({
+        "sku": ["JAM1", "JAM2"], "name": ["Jam", "Jam"], "price": [55.0, 60.0],
+        "expiry": [datetime(2027, 1, 31), pd.NaT], "pack": [12, 6],
+    }).to_excel(buf, index=False)
+    items, rejected, rejected_rows = parse_catalog(buf.getvalue(), "xlsx")
+
+    async def scenario():
+        runner = IngestJobRunner(service.db, service)
+        job_id = await runner.submit("products_upsert", items)
+        return await runner.get_status(job_id)
+
+    job = asyncio.run(scenario())
+    assert rejected_rows == 0
+    assert items[0]["attributes"] == {"expiry": "2027-01-31T00:00:00", "pack": 12}
+    assert items[1]["attributes"] == {"pack": 6}
+    assert job["total_rows"] == 2
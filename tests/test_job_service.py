@@ -0,0 +1,65 @@
+import asyncio
+
+from app.DB.services.job_service import IngestJobRunner
+
+
+ITEMS = [{"sku": f"SKU{i}", "name": f"Item {i}", "variety": None, "price": 10.0, "quantity": 0} for i in range(10)]
+RESTOCK = [{"sku": f"SKU{i}", "variety": None, "quantity": 5, "unit_price": 8.0} for i in range(10)]
+
+
+async def _ledger_rows(db) -> int:
+    return (await db.execute_query("SELECT COUNT(*) AS n FROM stock_ledger"))[0]["n"]
+
+
+async def _drain(*runners):
+    for runner in runners:
+        await runner.start()
+    for runner in runners:
+        await runner.queue.join()
+    for runner in runners:
+        await runner.stop()
+
+
+def test_two_runners_process_a_job_once(service):
+    async def scenario():
+        await service.upsert_products_batch([dict(it) for it in ITEMS])
+        first = IngestJobRunner(service.db, service, concurrency=2, chunk_size=2)
+        second = IngestJobRunner(service.db, service, concurrency=2, chunk_size=2)
+        job_id = await first.repo.create_job("restock", RESTOCK, {}, 2)
+        # Both find the queued job, as two workers booting together would
+        await _drain(first, second)
+        return await first.get_status(job_id), await _ledger_rows(service.db)
+
+    job, rows = asyncio.run(scenario())
+    assert job["status"] == "completed"
+    assert job["committed_chunks"] == 5
+    assert job["processed_rows"] == 10
+    assert rows == 10
+
+
+def test_expired_lease_is_taken_over(service):
+    async def scenario():
+        await service.upsert_products_batch([dict(it) for it in ITEMS])
+        dead = IngestJobRunner(service.db, service, chunk_size=2)
+        job_id = await dead.repo.create_job("restock", RESTOCK, {}, 2)
+        assert await dead.repo.claim_job(job_id, dead.owner, 60)
+        async with service.db.transaction() as conn:
+            await service.batch_restock_in(None, None, None, RESTOCK[:2], conn=conn)
+            assert await dead.repo.commit_chunk(job_id, dead.owner, 0, 2, 0, [], conn)
+
+        live = IngestJobRunner(service.db, service, chunk_size=2)
+        # Still leased by the dead runner: not resumable yet
+        assert await live.repo.list_resumable_jobs(60) == []
+        await service.db.execute_query(
+            "UPDATE ingest_jobs SET heartbeat_at = datetime('now', '-120 seconds')", commit=True)
+        await _drain(live)
+        # The dead runner's late chunk is rejected
+        async with service.db.transaction() as conn:
+            late = await dead.repo.commit_chunk(job_id, dead.owner, 1, 2, 0, [], conn)
+        return await live.get_status(job_id), await _ledger_rows(service.db), late
+
+    job, rows, late = asyncio.run(scenario())
+    assert job["status"] == "completed"
+    assert job["committed_chunks"] == 5
+    assert rows == 10
+    assert late is False
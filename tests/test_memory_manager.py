@@ -0,0 +1,35 @@
+import asyncio
+
+from app.Agents.Graph.memory_manager import DBSessionStore, MemoryManager
+
+
+def test_history_keeps_a_turn_whose_flush_is_in_flight(service):
+    async def scenario():
+        store = DBSessionStore(service.db, flush_seconds=60)
+        manager = MemoryManager(store=store)
+        await manager.history("s1")
+        manager.save_turn("s1", "do you have tea?", "Yes, TEA1 is in stock.")
+
+        # Hold the insert until history() has looked at the store
+        release = asyncio.Event()
+        append_messages = store.repo.append_messages
+
+        async def slow_append(rows):
+            await release.wait()
+            await append_messages(rows)
+
+        store.repo.append_messages = slow_append
+        flush = asyncio.create_task(store.flush())
+        await asyncio.sleep(0)
+        count = await store.count("s1")
+        history = asyncio.create_task(manager.history("s1"))
+        await asyncio.sleep(0.05)
+        release.set()
+        messages = await history
+        await flush
+        await store.close()
+        return count, [m.content for m in messages]
+
+    count, history = asyncio.run(scenario())
+    assert count == 2
+    assert history[-2:] == ["do you have tea?", "Yes, TEA1 is in stock."]
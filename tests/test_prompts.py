@@ -0,0 +1,44 @@
+import asyncio
+import time
+
+from langchain_core.runnables import RunnableLambda
+
+from app.Agents.Graph import prompts
+from app.config import llm
+
+
+def test_context_cache_renewal_does_not_block_the_event_loop(monkeypatch):
+    uploads = []
+
+    def create_context_cache(system_prompt):
+        # Stands in for the blocking gRPC upload
+        time.sleep(0.2)
+        uploads.append(system_prompt)
+        return f"cachedContents/{len(uploads)}", time.time() + 3600
+
+    monkeypatch.setattr(llm, "LLM_CONTEXT_CACHE", "explicit")
+    monkeypatch.setattr(llm, "LLM_PROVIDER", "google")
+    monkeypatch.setattr(llm, "create_context_cache", create_context_cache)
+    monkeypatch.setattr(llm, "get_cached_llm", lambda name: RunnableLambda(lambda _: name))
+    monkeypatch.setattr(prompts, "_context_cache", None)
+    monkeypatch.setattr(prompts, "_cached_chain", None)
+    monkeypatch.setattr(prompts, "_renew_lock", None)
+
+    async def scenario():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.create_task(ticker())
+        chains = await asyncio.gather(prompts.get_inventory_chain(), prompts.get_inventory_chain())
+        task.cancel()
+        return ticks, chains
+
+    ticks, chains = asyncio.run(scenario())
+    assert ticks >= 5
+    assert len(uploads) == 1
+    assert chains[0] is chains[1]
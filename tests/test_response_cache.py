@@ -0,0 +1,27 @@
+import asyncio
+import json
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from app.Agents.Nodes.cache import ResponseCache
+from app.Agents.Nodes.router import CatalogIndex
+
+
+def test_turn_is_cached_without_the_router(service, monkeypatch):
+    # The router node never ran, so nothing has loaded the catalog index yet
+    monkeypatch.setattr("app.Agents.Nodes.cache.catalog_index", CatalogIndex())
+    question = "what is the price of TEA1?"
+    state = {"messages": [
+        HumanMessage(content=question),
+        AIMessage(content="", tool_calls=[{"name": "get_price", "args": {"sku": "TEA1"}, "id": "call_1"}]),
+        ToolMessage(content=json.dumps({"sku": "TEA1", "price": 20.0}), tool_call_id="call_1"),
+        AIMessage(content="TEA1 costs 20."),
+    ], "route": None, "cached": False}
+
+    async def scenario():
+        await service.ingest_product("TEA1", "Tea", None, 20.0, 5, None)
+        cache = ResponseCache()
+        await cache.store_turn(state)
+        return await cache.get(question)
+
+    assert asyncio.run(scenario()) == "TEA1 costs 20."
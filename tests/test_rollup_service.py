@@ -0,0 +1,23 @@
+import asyncio
+from datetime import date, timedelta
+
+from app.DB.services.rollup_service import SalesRollups
+
+
+def test_cursor_crosses_an_id_gap_wider_than_a_batch(service):
+    async def scenario():
+        await service.ingest_product("TEA1", "Tea", None, 20.0, 0, None)
+        await service.restock_in("TEA1", None, 50, 15.0)
+        await service.sell_out("TEA1", None, 2, 20.0)
+        # Lost sequence values: the next ledger id is far past the last one
+        await service.db.execute_query("UPDATE sqlite_sequence SET seq = seq + 100 WHERE name = 'stock_ledger'")
+        await service.sell_out("TEA1", None, 3, 20.0)
+        _, max_id = await rollups.repo.get_cursor()
+        today = date.today()
+        report = await rollups.sales(today - timedelta(days=1), today + timedelta(days=1))
+        return max_id, report
+
+    rollups = SalesRollups(service.db, service, batch_size=10, settle_seconds=0)
+    max_id, report = asyncio.run(scenario())
+    assert report["as_of_ledger_id"] == max_id
+    assert report["units"] == 5
@@ -0,0 +1,31 @@
+import asyncio
+
+from app.DB.services.stock_feed import StockFeed
+
+
+def test_resume_replays_then_streams_live(service):
+    async def scenario():
+        await service.ingest_product("OIL1", "Oil", None, 120.0, 0, None)
+        await service.restock_in("OIL1", None, 10, 100.0)
+        await service.sell_out("OIL1", None, 1, 120.0)
+        feed = StockFeed(service, poll_interval=0.05, settle_seconds=0)
+        await feed.start()
+        events = []
+        try:
+            stream = feed.subscribe(skus=["OIL1"], last_id=0, heartbeat=0.05)
+            while len(events) < 3:
+                event = await asyncio.wait_for(anext(stream), 5)
+                if event is None and len(events) == 2:
+                    # Replay done and the subscriber is registered: post a live sale
+                    await service.sell_out("OIL1", None, 2, 120.0)
+                elif event is not None:
+                    events.append(event)
+            await stream.aclose()
+        finally:
+            await feed.stop()
+        return events
+
+    events = asyncio.run(scenario())
+    assert [e["movement"] for e in events] == ["IN", "OUT", "OUT"]
+    assert [e["quantity"] for e in events] == [10, 9, 7]
+    assert [e["id"] for e in events] == sorted(e["id"] for e in events)
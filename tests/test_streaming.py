@@ -0,0 +1,40 @@
+import asyncio
+from types import SimpleNamespace
+
+from app.telegram.streaming import CURSOR, StreamingReply
+
+
+class FakeMessage:
+    def __init__(self, sent: list):
+        self.sent = sent
+
+    async def reply_text(self, text):
+        self.sent.append(text)
+        return self
+
+    async def edit_text(self, text):
+        self.sent.append(text)
+
+
+def test_abort_stops_edits_and_replaces_the_preview():
+    async def scenario():
+        sent = []
+        reply = StreamingReply(SimpleNamespace(message=FakeMessage(sent)), interval=0)
+        reply.push("Checking the price")
+        await asyncio.sleep(0.01)
+        task = reply._task
+        shown = await reply.abort("Something went wrong")
+        return sent, shown, task
+
+    sent, shown, task = asyncio.run(scenario())
+    assert sent == ["Checking the price" + CURSOR, "Something went wrong"]
+    assert shown
+    assert task.done()
+
+
+def test_abort_before_any_preview_leaves_the_reply_to_the_caller():
+    async def scenario():
+        reply = StreamingReply(SimpleNamespace(message=FakeMessage([])))
+        return await reply.abort("Something went wrong")
+
+    assert not asyncio.run(scenario())
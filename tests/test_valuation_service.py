@@ -0,0 +1,45 @@
+import asyncio
+from datetime import date, timedelta
+
+from app.DB.services.valuation_service import ValuationEngine
+
+
+def test_reads_are_served_during_a_rebuild(service):
+    async def scenario():
+        await service.ingest_product("SOAP1", "Soap", None, 30.0, 0, None)
+        await service.restock_in("SOAP1", None, 10, 20.0)
+        await service.restock_in("SOAP1", None, 10, 25.0)
+        await service.sell_out("SOAP1", None, 12, 30.0)
+        engine = ValuationEngine(service.db, service, settle_seconds=0)
+        before = await engine.stock_value()
+
+        # Hold the rebuild partway through its pass over the ledger
+        paused, resume = asyncio.Event(), asyncio.Event()
+        stream_ledger = engine.repo.stream_ledger
+
+        async def held_stream(*args, **kwargs):
+            async for row in stream_ledger(*args, **kwargs):
+                yield row
+                paused.set()
+                await resume.wait()
+
+        engine.repo.stream_ledger = held_stream
+        rebuild = asyncio.create_task(engine.rebuild(chunk_size=1))
+        await asyncio.wait_for(paused.wait(), 5)
+        during = await asyncio.wait_for(engine.stock_value(), 5)
+        # A sale posted mid-rebuild is applied on top of the swapped-in valuation
+        await service.sell_out("SOAP1", None, 3, 30.0)
+        resume.set()
+        await asyncio.wait_for(rebuild, 5)
+        after = await engine.stock_value()
+        today = date.today()
+        cogs = await engine.repo.cogs_summary(today - timedelta(days=1), today + timedelta(days=1))
+        return before, during, after, cogs
+
+    before, during, after, cogs = asyncio.run(scenario())
+    assert during == before
+    assert (before["total_units"], before["total_value"]) == (8, 200.0)
+    assert (after["total_units"], after["total_value"]) == (5, 125.0)
+    # 10 @ 20 + 2 @ 25, then 3 @ 25
+    assert (cogs["units"], cogs["cogs"]) == (15, 325.0)
+